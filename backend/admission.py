@@ -0,0 +1,173 @@
+"""
+Admission control for TodoWeb 2.0
+Caps the requests a worker serves at once, queues a few by priority and sheds the rest with a fast 503
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from metrics import Histogram
+
+# Priority classes, most urgent first; a freed slot goes to the first non-empty queue
+PRIORITIES = ("high", "normal", "low")
+QUEUE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Weight of the newest sample in each class's average service time
+SERVICE_TIME_SMOOTHING = 0.1
+
+
+class AdmissionController:
+    """Concurrency limit with a short priority queue in front of it.
+
+    At most ``max_concurrency`` requests run at once; the next ``queue_size``
+    wait in one FIFO per priority. A request is shed instead of queued when
+    the work already queued at its priority or above (counted at each
+    class's average service time, spread over the slots) would keep it
+    waiting longer than ``max_wait_seconds``, or when the queue is full of
+    requests that are at least as urgent. A full queue makes room for an
+    urgent request by shedding the newest waiter of the least urgent class,
+    and a waiter still queued at ``max_wait_seconds`` is shed as well, so no
+    admitted request has waited longer than that. Must be used from the
+    event loop.
+    """
+
+    def __init__(self, max_concurrency: int, queue_size: int = 64,
+                 max_wait_seconds: float = 0.25, retry_after: int = 1):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self.retry_after = retry_after
+        self.active = 0
+        self._queues: List[Deque[asyncio.Future]] = [deque() for _ in PRIORITIES]
+        self._service_seconds = [0.0] * len(PRIORITIES)
+        self.admitted = [0] * len(PRIORITIES)
+        self.shed: Dict[Tuple[int, str], int] = {}
+        self.queue_wait = Histogram(
+            "admission_queue_wait_seconds", "Time admitted requests waited for a slot",
+            ("priority",), QUEUE_WAIT_BUCKETS
+        )
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    def estimated_wait(self, priority: int) -> float:
+        """Seconds a new request of this priority would wait behind the queued ones"""
+        ahead = sum(len(self._queues[c]) * self._service_seconds[c] for c in range(priority + 1))
+        return ahead / self.max_concurrency
+
+    async def acquire(self, priority: int) -> Optional[str]:
+        """
+        Wait for a slot
+
+        Returns:
+            None once the request holds a slot (pair with ``release``), or
+            why it was shed: "deadline", "queue_full", "displaced" or "timeout"
+        """
+        if self.active < self.max_concurrency:
+            self.active += 1
+            self._admit(priority, 0.0)
+            return None
+        if self.estimated_wait(priority) > self.max_wait_seconds:
+            return self._shed(priority, "deadline")
+        if self.queued >= self.queue_size:
+            victim_class = next((c for c in range(len(PRIORITIES) - 1, priority, -1) if self._queues[c]), None)
+            if victim_class is None:
+                return self._shed(priority, "queue_full")
+            self._queues[victim_class].pop().set_result("displaced")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(future)
+        started = time.perf_counter()
+        try:
+            # wait() leaves the future alone on timeout, so a slot handed over meanwhile is not lost
+            await asyncio.wait((future,), timeout=self.max_wait_seconds)
+        except asyncio.CancelledError:
+            self._abandon(priority, future)
+            raise
+        if not future.done():
+            self._queues[priority].remove(future)
+            future.cancel()
+            return self._shed(priority, "timeout")
+        reason = future.result()
+        if reason is not None:
+            return self._shed(priority, reason)
+        self._admit(priority, time.perf_counter() - started)
+        return None
+
+    def release(self, priority: int, service_seconds: float) -> None:
+        """Return a slot, handing it straight to the most urgent waiter"""
+        average = self._service_seconds[priority]
+        self._service_seconds[priority] = (
+            service_seconds if average == 0 else average + SERVICE_TIME_SMOOTHING * (service_seconds - average)
+        )
+        self._hand_off()
+
+    def _hand_off(self) -> None:
+        for queue in self._queues:
+            if queue:
+                # The slot moves to the waiter, so active stays the same
+                queue.popleft().set_result(None)
+                return
+        self.active -= 1
+
+    def _abandon(self, priority: int, future: asyncio.Future) -> None:
+        """Clean up after a waiter whose client went away"""
+        if not future.done():
+            self._queues[priority].remove(future)
+            future.cancel()
+        elif future.result() is None:
+            self._hand_off()
+
+    def _admit(self, priority: int, waited: float) -> None:
+        self.admitted[priority] += 1
+        self.queue_wait.observe((PRIORITIES[priority],), waited)
+
+    def _shed(self, priority: int, reason: str) -> str:
+        key = (priority, reason)
+        self.shed[key] = self.shed.get(key, 0) + 1
+        return reason
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "queued": {name: len(queue) for name, queue in zip(PRIORITIES, self._queues)},
+            "admitted": dict(zip(PRIORITIES, self.admitted)),
+            "shed": {(PRIORITIES[priority], reason): count for (priority, reason), count in self.shed.items()},
+            "service_seconds": dict(zip(PRIORITIES, self._service_seconds)),
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; ``priority`` maps (method, path) to a class index, or None to bypass the limit"""
+
+    def __init__(self, app, controller: AdmissionController, priority: Callable[[str, str], Optional[int]]):
+        self.app = app
+        self.controller = controller
+        self.priority = priority
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = self.priority(scope["method"], scope["path"])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        if await self.controller.acquire(priority) is not None:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry"},
+                headers={"Retry-After": str(self.controller.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, time.perf_counter() - started)
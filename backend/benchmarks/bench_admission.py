@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Latency of admitted requests under overload, with and without admission control.
+
+Requests arrive open-loop (Poisson arrivals at a fixed rate, whether or not
+earlier ones have finished), which is how overload looks to a server, and are
+sent straight into the ASGI app so no HTTP client competes for the CPU. The
+mix is mostly GET /tasks with some POST /tasks and a few bcrypt logins.
+
+The script first measures capacity with a few closed-loop workers, then runs
+the same arrival schedule at --overload times that rate twice: with admission
+control disabled and as configured by the ADMISSION_* variables. For each run
+it reports the requests answered 2xx, the ones shed with 503, and the p50/p99
+latency of admitted requests overall and in the last third of the run; with
+an unbounded backlog the last third is far slower than the first.
+
+Usage:
+    python benchmarks/bench_admission.py
+    ADMISSION_MAX_CONCURRENCY=8 python benchmarks/bench_admission.py --overload 3 --seconds 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "benchpassword123"
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+async def call(app, method, path, headers=(), body=b""):
+    """One request straight through the ASGI app; returns the status"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), *headers],
+        "server": ("bench", 80), "client": ("127.0.0.1", 1234),
+    }
+    sent = False
+    status = []
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.Event().wait()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # Starlette re-raises after sending its 500, e.g. when SQLite's busy timeout runs out
+        pass
+    return status[0] if status else 500
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--overload", type=float, default=2.0, help="arrival rate as a multiple of capacity")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--login-share", type=float, default=0.02)
+    args = parser.parse_args()
+
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+    from benchmarks.generate_dataset import build_parser, generate
+
+    generate(main.engine, build_parser().parse_args([
+        "--users", str(args.users), "--tasks-mean", "100", "--distribution", "constant", "--password", PASSWORD,
+    ]), main.pwd_context.hash(PASSWORD))
+    tokens = [main.create_access_token(data={"sub": str(user_id)}) for user_id in range(1, args.users + 1)]
+    controller = main.admission_controller
+    configured = controller.max_concurrency
+
+    def pick(rng):
+        user = rng.randrange(args.users)
+        auth = [(b"authorization", f"Bearer {tokens[user]}".encode())]
+        roll = rng.random()
+        if roll < args.login_share:
+            return "POST", "/auth/login", [], json.dumps({"username": f"gen{user + 1}", "password": PASSWORD}).encode()
+        if roll < 0.8:
+            return "GET", "/tasks", auth, b""
+        return "POST", "/tasks", auth, json.dumps({"label": "bench", "x": rng.randrange(2000),
+                                                  "y": rng.randrange(2000), "color": "#fff"}).encode()
+
+    async def capacity(seconds=5, workers=8):
+        rng = random.Random(1)
+        done = 0
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                await call(main.app, *pick(rng))
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return done / seconds
+
+    async def overload(rate, max_concurrency):
+        controller.max_concurrency = max_concurrency
+        rng = random.Random(2)
+        results = []
+        started = time.perf_counter()
+
+        async def one(request, arrival):
+            status = await call(main.app, *request)
+            results.append((arrival - started, status, time.perf_counter() - arrival, f"{request[0]} {request[1]}"))
+
+        pending = []
+        arrival = started
+        while arrival - started < args.seconds:
+            arrival += rng.expovariate(rate)
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            pending.append(asyncio.create_task(one(pick(rng), arrival)))
+        await asyncio.gather(*pending)
+
+        admitted = sorted(latency for _, status, latency, _ in results if status < 400)
+        late = sorted(latency for at, status, latency, _ in results if status < 400 and at > args.seconds * 2 / 3)
+        routes = {}
+        for _, status, latency, route in results:
+            if status < 400:
+                routes.setdefault(route, []).append(latency)
+        return {
+            "admission": "off" if max_concurrency >= 10 ** 9 else f"max_concurrency={max_concurrency}",
+            "offered_rps": round(len(results) / args.seconds, 1),
+            "ok": len(admitted),
+            "shed": sum(1 for _, status, _, _ in results if status == 503),
+            "errors": sum(1 for _, status, _, _ in results if status >= 500 and status != 503),
+            "p50_ms": round(percentile(admitted, 50) * 1000, 1),
+            "p99_ms": round(percentile(admitted, 99) * 1000, 1),
+            "last_third_p50_ms": round(percentile(late, 50) * 1000, 1),
+            "last_third_p99_ms": round(percentile(late, 99) * 1000, 1),
+            "routes": {route: {"ok": len(values), "p50_ms": round(percentile(sorted(values), 50) * 1000, 1),
+                               "p99_ms": round(percentile(sorted(values), 99) * 1000, 1)}
+                       for route, values in sorted(routes.items())},
+        }
+
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            controller.max_concurrency = 10 ** 9
+            rate = await capacity()
+            runs = [await overload(rate * args.overload, 10 ** 9)]
+            if configured > 0:
+                runs.append(await overload(rate * args.overload, configured))
+        return rate, runs
+
+    rate, runs = asyncio.run(run())
+    print(f"capacity {rate:.0f} req/s, offered {rate * args.overload:.0f} req/s for {args.seconds:.0f} s")
+    print(f"{'admission':>20} {'ok':>6} {'shed':>6} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8} {'late p50':>9} {'late p99':>9}")
+    for r in runs:
+        print(f"{r['admission']:>20} {r['ok']:>6} {r['shed']:>6} {r['errors']:>6} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['last_third_p50_ms']:>9} {r['last_third_p99_ms']:>9}")
+    print(json.dumps({"capacity_rps": round(rate, 1), "runs": runs}, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cost of a viewport read (GET /tasks?bbox=...) against one user's whole board.
+
+- full:  every live task of the user (GET /tasks without bbox)
+- scan:  the bbox as a plain x/y range filter, which walks all of the
+         user's rows through the (user_id, id) index
+- grid:  main.within_bbox, (user_id, cell) index lookups for the cells
+         under the box plus the exact x/y bounds
+
+Each run fills a fresh SQLite database with --users users of --tasks tasks
+spread uniformly over a --board x --board square, then times the three
+queries for random --viewport sized boxes inside the board. --analyze
+runs ANALYZE first, so the planner works from table statistics.
+
+Usage:
+    python benchmarks/bench_bbox.py --tasks 10000 100000
+    python benchmarks/bench_bbox.py --tasks 100000 --board 20000 --viewport 1200 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, nargs="+", default=[10000, 100000], help="tasks per user")
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--board", type=int, default=10000)
+    parser.add_argument("--viewport", type=int, nargs=2, default=[1200, 1000], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--queries", type=int, default=20, help="random viewports per size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--analyze", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import delete, insert, select
+    import main
+
+    rng = random.Random(21)
+    width, height = args.viewport
+    live = [main.Task.user_id == 1, main.Task.deleted_at.is_(None)]
+    results = []
+    for count in args.tasks:
+        with main.SessionLocal() as db:
+            db.execute(delete(main.Task))
+            for user_id in range(1, args.users + 1):
+                db.execute(insert(main.Task), [
+                    {"user_id": user_id, "label": f"task {i}", "x": rng.randrange(args.board),
+                     "y": rng.randrange(args.board), "color": "#ffffff", "completed": False,
+                     "created_at": datetime.utcnow()}
+                    for i in range(count)
+                ])
+            db.commit()
+            if args.analyze:
+                db.connection().exec_driver_sql("ANALYZE")
+
+        boxes = []
+        for _ in range(args.queries):
+            x0, y0 = rng.randrange(args.board - width), rng.randrange(args.board - height)
+            boxes.append((x0, y0, x0 + width, y0 + height))
+
+        def run(restrict):
+            def queries():
+                rows = 0
+                with main.SessionLocal() as db:
+                    for box in boxes:
+                        query = restrict(select(*main.TASK_ROW_COLUMNS).where(*live), box)
+                        rows += len(db.execute(query).all())
+                return rows
+            return queries
+
+        full = run(lambda query, box: query.order_by(main.Task.id))
+        scan = run(lambda query, box: query.where(
+            main.Task.x.between(box[0], box[2]), main.Task.y.between(box[1], box[3])
+        ).order_by(main.Task.id))
+        grid = run(lambda query, box: main.within_bbox(query, *box))
+        assert scan() == grid()
+        with main.SessionLocal() as db:
+            query = main.within_bbox(select(main.Task.id).where(*live), *boxes[0])
+            compiled = query.compile(db.bind, compile_kwargs={"literal_binds": True})
+            plan = [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()]
+
+        result = {"tasks_per_user": count, "rows_per_viewport": round(grid() / len(boxes), 1), "grid_plan": plan}
+        for name, fn in (("full", full), ("scan", scan), ("grid", grid)):
+            result[f"{name}_ms"] = round(best_of(args.repeat, fn) / len(boxes) * 1000, 3)
+        result["grid_speedup_vs_scan"] = round(result["scan_ms"] / result["grid_ms"], 1)
+        results.append(result)
+
+    print(f"{'tasks':>8} {'rows':>8} {'full ms':>9} {'scan ms':>9} {'grid ms':>9} {'speedup':>8}")
+    for result in results:
+        print(f"{result['tasks_per_user']:>8} {result['rows_per_viewport']:>8} {result['full_ms']:>9} "
+              f"{result['scan_ms']:>9} {result['grid_ms']:>9} {result['grid_speedup_vs_scan']:>8}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Concurrent-request throughput of the sync (threadpool) and async (asyncio driver)
+database modes of the TodoWeb API.
+
+Each mode runs in its own interpreter because DB_ASYNC is read when main.py is
+imported. The app is driven in-process through httpx's ASGI transport, so the
+numbers measure the request path rather than the network.
+
+Usage:
+    python benchmarks/bench_db_modes.py --concurrency 200 --requests 4000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+async def run_mode(args):
+    """Seed one user and hammer GET /tasks with `concurrency` in-flight requests"""
+    sys.path.insert(0, BACKEND_DIR)
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/auth/register", json={
+            "username": "bench",
+            "email": "bench@example.com",
+            "password": "benchpassword123"
+        })
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        for i in range(args.tasks):
+            await client.post("/tasks", json={"label": f"task {i}", "x": i, "y": i, "color": "#ffffff"}, headers=headers)
+
+        latencies = []
+        remaining = iter(range(args.requests))
+
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.get("/tasks", headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "mode": "async" if main.DB_ASYNC else "sync",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+def spawn(mode, args):
+    """Run this script for a single mode in a fresh interpreter with its own database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env["DB_ASYNC"] = "true" if mode == "async" else "false"
+        output = subprocess.run(
+            [sys.executable, __file__, "--single",
+             "--concurrency", str(args.concurrency),
+             "--requests", str(args.requests),
+             "--tasks", str(args.tasks)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=20, help="tasks seeded for the benchmark user")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    results = [spawn(mode, args) for mode in ("sync", "async")]
+    print(f"{'mode':<6} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['throughput_rps']:>10} {result['p50_ms']:>10} {result['p99_ms']:>10}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
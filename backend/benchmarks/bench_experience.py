@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Lost updates and users-row writes per second for the XP update strategies.
+
+- legacy:    the previous ORM read-modify-write (load user, +=, commit) on the threadpool
+- atomic:    PATCH /users/experience issuing UPDATE ... SET experience_points = experience_points + :p
+- coalesced: PATCH /users/experience with XP_COALESCE buffering and interval flushes
+
+Usage:
+    python benchmarks/bench_experience.py --users 20 --increments 200 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def count_user_writes(engine):
+    """Count UPDATE statements against users issued through engine"""
+    from sqlalchemy import event
+    counter = {"writes": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE users"):
+            counter["writes"] += len(parameters) if executemany else 1
+
+    return counter
+
+def reset_experience(main):
+    from sqlalchemy import update
+    with main.SessionLocal() as db:
+        db.execute(update(main.User).values(experience_points=0))
+        db.commit()
+
+def total_experience(main):
+    from sqlalchemy import func, select
+    with main.SessionLocal() as db:
+        return db.scalar(select(func.sum(main.User.experience_points)))
+
+def run_legacy(main, user_ids, args):
+    """Previous handler body, run on a threadpool of `concurrency` workers"""
+    def increment(user_id):
+        with main.SessionLocal() as db:
+            user = db.get(main.User, user_id)
+            user.experience_points += 1
+            db.commit()
+
+    jobs = [user_id for user_id in user_ids for _ in range(args.increments)]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(increment, jobs))
+
+async def run_api(main, tokens, args):
+    import httpx
+
+    jobs = iter([token for token in tokens for _ in range(args.increments)])
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for token in jobs:
+                response = await client.patch(
+                    "/users/experience",
+                    json={"points": 1},
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                response.raise_for_status()
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+async def run_coalesced(main, tokens, args):
+    from xp_coalescer import ExperienceCoalescer
+
+    main.xp_coalescer = ExperienceCoalescer(interval_seconds=args.flush_interval)
+    flusher = asyncio.create_task(main.xp_coalescer.run(main.apply_experience_deltas))
+    try:
+        await run_api(main, tokens, args)
+    finally:
+        flusher.cancel()
+        await main.xp_coalescer.flush(main.apply_experience_deltas)
+        main.xp_coalescer = None
+
+async def register_users(main, count):
+    import httpx
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tokens, user_ids = [], []
+        for i in range(count):
+            response = await client.post("/auth/register", json={
+                "username": f"bench{i}",
+                "email": f"bench{i}@example.com",
+                "password": "benchpassword123"
+            })
+            data = response.json()
+            tokens.append(data["access_token"])
+            user_ids.append(data["user"]["id"])
+        return tokens, user_ids
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--increments", type=int, default=100, help="increments per user")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--flush-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ["XP_COALESCE"] = "false"
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    counter = count_user_writes(main.engine)
+    tokens, user_ids = asyncio.run(register_users(main, args.users))
+    expected = args.users * args.increments
+
+    strategies = {
+        "legacy": lambda: run_legacy(main, user_ids, args),
+        "atomic": lambda: asyncio.run(run_api(main, tokens, args)),
+        "coalesced": lambda: asyncio.run(run_coalesced(main, tokens, args)),
+    }
+    results = []
+    for name, run in strategies.items():
+        reset_experience(main)
+        main.principal_cache.clear()
+        counter["writes"] = 0
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        total = total_experience(main)
+        results.append({
+            "strategy": name,
+            "increments": expected,
+            "lost_updates": expected - total,
+            "user_row_writes": counter["writes"],
+            "elapsed_s": round(elapsed, 3),
+            "increments_per_s": round(expected / elapsed, 1),
+            "writes_per_s": round(counter["writes"] / elapsed, 1),
+        })
+    main.password_hasher.shutdown()
+
+    print(f"{'strategy':<10} {'lost':>6} {'writes':>8} {'incr/s':>10} {'writes/s':>10}")
+    for result in results:
+        print(f"{result['strategy']:<10} {result['lost_updates']:>6} {result['user_row_writes']:>8} "
+              f"{result['increments_per_s']:>10} {result['writes_per_s']:>10}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
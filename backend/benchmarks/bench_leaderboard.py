@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Rank lookups at millions of users: the in-memory leaderboard vs SQL.
+
+- memory: main.Leaderboard (RankIndex order statistics), as used by
+          GET /users/me/rank, plus the cost of an XP change and of loading
+          the board at startup
+- sql:    SELECT COUNT(*) FROM users WHERE experience_points > :xp on the
+          experience_points index, and the GET /leaderboard top-100 query
+
+XP values are drawn from a lognormal, so a few users lead and many tie.
+
+Usage:
+    python benchmarks/bench_leaderboard.py --users 1000000
+    python benchmarks/bench_leaderboard.py --users 1000000 5000000 --lookups 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def per_call_us(fn, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return round((time.perf_counter() - started) / len(args_list) * 1e6, 2)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--sql-lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import bindparam, delete, func, insert, select
+    import main
+
+    rng = random.Random(23)
+    results = []
+    for count in args.users:
+        scores = [(user_id, int(rng.lognormvariate(5, 1.5)) // 10 * 10) for user_id in range(1, count + 1)]
+        with main.engine.begin() as conn:
+            conn.execute(delete(main.User))
+            for start in range(0, count, 100000):
+                conn.execute(insert(main.User), [
+                    {"id": user_id, "username": f"u{user_id}", "email": f"u{user_id}@example.com",
+                     "hashed_password": "x", "experience_points": xp}
+                    for user_id, xp in scores[start:start + 100000]
+                ])
+
+        board = main.Leaderboard()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with main.engine.connect() as conn:
+            board.load(conn.execute(select(main.User.id, main.User.experience_points)).all())
+        load_s = time.perf_counter() - started
+        board_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+
+        probes = [(rng.choice(scores)[1],) for _ in range(args.lookups)]
+        changes = [(rng.randrange(1, count + 1), rng.randrange(0, 5000)) for _ in range(args.lookups)]
+        result = {"users": count, "board_load_s": round(load_s, 2), "board_mb": round(board_mb, 1)}
+        count_greater = (select(func.count()).select_from(main.User)
+                         .where(main.User.experience_points > bindparam("xp")))
+        top = (select(main.User.id, main.User.username, main.User.experience_points)
+               .order_by(main.User.experience_points.desc(), main.User.id).limit(100))
+        with main.engine.connect() as conn:
+            for (xp,) in probes[:20]:
+                assert board.rank_of(xp) == 1 + conn.execute(count_greater, {"xp": xp}).scalar()
+            result["sql_rank_us"] = per_call_us(
+                lambda xp: conn.execute(count_greater, {"xp": xp}).scalar(), probes[:args.sql_lookups]
+            )
+            result["sql_top100_us"] = per_call_us(lambda: conn.execute(top).all(), [()] * 50)
+        result["memory_rank_us"] = per_call_us(board.rank_of, probes)
+        result["memory_set_us"] = per_call_us(board.set, changes)
+        results.append(result)
+
+    print(f"{'users':>9} {'load s':>7} {'MB':>7} {'rank us':>8} {'set us':>8} {'sql rank us':>12} {'sql top us':>11}")
+    for r in results:
+        print(f"{r['users']:>9} {r['board_load_s']:>7} {r['board_mb']:>7} {r['memory_rank_us']:>8} "
+              f"{r['memory_set_us']:>8} {r['sql_rank_us']:>12} {r['sql_top100_us']:>11}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
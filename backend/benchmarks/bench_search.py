@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Latency of GET /search for a user with years of notes.
+
+A fresh SQLite database gets --users background users and one heavy user
+(a note every day for --years years plus --tasks tasks), all written by
+generate_dataset.py with its small shared vocabulary, so every query word
+is common to every user. For one- and two-word queries the script times:
+
+- index: the ranked FTS5 lookup GET /search runs, plus loading the page's
+         tasks and notes
+- scan:  what a client does without it, reading all of the user's tasks
+         and notes and filtering them in Python
+
+Usage:
+    python benchmarks/bench_search.py --years 5 --tasks 10000
+    python benchmarks/bench_search.py --users 10000 --years 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def timed(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="background users")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=10000, help="tasks of the heavy user")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import select
+    import main
+    from benchmarks.generate_dataset import WORDS, build_parser, generate
+    from search_index import words
+
+    note_days = str(365 * args.years)
+    generate(main.engine, build_parser().parse_args([
+        "--users", str(args.users), "--tasks-mean", "50", "--note-days", note_days, "--note-density", "0.1",
+    ]), "x")
+    generate(main.engine, build_parser().parse_args([
+        "--users", "1", "--prefix", "heavy", "--distribution", "constant", "--tasks-mean", str(args.tasks),
+        "--tasks-max", str(args.tasks), "--note-days", note_days, "--note-density", "1",
+    ]), "x")
+    user_id = args.users + 1
+    build_match, statement = main.SEARCH_STATEMENTS["sqlite"]
+
+    def index_path(q):
+        with main.SessionLocal() as db:
+            hits = db.execute(statement, {
+                "match": build_match(user_id, q, main.SEARCH_MAX_WORDS), "user_id": user_id,
+                "limit": args.limit + 1, "offset": 0,
+            }).all()
+            task_ids = [hit.ref_id for hit in hits if hit.kind == "task"]
+            note_ids = [hit.ref_id for hit in hits if hit.kind == "note"]
+            db.execute(select(*main.TASK_ROW_COLUMNS).where(main.Task.id.in_(task_ids))).all()
+            db.execute(select(*main.CALENDAR_NOTE_ROW_COLUMNS).where(main.CalendarNote.id.in_(note_ids))).all()
+
+    def scan_path(q):
+        query_words = words(q)
+        with main.SessionLocal() as db:
+            tasks = db.execute(select(*main.TASK_ROW_COLUMNS).where(main.Task.user_id == user_id)).all()
+            notes = db.execute(select(*main.CALENDAR_NOTE_ROW_COLUMNS).where(main.CalendarNote.user_id == user_id)).all()
+            for text in [task.label for task in tasks] + [note.content for note in notes]:
+                text_words = words(text)
+                all(any(word.startswith(prefix) for word in text_words) for prefix in query_words)
+
+    results = []
+    for q in (WORDS[0], WORDS[-1][:3], f"{WORDS[1]} {WORDS[2]}"):
+        row = {"q": q}
+        for name, fn in (("index", index_path), ("scan", scan_path)):
+            timings = sorted(timed(args.repeat, lambda: fn(q)))
+            row[f"{name}_p50_ms"] = round(statistics.median(timings), 2)
+            row[f"{name}_p95_ms"] = round(timings[int(len(timings) * 0.95) - 1], 2)
+        results.append(row)
+
+    print(f"{'query':>16} {'index p50':>10} {'index p95':>10} {'scan p50':>10} {'scan p95':>10}")
+    for row in results:
+        print(f"{row['q']:>16} {row['index_p50_ms']:>10} {row['index_p95_ms']:>10} {row['scan_p50_ms']:>10} {row['scan_p95_ms']:>10}")
+    print(json.dumps({"users": args.users + 1, "heavy_notes": 365 * args.years, "heavy_tasks": args.tasks,
+                      "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Per-row cost of the GET /tasks response path.
+
+- orm:  ORM entities, validated into TaskResponse, dumped to JSON-able
+        Python and encoded with the stdlib json module (the FastAPI
+        response_model path)
+- rows: the column-row fast path in main.py (select only the needed
+        columns, one pydantic-core dump_json pass, no per-row validation)
+
+Usage:
+    python benchmarks/bench_serialization.py --rows 1000 10000 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    from pydantic import TypeAdapter
+    from sqlalchemy import delete, insert, select
+    import main
+
+    orm_adapter = TypeAdapter(List[main.TaskResponse])
+    results = []
+    for count in args.rows:
+        with main.SessionLocal() as db:
+            db.execute(delete(main.Task))
+            db.execute(insert(main.Task), [
+                {"user_id": 1, "label": f"task {i}", "x": i, "y": i, "color": "#ffffff",
+                 "completed": i % 3 == 0, "created_at": datetime.utcnow()}
+                for i in range(count)
+            ])
+            db.commit()
+
+        def orm_path():
+            with main.SessionLocal() as db:
+                tasks = db.scalars(select(main.Task).where(main.Task.user_id == 1)).all()
+                validated = orm_adapter.validate_python(tasks, from_attributes=True)
+                json.dumps(orm_adapter.dump_python(validated, mode="json")).encode()
+
+        def rows_path():
+            with main.SessionLocal() as db:
+                rows = db.execute(select(*main.TASK_ROW_COLUMNS).where(main.Task.user_id == 1)).all()
+                main.task_rows_adapter.dump_json([row._asdict() for row in rows], warnings=False)
+
+        orm_seconds = best_of(args.repeat, orm_path)
+        rows_seconds = best_of(args.repeat, rows_path)
+        results.append({
+            "rows": count,
+            "orm_us_per_row": round(orm_seconds / count * 1e6, 2),
+            "rows_us_per_row": round(rows_seconds / count * 1e6, 2),
+            "speedup": round(orm_seconds / rows_seconds, 2),
+        })
+
+    print(f"{'rows':>8} {'orm us/row':>12} {'rows us/row':>12} {'speedup':>8}")
+    for result in results:
+        print(f"{result['rows']:>8} {result['orm_us_per_row']:>12} {result['rows_us_per_row']:>12} {result['speedup']:>8}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
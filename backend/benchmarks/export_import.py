@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /export and POST /import with one very large user.
+
+Unless --base-url is given, a fresh SQLite database is filled by
+generate_dataset.py with a single user owning --tasks tasks and a note on
+every day of --note-days, and the API is started with uvicorn in a
+subprocess. The script then streams the user's export to a file, imports it
+into a new account (dry run, then for real) and reports wall time, rows/s
+and the server's resident memory at the start of each phase and its peak
+during it, polled from /proc (Linux only). "anon" is heap memory; "rss" also
+counts pages of the database file that SQLite maps into the process.
+
+Usage:
+    python benchmarks/export_import.py --tasks 1000000
+    DB_ASYNC=true python benchmarks/export_import.py --tasks 1000000 --output export_import.json
+    python benchmarks/export_import.py --base-url http://localhost:8000 --username gen1 --server-pid 1234
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "generatedpassword123"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_mb(pid):
+    """Resident memory of pid in MB: total and anonymous (heap), or {} where /proc is unavailable"""
+    fields = {"VmRSS:": "rss", "RssAnon:": "anon"}
+    sample = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name = line.split(None, 1)[0]
+                if name in fields:
+                    sample[fields[name]] = int(line.split()[1]) / 1024
+    except (OSError, TypeError):
+        pass
+    return sample
+
+
+class MemorySampler(threading.Thread):
+    """Polls the server's memory during a phase and keeps the peaks"""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            for name, value in memory_mb(self.pid).items():
+                self.peak[name] = max(self.peak.get(name, 0), value)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return {f"server_peak_{name}_mb": round(value, 1) for name, value in self.peak.items()}
+
+
+def generate(database_url, options):
+    command = [
+        sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "generate_dataset.py"),
+        "--database-url", database_url, "--users", "1", "--prefix", "bench",
+        "--distribution", "constant", "--tasks-mean", str(options.tasks), "--tasks-max", str(options.tasks),
+        "--note-days", str(options.note_days), "--note-density", "1", "--password", PASSWORD,
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=BACKEND_DIR).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def start_server(database_url, port):
+    env = {**os.environ, "DATABASE_URL": database_url, "SLOW_QUERY_MS": "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+def phase(pid, run):
+    baseline = memory_mb(pid)
+    sampler = MemorySampler(pid)
+    sampler.start()
+    started = time.perf_counter()
+    result = run()
+    result["elapsed_s"] = round(time.perf_counter() - started, 3)
+    result["rows_per_s"] = round(result["rows"] / result["elapsed_s"]) if result["elapsed_s"] else 0
+    result.update({f"server_start_{name}_mb": round(value, 1) for name, value in baseline.items()})
+    result.update(sampler.stop())
+    return result
+
+
+def run_benchmark(client, options, pid, export_path):
+    def login(username):
+        response = client.post("/auth/login", json={"username": username, "password": PASSWORD})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    source = login(options.username)
+    username = f"import{int(time.time())}"
+    response = client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": PASSWORD,
+    })
+    response.raise_for_status()
+    target = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def export():
+        rows = size = 0
+        with client.stream("GET", "/export", headers=source) as response, open(export_path, "wb") as f:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                rows += chunk.count(b"\n")
+                size += len(chunk)
+                f.write(chunk)
+        return {"rows": rows, "bytes": size}
+
+    def upload(dry_run):
+        def run():
+            def body():
+                with open(export_path, "rb") as f:
+                    while chunk := f.read(1 << 16):
+                        yield chunk
+            response = client.post("/import", params={"dry_run": dry_run}, content=body(), headers=target)
+            response.raise_for_status()
+            result = response.json()
+            return {"rows": result["lines"], "tasks": result["tasks"], "calendar_notes": result["calendar_notes"]}
+        return run
+
+    results = {"export": phase(pid, export)}
+    results["import_dry_run"] = phase(pid, upload(True))
+    results["import"] = phase(pid, upload(False))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--note-days", type=int, default=365)
+    parser.add_argument("--base-url", help="benchmark a running server instead of a generated one")
+    parser.add_argument("--username", default="bench1", help="user to export (generated runs name it bench1)")
+    parser.add_argument("--server-pid", type=int, help="with --base-url, the server process to read peak memory from")
+    parser.add_argument("--output", help="also write the JSON result here")
+    options = parser.parse_args()
+
+    import httpx
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, "export.ndjson")
+        result = {"tasks": options.tasks, "db_async": os.getenv("DB_ASYNC", "false")}
+        server = None
+        if options.base_url:
+            base_url, pid = options.base_url, options.server_pid
+        else:
+            database_url = f"sqlite:///{os.path.join(tmp, 'export_import.db')}"
+            result["generate"] = generate(database_url, options)
+            port = free_port()
+            server = start_server(database_url, port)
+            base_url, pid = f"http://127.0.0.1:{port}", server.pid
+        try:
+            with httpx.Client(base_url=base_url, timeout=None) as client:
+                result.update(run_benchmark(client, options, pid, export_path))
+        finally:
+            if server is not None:
+                server.send_signal(signal.SIGINT)
+                server.wait()
+
+    print(json.dumps(result, indent=2))
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Load test for the TodoWeb API: scenario mixes driven by concurrent virtual users.
+
+Scenarios (one request per step, weights inside each scenario):
+- login:    login storm, every step is POST /auth/login
+- tasks:    task board CRUD: list, create, complete (+XP), delete
+- calendar: month browsing, single-day reads and note upserts
+- mixed:    5% login, 60% tasks, 35% calendar
+
+Without --base-url the app is imported and driven in-process through httpx's
+ASGI transport, against a fresh SQLite database unless DATABASE_URL is set;
+with it, requests go over the network to a running server. Results (per-operation count, errors, p50/p95/p99
+and overall throughput) are printed as JSON. Requests shed by admission
+control (503) are counted as "shed" and left out of the latencies, so the
+percentiles describe admitted requests. --baseline compares against a
+previous result and exits non-zero when a percentile or the throughput
+regresses by more than --tolerance.
+
+Usage:
+    python benchmarks/load_test.py --scenario mixed --dataset small --concurrency 50 --requests 5000
+    python benchmarks/load_test.py --scenario tasks --output baseline.json
+    python benchmarks/load_test.py --scenario tasks --baseline baseline.json --tolerance 0.25
+    ADMISSION_MAX_CONCURRENCY=0 python benchmarks/load_test.py --scenario mixed --concurrency 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# users, tasks per user, notes per user
+DATASETS = {
+    "small": (20, 20, 10),
+    "medium": (100, 200, 60),
+    "large": (500, 1000, 365),
+}
+
+PASSWORD = "loadtestpassword123"
+NOTE_EPOCH = date(2024, 1, 1)
+PERCENTILES = (50, 95, 99)
+
+
+class VirtualUser:
+    def __init__(self, client, username, token, task_ids, seed):
+        self.client = client
+        self.username = username
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.task_ids = task_ids
+        self.rng = random.Random(seed)
+
+    async def request(self, record, name, method, url, missing_ok=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400 or (missing_ok and response.status_code == 404)
+        except Exception:
+            response, ok = None, False
+        shed = response is not None and response.status_code == 503
+        record(name, time.perf_counter() - started, ok, shed_request=shed)
+        if shed:
+            # Back off like a well-behaved client instead of retrying at once
+            await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+        return response if ok else None
+
+
+async def login_step(user, record):
+    await user.request(record, "POST /auth/login", "POST", "/auth/login",
+                       json={"username": user.username, "password": PASSWORD})
+
+
+async def task_step(user, record):
+    roll = user.rng.random()
+    if roll < 0.5:
+        await user.request(record, "GET /tasks", "GET", "/tasks", headers=user.headers)
+    elif roll < 0.7 or not user.task_ids:
+        response = await user.request(record, "POST /tasks", "POST", "/tasks", headers=user.headers, json={
+            "label": f"load task {user.rng.randrange(10 ** 6)}",
+            "x": user.rng.randrange(2000), "y": user.rng.randrange(2000), "color": "#ffcc00",
+        })
+        if response is not None:
+            user.task_ids.append(response.json()["id"])
+    elif roll < 0.85:
+        task_id = user.task_ids[user.rng.randrange(len(user.task_ids))]
+        await user.request(record, "PATCH /tasks/{id}/complete", "PATCH", f"/tasks/{task_id}/complete",
+                           headers=user.headers)
+        await user.request(record, "PATCH /users/experience", "PATCH", "/users/experience",
+                           headers=user.headers, json={"points": 10})
+    else:
+        task_id = user.task_ids.pop(user.rng.randrange(len(user.task_ids)))
+        await user.request(record, "DELETE /tasks/{id}", "DELETE", f"/tasks/{task_id}", headers=user.headers)
+
+
+async def calendar_step(user, record):
+    roll = user.rng.random()
+    day = NOTE_EPOCH + timedelta(days=user.rng.randrange(365))
+    if roll < 0.6:
+        first = day.replace(day=1)
+        last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        await user.request(record, "GET /calendar-notes?from&to", "GET", "/calendar-notes",
+                           headers=user.headers, params={"from": first.isoformat(), "to": last.isoformat()})
+    elif roll < 0.85:
+        # Days without a note answer 404, which is a normal outcome here
+        await user.request(record, "GET /calendar-notes/{date}", "GET", f"/calendar-notes/{day.isoformat()}",
+                           missing_ok=True, headers=user.headers)
+    else:
+        await user.request(record, "POST /calendar-notes", "POST", "/calendar-notes", headers=user.headers,
+                           json={"date": day.isoformat(), "content": f"load note {user.rng.randrange(10 ** 6)}"})
+
+
+SCENARIOS = {
+    "login": [(login_step, 1.0)],
+    "tasks": [(task_step, 1.0)],
+    "calendar": [(calendar_step, 1.0)],
+    "mixed": [(login_step, 0.05), (task_step, 0.60), (calendar_step, 0.35)],
+}
+
+
+async def seed_post(client, url, **kwargs):
+    """POST during seeding, waiting out 503s from admission control or the hashing queue"""
+    while True:
+        response = await client.post(url, **kwargs)
+        if response.status_code != 503:
+            response.raise_for_status()
+            return response
+        await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+
+
+async def seed(client, args, semaphore):
+    """Register the dataset's users and fill their boards and calendars through the API"""
+    users, tasks_per_user, notes_per_user = DATASETS[args.dataset]
+    run_id = f"{args.seed}{int(time.time())}"
+
+    async def seed_user(index):
+        async with semaphore:
+            username = f"load{run_id}u{index}"
+            response = await seed_post(client, "/auth/register", json={
+                "username": username, "email": f"{username}@example.com", "password": PASSWORD,
+            })
+            token = response.json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            task_ids = []
+            for start in range(0, tasks_per_user, 500):
+                operations = [
+                    {"op": "create", "label": f"seed task {i}", "x": i % 2000, "y": i // 2000, "color": "#ffffff"}
+                    for i in range(start, min(start + 500, tasks_per_user))
+                ]
+                response = await seed_post(client, "/tasks/batch", json={"operations": operations}, headers=headers)
+                task_ids += [result["task"]["id"] for result in response.json()["results"]]
+            for day in range(notes_per_user):
+                note_date = (NOTE_EPOCH + timedelta(days=day)).isoformat()
+                await seed_post(client, "/calendar-notes", json={"date": note_date, "content": f"seed note {day}"},
+                                headers=headers)
+            return username, token, task_ids
+
+    return await asyncio.gather(*(seed_user(i) for i in range(users)))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, errors, shed, elapsed):
+    operations = {}
+    everything = []
+    for name in sorted(set(latencies) | set(shed)):
+        values = sorted(latencies.get(name, []))
+        everything += values
+        operations[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "shed": shed.get(name, 0),
+            **{f"p{pct}_ms": round(percentile(values, pct) * 1000, 2) for pct in PERCENTILES},
+        }
+    everything.sort()
+    return {
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "shed": sum(shed.values()),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        **{f"p{pct}_ms": round(percentile(everything, pct) * 1000, 2) for pct in PERCENTILES},
+        "operations": operations,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """List metrics that are worse than the baseline by more than tolerance (a fraction)"""
+    regressions = []
+
+    def check(label, current, previous, higher_is_worse=True):
+        if not previous:
+            return
+        change = (current - previous) / previous
+        if (change if higher_is_worse else -change) > tolerance:
+            regressions.append({"metric": label, "baseline": previous, "current": current,
+                                "change_pct": round(change * 100, 1)})
+
+    check("throughput_rps", result["throughput_rps"], baseline.get("throughput_rps"), higher_is_worse=False)
+    for pct in PERCENTILES:
+        key = f"p{pct}_ms"
+        check(key, result[key], baseline.get(key))
+        for name, stats in result["operations"].items():
+            previous = baseline.get("operations", {}).get(name)
+            if previous:
+                check(f"{name} {key}", stats[key], previous.get(key))
+    return regressions
+
+
+@asynccontextmanager
+async def open_client(args):
+    import httpx
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+            yield client
+        return
+
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            yield client
+
+
+async def run(args):
+    latencies, errors, shed = {}, {}, {}
+
+    def record(name, seconds, ok, shed_request=False):
+        if shed_request:
+            shed[name] = shed.get(name, 0) + 1
+            return
+        latencies.setdefault(name, []).append(seconds)
+        if not ok:
+            errors[name] = errors.get(name, 0) + 1
+
+    async with open_client(args) as client:
+        accounts = await seed(client, args, asyncio.Semaphore(args.concurrency))
+        users = [
+            VirtualUser(client, *accounts[i % len(accounts)], seed=args.seed * 1000003 + i)
+            for i in range(args.concurrency)
+        ]
+        steps, weights = zip(*SCENARIOS[args.scenario])
+        remaining = iter(range(args.requests))
+
+        async def drive(user):
+            for _ in remaining:
+                step = user.rng.choices(steps, weights)[0]
+                await step(user, record)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(user) for user in users))
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "scenario": args.scenario,
+        "dataset": args.dataset,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "target": args.base_url or "in-process",
+        **summarize(latencies, errors, shed, elapsed),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="small")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users issuing requests at once")
+    parser.add_argument("--requests", type=int, default=5000, help="scenario steps to run after seeding")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-url", help="load a running server instead of the in-process app")
+    parser.add_argument("--output", help="also write the JSON result here (e.g. to store a baseline)")
+    parser.add_argument("--baseline", help="previous JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed regression as a fraction")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.base_url:
+            os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'loadtest.db')}")
+            # Lock waits under load would flood stderr with slow-query lines
+            os.environ.setdefault("SLOW_QUERY_MS", "0")
+        result = asyncio.run(run(args))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = compare(result, json.load(f), args.tolerance)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if result.get("regressions"):
+        for regression in result["regressions"]:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+                  f"({regression['change_pct']:+}%)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Change stream for TodoWeb 2.0
+In-process broker fanning out per-user change events to Server-Sent Events connections
+"""
+
+import asyncio
+import json
+import logging
+import re
+import threading
+from typing import AsyncIterator, Dict, Set
+
+# Sent to a subscriber that fell behind; the client refetches instead of replaying
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+HEARTBEAT_FRAME = b": keepalive\n\n"
+STREAM_TOKEN_PARAMETER = re.compile(r"(stream_token=)[^&\s]*")
+
+
+def format_event(event_type: str, data: dict) -> bytes:
+    """Encode one event as an SSE frame"""
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    return f"event: {event_type}\ndata: {payload}\n\n".encode()
+
+
+class RedactStreamToken(logging.Filter):
+    """Blanks ?stream_token= in uvicorn access log lines; EventSource can only authenticate in the URL"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                STREAM_TOKEN_PARAMETER.sub(r"\1[redacted]", arg) if isinstance(arg, str) else arg
+                for arg in record.args
+            )
+        return True
+
+
+class Subscription:
+    """One open stream: a bounded queue of encoded frames"""
+
+    __slots__ = ("user_id", "queue")
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(queue_size)
+
+    def offer(self, frame: bytes) -> int:
+        """
+        Queue a frame without waiting
+
+        Returns:
+            int: Frames dropped to make room (0 when the frame fit)
+        """
+        try:
+            self.queue.put_nowait(frame)
+            return 0
+        except asyncio.QueueFull:
+            pass
+        # A slow reader never holds up the publisher: its backlog is replaced
+        # by a single resync marker
+        dropped = self.queue.qsize() + 1
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC_FRAME)
+        return dropped
+
+
+class ChangeBroker:
+    """Per-user fan-out of change events to the streams open in this process.
+
+    An idle stream costs one small queue and one suspended coroutine: there
+    is no per-connection timer, a single heartbeat task writes a keepalive
+    comment to every queue. Events are encoded once per publish and shared
+    by all of the user's streams. Publishing and subscribing must happen on
+    the event loop; events reach only this worker's streams.
+    """
+
+    def __init__(self, queue_size: int = 64, max_connections: int = 10000, heartbeat_seconds: float = 15.0):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def accepting(self) -> bool:
+        """Whether another stream fits under max_connections; counts refusals"""
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            return False
+        return True
+
+    def subscribe(self, user_id: int) -> Subscription:
+        with self._lock:
+            subscription = Subscription(user_id, self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self.connections += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+            self.connections -= 1
+
+    def publish(self, user_id: int, event_type: str, data: dict) -> int:
+        """
+        Send an event to every stream the user has open
+
+        Returns:
+            int: Streams the event was queued on
+        """
+        self.published += 1
+        subscriptions = self._subscribers.get(user_id)
+        if not subscriptions:
+            return 0
+        frame = format_event(event_type, data)
+        for subscription in list(subscriptions):
+            self.dropped += subscription.offer(frame)
+        self.delivered += len(subscriptions)
+        return len(subscriptions)
+
+    def subscriber_count(self, user_id: int) -> int:
+        return len(self._subscribers.get(user_id, ()))
+
+    async def run(self) -> None:
+        """Write a keepalive to every stream each heartbeat_seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self.heartbeat()
+
+    def heartbeat(self) -> None:
+        with self._lock:
+            subscriptions = [s for group in self._subscribers.values() for s in group]
+        for subscription in subscriptions:
+            # A full queue will be drained soon anyway; no need to add to it
+            if not subscription.queue.full():
+                subscription.queue.put_nowait(HEARTBEAT_FRAME)
+
+    async def stream(self, user_id: int, retry_ms: int = 3000) -> AsyncIterator[bytes]:
+        """
+        Frames for one SSE response
+
+        Subscribes on first iteration rather than up front, so a response
+        that is never started cannot leak a subscription; unsubscribes when
+        the client goes away.
+        """
+        subscription = self.subscribe(user_id)
+        try:
+            yield f"retry: {retry_ms}\n\n".encode()
+            while True:
+                yield await subscription.queue.get()
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": self.connections,
+            "users": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
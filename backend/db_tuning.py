@@ -0,0 +1,131 @@
+"""
+Database tuning profiles for TodoWeb 2.0
+SQLite pragmas, connection pool sizing and pool checkout timing, chosen by environment variables
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Values per profile; each can be overridden by the environment variable of the same name
+PROFILES = {
+    # Driver and SQLAlchemy defaults (rollback journal, 5 + 10 pool)
+    "default": {
+        "SQLITE_JOURNAL_MODE": "",
+        "SQLITE_SYNCHRONOUS": "",
+        "SQLITE_MMAP_SIZE": "",
+        "SQLITE_CACHE_SIZE": "",
+        "SQLITE_BUSY_TIMEOUT": "",
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+        "DB_POOL_TIMEOUT": "30",
+    },
+    # WAL lets readers proceed while a writer commits; NORMAL sync is durable in WAL mode
+    "production": {
+        "SQLITE_JOURNAL_MODE": "WAL",
+        "SQLITE_SYNCHRONOUS": "NORMAL",
+        "SQLITE_MMAP_SIZE": "268435456",
+        "SQLITE_CACHE_SIZE": "-65536",
+        "SQLITE_BUSY_TIMEOUT": "5000",
+        "DB_POOL_SIZE": "10",
+        "DB_MAX_OVERFLOW": "20",
+        "DB_POOL_TIMEOUT": "10",
+    },
+}
+
+SQLITE_PRAGMAS = {
+    "SQLITE_JOURNAL_MODE": "journal_mode",
+    "SQLITE_SYNCHRONOUS": "synchronous",
+    "SQLITE_MMAP_SIZE": "mmap_size",
+    "SQLITE_CACHE_SIZE": "cache_size",
+    "SQLITE_BUSY_TIMEOUT": "busy_timeout",
+}
+
+
+def _setting(profile: str, name: str) -> str:
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown database profile: {profile}")
+    return os.getenv(name, PROFILES[profile][name])
+
+
+def sqlite_pragmas(profile: str) -> Dict[str, str]:
+    """Return the pragmas to run on every new SQLite connection; empty values are skipped"""
+    pragmas = {}
+    for name, pragma in SQLITE_PRAGMAS.items():
+        value = _setting(profile, name)
+        if value:
+            pragmas[pragma] = value
+    return pragmas
+
+
+def pool_options(profile: str) -> Dict[str, float]:
+    """Return create_engine pool arguments for the profile"""
+    return {
+        "pool_size": int(_setting(profile, "DB_POOL_SIZE")),
+        "max_overflow": int(_setting(profile, "DB_MAX_OVERFLOW")),
+        "pool_timeout": float(_setting(profile, "DB_POOL_TIMEOUT")),
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas: Dict[str, str]) -> None:
+    """Apply pragmas whenever the engine opens a DBAPI connection (use sync_engine for async engines)"""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+class PoolWaitStats:
+    """Time callers spend waiting for a pooled connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            if seconds > self.wait_seconds_max:
+                self.wait_seconds_max = seconds
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+pool_wait = PoolWaitStats()
+
+
+class TimedCheckoutMixin:
+    """Records how long each checkout blocks on the underlying queue"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
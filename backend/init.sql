@@ -21,6 +21,16 @@
 -- CREATE INDEX IF NOT EXISTS idx_users_uid ON users(uid);
 -- CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 -- CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id);
+-- CREATE INDEX ix_tasks_user_id_id ON tasks(user_id, id);
 -- CREATE INDEX IF NOT EXISTS idx_calendar_notes_user_id ON calendar_notes(user_id);
 -- CREATE INDEX IF NOT EXISTS idx_calendar_notes_date ON calendar_notes(date);
 
+-- Databases created before the unique (user_id, date) note index need it for the
+-- note upserts; keep each day's newest note, then add the index. Run once, before
+-- deploying (main.add_calendar_note_date_index does the same and also fixes
+-- search_documents and user_stats):
+-- DELETE FROM calendar_notes WHERE id NOT IN (
+--     SELECT id FROM (SELECT MAX(id) AS id FROM calendar_notes GROUP BY user_id, date) AS newest
+-- );
+-- CREATE UNIQUE INDEX uq_calendar_notes_user_id_date ON calendar_notes(user_id, date);
+
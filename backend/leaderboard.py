@@ -0,0 +1,222 @@
+"""
+XP leaderboard for TodoWeb 2.0
+In-process order statistics over every user's experience points, so rank lookups never sort the users table
+"""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class RankIndex:
+    """Sorted multiset of ints with O(log n) add, remove and rank counts.
+
+    Values live in sorted blocks of up to 2 * block_size entries; a Fenwick
+    tree over the block lengths gives the number of values in the blocks
+    before any block in O(log n). Splitting a full block rebuilds the tree,
+    which happens once per block_size inserts.
+    """
+
+    def __init__(self, values: Iterable[int] = (), block_size: int = 512):
+        self.block_size = block_size
+        self.load(values)
+
+    def load(self, values: Iterable[int]) -> None:
+        ordered = sorted(values)
+        self._blocks: List[List[int]] = [
+            ordered[start:start + self.block_size] for start in range(0, len(ordered), self.block_size)
+        ]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._size = len(ordered)
+        self._rebuild_tree()
+
+    def _rebuild_tree(self) -> None:
+        tree = [0] + [len(block) for block in self._blocks]
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _tree_add(self, block_index: int, delta: int) -> None:
+        index = block_index + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _count_before(self, block_index: int) -> int:
+        total = 0
+        index = block_index
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int) -> None:
+        if not self._blocks:
+            self._blocks, self._maxes, self._size = [[value]], [value], 1
+            self._rebuild_tree()
+            return
+        block_index = min(bisect_left(self._maxes, value), len(self._blocks) - 1)
+        block = self._blocks[block_index]
+        insort(block, value)
+        self._maxes[block_index] = block[-1]
+        self._size += 1
+        if len(block) > 2 * self.block_size:
+            self._blocks[block_index:block_index + 1] = [block[:self.block_size], block[self.block_size:]]
+            self._maxes[block_index:block_index + 1] = [block[self.block_size - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(block_index, 1)
+
+    def remove(self, value: int) -> None:
+        """Remove one occurrence of value; raises ValueError when absent"""
+        block_index = bisect_left(self._maxes, value)
+        if block_index < len(self._blocks):
+            block = self._blocks[block_index]
+            position = bisect_left(block, value)
+            if position < len(block) and block[position] == value:
+                del block[position]
+                self._size -= 1
+                if block:
+                    self._maxes[block_index] = block[-1]
+                    self._tree_add(block_index, -1)
+                else:
+                    del self._blocks[block_index]
+                    del self._maxes[block_index]
+                    self._rebuild_tree()
+                return
+        raise ValueError(f"{value} is not in the index")
+
+    def count_greater(self, value: int) -> int:
+        """Number of values strictly greater than value"""
+        # Blocks before block_index hold only values <= value
+        block_index = bisect_right(self._maxes, value)
+        if block_index == len(self._blocks):
+            return 0
+        at_most = self._count_before(block_index) + bisect_right(self._blocks[block_index], value)
+        return self._size - at_most
+
+
+class Leaderboard:
+    """Every user's committed XP with competition ranking (ties share a rank).
+
+    The board starts empty and unloaded; ``load`` fills it from the users
+    table. Writers call ``set`` (absolute XP) or ``add`` (a delta) once their
+    transaction has committed. Users changed by another process are marked
+    stale and re-read by the caller before the next answer. The top rows
+    (dicts with an ``experience_points`` key) are cached until a change
+    reaches the cached range.
+    """
+
+    def __init__(self, top_size: int = 100):
+        self.top_size = top_size
+        self._lock = threading.Lock()
+        self._scores: Dict[int, int] = {}
+        self._index = RankIndex()
+        self._stale: Set[int] = set()
+        self._top: Optional[list] = None
+        # Bumped by every change, so a top list read before a change is not cached after it
+        self._generation = 0
+        self.loaded = False
+        self.top_hits = 0
+        self.top_misses = 0
+        self.stale_refreshes = 0
+
+    def load(self, scores: Iterable[Tuple[int, int]]) -> None:
+        scores = dict(scores)
+        with self._lock:
+            self._scores = scores
+            self._index.load(scores.values())
+            self._stale.clear()
+            self._top = None
+            self._generation += 1
+            self.loaded = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores = {}
+            self._index.load(())
+            self._stale.clear()
+            self._top = None
+            self._generation += 1
+            self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _set(self, user_id: int, experience_points: int) -> None:
+        old = self._scores.get(user_id)
+        if old == experience_points:
+            return
+        if old is not None:
+            self._index.remove(old)
+        self._index.add(experience_points)
+        self._scores[user_id] = experience_points
+        self._generation += 1
+        if self._top is None:
+            return
+        # A full cached list only changes when the old or new score reaches its last row
+        cutoff = self._top[-1]["experience_points"] if len(self._top) >= self.top_size else None
+        if cutoff is None or experience_points >= cutoff or (old is not None and old >= cutoff):
+            self._top = None
+
+    def set(self, user_id: int, experience_points: int) -> None:
+        with self._lock:
+            if self.loaded:
+                self._set(user_id, experience_points)
+
+    def add(self, user_id: int, delta: int) -> None:
+        with self._lock:
+            if not self.loaded:
+                return
+            if user_id in self._scores:
+                self._set(user_id, self._scores[user_id] + delta)
+            else:
+                self._stale.add(user_id)
+
+    def mark_stale(self, *user_ids: int) -> None:
+        """Record users whose XP changed elsewhere; see ``take_stale``"""
+        with self._lock:
+            if self.loaded:
+                self._stale.update(user_ids)
+
+    def take_stale(self) -> List[int]:
+        with self._lock:
+            stale, self._stale = list(self._stale), set()
+        self.stale_refreshes += len(stale)
+        return stale
+
+    def experience_points(self, user_id: int) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def rank_of(self, experience_points: int) -> int:
+        """Rank a user with this much XP would have: 1 + users with more"""
+        with self._lock:
+            return 1 + self._index.count_greater(experience_points)
+
+    def top(self, limit: int) -> Tuple[Optional[list], int]:
+        """Cached top rows (None on a miss) and the generation to pass to ``cache_top``"""
+        with self._lock:
+            if self._top is not None:
+                self.top_hits += 1
+                return self._top[:limit], self._generation
+            self.top_misses += 1
+            return None, self._generation
+
+    def cache_top(self, rows: list, generation: int) -> None:
+        """Keep the top_size rows read from the database, unless the board changed meanwhile"""
+        with self._lock:
+            if self.loaded and generation == self._generation:
+                self._top = rows
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._scores),
+            "top_hits": self.top_hits,
+            "top_misses": self.top_misses,
+            "stale_refreshes": self.stale_refreshes,
+        }
@@ -1,45 +1,160 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import create_engine, event, bindparam, case, func, insert, inspect, or_, select, text, update, delete, DDL, Column, Integer, String, DateTime, Text, Boolean, Index
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime, timedelta
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Annotated, Optional, List, Literal, Union
+from typing_extensions import TypedDict
+from contextlib import asynccontextmanager, nullcontext
+from datetime import date as Date, datetime, timedelta
+import anyio
+import asyncio
+import base64
+import json
 import jwt
+import logging
+import math
 import os
-from passlib.context import CryptContext
 import uvicorn
+from urllib.parse import urlencode
 from dotenv import load_dotenv
+from principal_cache import PrincipalCache
+from db_tuning import TimedAsyncAdaptedQueuePool, TimedQueuePool, install_sqlite_pragmas, pool_options, pool_wait, sqlite_pragmas
+from metrics import MetricsMiddleware, RequestMetrics, format_metric
+from admission import AdmissionController, AdmissionMiddleware
+from profiling import ProfilingMiddleware, RequestProfiler, SlowQueryLog
+from password_hasher import PasswordHasher, PasswordHasherBusy, build_context
+from xp_coalescer import ExperienceCoalescer
+from username_index import UsernameIndex
+from read_routing import ReadYourWrites
+from shared_cache import create_cache
+from change_stream import ChangeBroker, RedactStreamToken
+from leaderboard import Leaderboard
+from search_index import FTS5_DROP_STATEMENT, FTS5_STATEMENTS, boolean_mode_query, document_terms, fts5_query
 # Removed Google OAuth imports
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
 # Database setup - Using SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./todoweb.db")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
 
-# Handle different database types
-if DATABASE_URL.startswith("mysql"):
-    # MySQL configuration
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,
-        pool_recycle=300,
-        echo=os.getenv("DB_ECHO", "false").lower() == "true"
-    )
-else:
+# Tuning profile: "production" (WAL + pragmas for SQLite, larger pool) or "default"
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+DB_POOL_OPTIONS = pool_options(DB_PROFILE)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+SQLITE_PRAGMAS = sqlite_pragmas(DB_PROFILE)
+
+# Async mode serves requests through an asyncio driver instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# Async drivers used when ASYNC_DATABASE_URL is not set explicitly
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+asyncmy",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap the driver of a sync database URL for its asyncio counterpart"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+def is_memory_database(url: str) -> bool:
+    # In-memory SQLite uses a single shared connection, not a sized pool
+    return make_url(url).database in (None, "", ":memory:")
+
+def create_database_engine(url: str):
+    """Sync engine with the pool and pragma settings for the URL's database type"""
+    if url.startswith("mysql"):
+        # MySQL configuration
+        return create_engine(
+            url,
+            pool_pre_ping=True,
+            pool_recycle=DB_POOL_RECYCLE,
+            poolclass=TimedQueuePool,
+            echo=DB_ECHO,
+            **DB_POOL_OPTIONS
+        )
+    if is_memory_database(url):
+        return create_engine(url, connect_args={"check_same_thread": False})
     # SQLite configuration (for development)
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=TimedQueuePool,
+        **DB_POOL_OPTIONS
+    )
+    install_sqlite_pragmas(sqlite_engine, SQLITE_PRAGMAS)
+    return sqlite_engine
 
+def create_async_database_engine(url: str):
+    """Async counterpart of create_database_engine"""
+    if url.startswith("mysql"):
+        return create_async_engine(
+            url,
+            pool_pre_ping=True,
+            pool_recycle=DB_POOL_RECYCLE,
+            poolclass=TimedAsyncAdaptedQueuePool,
+            echo=DB_ECHO,
+            **DB_POOL_OPTIONS
+        )
+    if is_memory_database(url):
+        return create_async_engine(url)
+    sqlite_engine = create_async_engine(
+        url,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        **DB_POOL_OPTIONS
+    )
+    install_sqlite_pragmas(sqlite_engine.sync_engine, SQLITE_PRAGMAS)
+    return sqlite_engine
+
+engine = create_database_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The sync engine is always built: it owns schema creation and the sync request path
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+    async_engine = create_async_database_engine(ASYNC_DATABASE_URL)
+    # Loaded objects must stay readable after commit without lazy IO on the event loop
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Optional read replica for read-only handlers; never used for schema creation or writes
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+read_engine = None
+ReadSessionLocal = None
+if DATABASE_READ_URL:
+    if DB_ASYNC:
+        read_engine = create_async_database_engine(
+            os.getenv("ASYNC_DATABASE_READ_URL") or to_async_url(DATABASE_READ_URL)
+        )
+        ReadSessionLocal = async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+    else:
+        read_engine = create_database_engine(DATABASE_READ_URL)
+        ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 class Base(DeclarativeBase):
     pass
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes with any other cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = build_context(BCRYPT_ROUNDS)
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     # Allow tests to run without SECRET_KEY by using a default test key
@@ -61,8 +176,101 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 security = HTTPBearer()
 
+# Authenticated users are served from process memory between user-row writes
+principal_cache = PrincipalCache(
+    max_size=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+)
+
+# Login/register hashing runs on its own process pool with a bounded queue
+password_hasher = PasswordHasher(
+    rounds=BCRYPT_ROUNDS,
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None,
+    queue_size=int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64")),
+    retry_after=int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+)
+
+# Optional XP write coalescing: increments are buffered per user and applied
+# in batches, trading read-your-writes on /auth/me for fewer users-row writes
+XP_COALESCE = os.getenv("XP_COALESCE", "false").lower() == "true"
+xp_coalescer = None
+if XP_COALESCE:
+    xp_coalescer = ExperienceCoalescer(
+        interval_seconds=float(os.getenv("XP_FLUSH_INTERVAL", "1.0")),
+        max_users=int(os.getenv("XP_FLUSH_MAX_USERS", "1000"))
+    )
+
+# Bloom filter answering /auth/check-username; only possible hits reach the database
+username_index = UsernameIndex(capacity=int(os.getenv("USERNAME_INDEX_CAPACITY", "1000000")))
+
+# Cache for list responses ("memory", "redis" or "none"); entries are keyed by the
+# user's data version, and writes publish invalidations to every worker
+response_cache = create_cache(
+    os.getenv("CACHE_BACKEND", "memory"),
+    url=os.getenv("CACHE_URL", ""),
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("CACHE_TTL", "300"))
+)
+
+# Server-Sent Events stream of each user's changes (GET /events), fed by the
+# mutation handlers once their transaction has committed
+change_broker = ChangeBroker(
+    queue_size=int(os.getenv("STREAM_QUEUE_SIZE", "64")),
+    max_connections=int(os.getenv("STREAM_MAX_CONNECTIONS", "10000")),
+    heartbeat_seconds=float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+)
+# EventSource cannot send headers, so /events takes a short-lived token in its
+# URL that nothing else accepts; keep it out of the access log all the same
+STREAM_TOKEN_SCOPE = "events"
+STREAM_TOKEN_SECONDS = int(os.getenv("STREAM_TOKEN_SECONDS", "60"))
+logging.getLogger("uvicorn.access").addFilter(RedactStreamToken())
+
+# Every user's XP in an order-statistics index: GET /users/me/rank without
+# sorting the users table, and the top rows of GET /leaderboard cached
+LEADERBOARD_MAX_LIMIT = 100
+leaderboard = Leaderboard(top_size=LEADERBOARD_MAX_LIMIT)
+
 # Removed Google OAuth configuration
 
+# Spatial grid for GET /tasks?bbox: the board is cut into square cells and
+# each task stores the cell holding its (x, y). A viewport covers a few cells,
+# looked up by equality on the (user_id, cell) index; cells are numbered row
+# by row, so larger boxes fall back to one cell range per grid row.
+# Coordinates beyond the grid clamp to its edge cells, which the exact x/y
+# filter then sorts out.
+TASK_GRID_CELL_SIZE = 256
+TASK_GRID_SPAN = 1 << 14  # cells on each side of the origin, per axis
+TASK_GRID_MAX_CELLS = 256
+TASK_GRID_MAX_RANGES = 32
+
+def grid_index(value: float) -> int:
+    return min(max(int(value // TASK_GRID_CELL_SIZE), -TASK_GRID_SPAN), TASK_GRID_SPAN - 1) + TASK_GRID_SPAN
+
+def task_cell(x: float, y: float) -> int:
+    return grid_index(y) * 2 * TASK_GRID_SPAN + grid_index(x)
+
+def default_task_cell(context):
+    """Column default, so ORM adds and Core bulk inserts alike get a cell"""
+    params = context.get_current_parameters()
+    if params.get("x") is None or params.get("y") is None:
+        return None
+    return task_cell(params["x"], params["y"])
+
+def bbox_cells(x0: float, y0: float, x1: float, y1: float) -> tuple:
+    """Cells covering the box: ``(cells, None)`` for small boxes, otherwise
+    ``(None, ranges)`` with inclusive (first, last) ranges, one per grid row
+    or a single one past TASK_GRID_MAX_RANGES rows"""
+    first_col, last_col = grid_index(x0), grid_index(x1)
+    first_row, last_row = grid_index(y0), grid_index(y1)
+    row_width = 2 * TASK_GRID_SPAN
+    rows = range(first_row, last_row + 1)
+    if len(rows) * (last_col - first_col + 1) <= TASK_GRID_MAX_CELLS:
+        return [row * row_width + col for row in rows for col in range(first_col, last_col + 1)], None
+    if len(rows) > TASK_GRID_MAX_RANGES:
+        return None, [(first_row * row_width + first_col, last_row * row_width + last_col)]
+    return None, [(row * row_width + first_col, row * row_width + last_col) for row in rows]
+
 # Database Models
 class User(Base):
     __tablename__ = "users"
@@ -74,6 +282,11 @@ class User(Base):
     display_name = Column(String(100))
     experience_points = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # GET /leaderboard reads the top of this index
+    __table_args__ = (
+        Index("ix_users_experience_points", experience_points.desc(), id),
+    )
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -86,6 +299,21 @@ class Task(Base):
     color = Column(String(50))
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Change tracking for GET /sync: the user's data version at the last write,
+    # and a tombstone time instead of removing deleted rows right away
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    revision = Column(Integer, nullable=False, default=0)
+    deleted_at = Column(DateTime, nullable=True)
+    # Grid cell of (x, y), see task_cell
+    cell = Column(Integer, default=default_task_cell)
+    
+    # Keyset pagination walks a user's tasks in id order; sync reads them by
+    # revision and viewport queries by grid cell
+    __table_args__ = (
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        Index("ix_tasks_user_id_revision", "user_id", "revision"),
+        Index("ix_tasks_user_id_cell", "user_id", "cell"),
+    )
 
 class CalendarNote(Base):
     __tablename__ = "calendar_notes"
@@ -95,6 +323,61 @@ class CalendarNote(Base):
     date = Column(String(10))  # Format: YYYY-MM-DD
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    revision = Column(Integer, nullable=False, default=0)
+    
+    # One note per user and day; also serves date-range reads
+    __table_args__ = (
+        Index("uq_calendar_notes_user_id_date", "user_id", "date", unique=True),
+        Index("ix_calendar_notes_user_id_revision", "user_id", "revision"),
+    )
+
+class UserDataVersion(Base):
+    __tablename__ = "user_data_versions"
+    
+    # Bumped with every task, note or XP write; read endpoints derive their ETag from it
+    # and rows written by the change carry it as their revision
+    user_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # Highest revision among compacted tombstones: older sync points must start over
+    purged_revision = Column(Integer, nullable=False, default=0)
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    # Counters for GET /auth/me, updated in the same transaction as the rows
+    # they count (see bump_user_stats) so reading them never scans tasks or notes
+    user_id = Column(Integer, primary_key=True)
+    tasks_count = Column(Integer, nullable=False, default=0)  # live tasks, completed or not
+    tasks_completed = Column(Integer, nullable=False, default=0)  # completions ever; deleting a task keeps them
+    calendar_notes_count = Column(Integer, nullable=False, default=0)
+    # Latest UTC day with a completion, the completions on it and the run of
+    # consecutive completion days ending with it
+    last_completed_on = Column(String(10))  # Format: YYYY-MM-DD
+    completed_on_last_day = Column(Integer, nullable=False, default=0)
+    streak_days = Column(Integer, nullable=False, default=0)
+
+class SearchDocument(Base):
+    __tablename__ = "search_documents"
+    
+    # One row per live task and note, written by the handlers that change them;
+    # terms are scoped to the owner (see search_index)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    kind = Column(String(8), nullable=False)  # "task" or "note"
+    ref_id = Column(Integer, nullable=False)
+    terms = Column(Text, nullable=False)
+    
+    __table_args__ = (
+        Index("uq_search_documents_kind_ref_id", "kind", "ref_id", unique=True),
+        Index("ix_search_documents_user_id", "user_id"),
+        Index("ix_search_documents_terms", "terms", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+# SQLite's full-text index is a virtual table next to search_documents
+for statement in FTS5_STATEMENTS:
+    event.listen(SearchDocument.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(SearchDocument.__table__, "before_drop", DDL(FTS5_DROP_STATEMENT).execute_if(dialect="sqlite"))
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -114,6 +397,13 @@ class UserResponse(BaseModel):
     experience_points: int
     created_at: datetime
 
+class UserProfileResponse(UserResponse):
+    tasks_count: int = 0
+    total_tasks_completed: int = 0
+    tasks_today: int = 0
+    streak_days: int = 0
+    calendar_notes_count: int = 0
+
 class TaskCreate(BaseModel):
     label: str
     x: int
@@ -129,6 +419,27 @@ class TaskResponse(BaseModel):
     completed: bool
     created_at: datetime
 
+class TaskCreateOperation(TaskCreate):
+    op: Literal["create"]
+
+class TaskIdOperation(BaseModel):
+    op: Literal["complete", "delete"]
+    id: int
+
+TaskBatchOperation = Annotated[Union[TaskCreateOperation, TaskIdOperation], Field(discriminator="op")]
+
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskBatchOperation] = Field(..., min_length=1, max_length=500)
+
+class TaskBatchResult(BaseModel):
+    op: str
+    status: int
+    id: Optional[int] = None
+    task: Optional[TaskResponse] = None
+
+class TaskBatchResponse(BaseModel):
+    results: List[TaskBatchResult]
+
 class CalendarNoteCreate(BaseModel):
     date: str
     content: str
@@ -139,9 +450,111 @@ class CalendarNoteResponse(BaseModel):
     content: str
     created_at: datetime
 
+# Column rows for the list endpoints: serialised by pydantic-core in one
+# pass, without building ORM entities or validating each row
+class TaskRow(TypedDict):
+    id: int
+    label: str
+    x: int
+    y: int
+    color: str
+    completed: bool
+    created_at: datetime
+
+class CalendarNoteRow(TypedDict):
+    id: int
+    date: str
+    content: str
+    created_at: datetime
+
+# NDJSON export lines; POST /import accepts the same format
+class TaskRecord(TaskRow):
+    type: Literal["task"]
+
+class CalendarNoteRecord(CalendarNoteRow):
+    type: Literal["note"]
+
+class ProfileRecord(TypedDict):
+    type: Literal["profile"]
+    format: int
+    revision: int
+    username: str
+    email: str
+    display_name: Optional[str]
+    experience_points: int
+    created_at: datetime
+
+class ImportTask(BaseModel):
+    type: Literal["task"]
+    label: str = Field(..., max_length=255)
+    x: int
+    y: int
+    color: str = Field(..., max_length=50)
+    completed: bool = False
+    created_at: Optional[datetime] = None
+
+class ImportCalendarNote(BaseModel):
+    type: Literal["note"]
+    date: Date
+    content: str
+    created_at: Optional[datetime] = None
+
+class ImportProfile(BaseModel):
+    # Profile lines are accepted so an export imports as-is, but the account is not changed
+    type: Literal["profile"]
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    dry_run: bool
+    lines: int
+    tasks: int
+    calendar_notes: int
+    errors: List[ImportLineError]
+
+class SyncResponse(TypedDict):
+    revision: int
+    reset: bool
+    tasks: List[TaskRow]
+    deleted_task_ids: List[int]
+    calendar_notes: List[CalendarNoteRow]
+
+class SearchHit(TypedDict):
+    type: Literal["task", "note"]
+    score: float
+    task: Optional[TaskRow]
+    note: Optional[CalendarNoteRow]
+
+task_rows_adapter = TypeAdapter(List[TaskRow])
+calendar_note_rows_adapter = TypeAdapter(List[CalendarNoteRow])
+sync_response_adapter = TypeAdapter(SyncResponse)
+search_hits_adapter = TypeAdapter(List[SearchHit])
+task_record_adapter = TypeAdapter(TaskRecord)
+calendar_note_record_adapter = TypeAdapter(CalendarNoteRecord)
+profile_record_adapter = TypeAdapter(ProfileRecord)
+import_record_adapter = TypeAdapter(
+    Annotated[Union[ImportTask, ImportCalendarNote, ImportProfile], Field(discriminator="type")]
+)
+TASK_ROW_COLUMNS = [getattr(Task, name) for name in TaskRow.__annotations__]
+CALENDAR_NOTE_ROW_COLUMNS = [getattr(CalendarNote, name) for name in CalendarNoteRow.__annotations__]
+
 class ExperienceUpdate(BaseModel):
     points: int
 
+class LeaderboardEntry(BaseModel):
+    rank: int
+    id: int
+    username: str
+    display_name: Optional[str] = None
+    experience_points: int
+
+class RankResponse(BaseModel):
+    rank: int
+    experience_points: int
+    users: int
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -151,8 +564,76 @@ class TokenResponse(BaseModel):
     token_type: str
     user: UserResponse
 
+class StreamTokenResponse(BaseModel):
+    stream_token: str
+    expires_in: int
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with open_session() as db:
+        username_index.warm((await db.scalars(select(User.username))).all())
+        leaderboard.load((await db.execute(select(User.id, User.experience_points))).all())
+    if response_cache is not None:
+        await response_cache.start(on_user_invalidated)
+    xp_flusher = None
+    if xp_coalescer is not None:
+        xp_flusher = asyncio.create_task(xp_coalescer.run(apply_experience_deltas))
+    stream_heartbeat = asyncio.create_task(change_broker.run())
+    compactor = None
+    if SYNC_COMPACT_INTERVAL > 0:
+        compactor = asyncio.create_task(run_tombstone_compaction())
+    yield
+    stream_heartbeat.cancel()
+    if compactor is not None:
+        compactor.cancel()
+    if xp_flusher is not None:
+        xp_flusher.cancel()
+        await xp_coalescer.flush(apply_experience_deltas)
+    if response_cache is not None:
+        await response_cache.close()
+    password_hasher.shutdown()
+
 # FastAPI app
-app = FastAPI(title="TodoWeb API", version="1.0.0")
+app = FastAPI(title="TodoWeb API", version="1.0.0", lifespan=lifespan)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication is busy, please retry"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Admission control: at most ADMISSION_MAX_CONCURRENCY requests run at once
+# per worker (0 disables it), a short priority queue holds the next few and
+# everything else gets an immediate 503. The default admits as many requests
+# as there are database sessions (DB_MAX_SESSIONS), so admitted requests do not
+# queue again for a connection. Added before CORS, so shed responses still
+# carry CORS headers.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", os.getenv(
+    "DB_MAX_SESSIONS", str(DB_POOL_OPTIONS["pool_size"] + DB_POOL_OPTIONS["max_overflow"])
+)))
+admission_controller = AdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    queue_size=int(os.getenv("ADMISSION_QUEUE_SIZE", "64")),
+    max_wait_seconds=float(os.getenv("ADMISSION_MAX_WAIT_MS", "250")) / 1000,
+    retry_after=int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+)
+# Long-lived streams would hold a slot for minutes; they have their own limits
+ADMISSION_EXEMPT_PATHS = {"/metrics", "/events", "/export", "/import"}
+# bcrypt runs for hundreds of milliseconds per request
+ADMISSION_LOW_PRIORITY_PATHS = {"/auth/login", "/auth/register"}
+
+def admission_priority(method: str, path: str) -> Optional[int]:
+    """Priority class of a request: reads first, then writes, then password hashing; None bypasses admission"""
+    if path in ADMISSION_EXEMPT_PATHS:
+        return None
+    if path in ADMISSION_LOW_PRIORITY_PATHS:
+        return 2
+    return 0 if method in ("GET", "HEAD") else 1
+
+if ADMISSION_MAX_CONCURRENCY > 0:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller, priority=admission_priority)
 
 # CORS middleware
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
@@ -162,97 +643,421 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "X-Profile-Id", "Retry-After"],
 )
 
+# Slow-query log (SLOW_QUERY_MS=0 disables it) and on-demand request profiling
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS or None)
+slow_query_log.install()
+request_profiler = RequestProfiler(
+    directory=os.getenv("PROFILE_DIR", "./profiles"),
+    token=os.getenv("PROFILE_TOKEN") or None,
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval_seconds=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+# Request telemetry; outermost so it times CORS and error handling too
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+request_metrics = RequestMetrics()
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+if DB_ASYNC:
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
 
-# Authentication helper functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+# Replica session for read-only handlers; None when no DATABASE_READ_URL is configured
+if DB_ASYNC:
+    async def get_read_db():
+        if ReadSessionLocal is None:
+            yield None
+            return
+        async with ReadSessionLocal() as db:
+            yield db
+else:
+    def get_read_db():
+        if ReadSessionLocal is None:
+            yield None
+            return
+        db = ReadSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+class SyncSessionAdapter:
+    """Awaitable AsyncSession-style facade over a sync Session.
+
+    Each call is pushed to the threadpool so handlers can be written once
+    against the async API and still run on the sync engine.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.execute, statement, params)
+
+    async def scalar(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params)
+
+    async def scalars(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params)
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
 
-def create_access_token(data: dict):
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    def get_bind(self):
+        return self.sync_session.get_bind()
+
+    @property
+    def info(self):
+        return self.sync_session.info
+
+DBSession = Union[AsyncSession, SyncSessionAdapter]
+
+# Sync sessions hold their connection across awaits. Capping them at the pool
+# capacity (pool size + overflow) keeps threadpool workers from blocking on
+# checkout while the sessions that own connections wait for a thread.
+DB_MAX_SESSIONS = int(os.getenv(
+    "DB_MAX_SESSIONS",
+    str(DB_POOL_OPTIONS["pool_size"] + DB_POOL_OPTIONS["max_overflow"])
+))
+sync_session_slots = anyio.Semaphore(DB_MAX_SESSIONS)
+
+async def get_session(request: Request, db=Depends(get_db)):
+    """Hand out the request session behind a uniform awaitable API"""
+    # Tabs tag their requests so they can skip stream events they caused
+    source = request.headers.get("x-client-id", "")[:64] or None
+    if isinstance(db, AsyncSession):
+        yield db
+        await publish_changes(db, source)
+        return
+    async with sync_session_slots:
+        session = SyncSessionAdapter(db)
+        yield session
+    await publish_changes(session, source)
+
+@asynccontextmanager
+async def open_session(source: Optional[str] = None, slot: bool = False):
+    """
+    Session for work outside the request session
+    
+    Background jobs open one directly. A handler that must not hold a
+    session for its whole request (a streamed upload) opens short ones with
+    slot=True, which waits for a sync session slot like get_session does.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+            await publish_changes(db, source)
+        return
+    async with sync_session_slots if slot else nullcontext():
+        db = SessionLocal()
+        try:
+            session = SyncSessionAdapter(db)
+            yield session
+        finally:
+            await run_in_threadpool(db.close)
+    await publish_changes(session, source)
+
+# Authentication helper functions
+def create_access_token(data: dict, expires: timedelta = timedelta(hours=24)):
     """Create JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=24)
+    expire = datetime.utcnow() + expires
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# Dependency to get current user
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def token_user_id(token: str, scope: Optional[str] = None) -> int:
+    """Return the user id a token was issued for, or raise 401
+
+    Access tokens carry no scope; a scoped token (the stream token) is only
+    accepted where that scope is asked for.
+    """
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    return int(user_id)
+
+async def load_principal(db: DBSession, user_id: int) -> UserResponse:
+    """Return the cached principal, loading it from the database on a miss"""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    principal = UserResponse.model_validate(user, from_attributes=True)
+    principal_cache.set(user_id, principal)
+    return principal
 
-# Authentication endpoints
-@app.post("/auth/register", response_model=TokenResponse)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    # Check if username is taken
-    existing_username = db.query(User).filter(User.username == user_data.username).first()
-    if existing_username:
-        raise HTTPException(status_code=400, detail="Username already taken")
+# Dependency to get current user
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: DBSession = Depends(get_session)):
+    return await load_principal(db, token_user_id(credentials.credentials))
+
+async def get_current_user_unpinned(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """get_current_user for handlers that open their own sessions; a cache miss uses a short one"""
+    user_id = token_user_id(credentials.credentials)
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    async with open_session(slot=True) as db:
+        return await load_principal(db, user_id)
+
+# Users who wrote within the window read from the primary, so they see their own changes
+read_routing = ReadYourWrites(window_seconds=float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")))
+
+async def get_read_session(
+    current_user: UserResponse = Depends(get_current_user),
+    primary: DBSession = Depends(get_session),
+    replica=Depends(get_read_db)
+):
+    """Session for read-only handlers: a replica unless the user has written recently"""
+    if replica is None or not read_routing.route(current_user.id):
+        yield primary
+    elif isinstance(replica, AsyncSession):
+        yield replica
+    else:
+        yield SyncSessionAdapter(replica)
+
+# Change tracking
+def dialect_insert(dialect_name: str, table):
+    """Return the dialect-specific insert() that supports upsert clauses"""
+    dialect_module = {"mysql": mysql, "postgresql": postgresql}.get(dialect_name, sqlite)
+    return dialect_module.insert(table)
+
+def data_version_upsert(db: DBSession, user_ids):
+    """Record the users as changed and build the statement that advances their versions"""
+    read_routing.mark(*user_ids)
+    changed = db.info.setdefault("changed_users", {})
+    for user_id in user_ids:
+        changed.setdefault(user_id, "data")
+    dialect_name = db.get_bind().dialect.name
+    stmt = dialect_insert(dialect_name, UserDataVersion).values(
+        [{"user_id": user_id, "version": 1} for user_id in user_ids]
+    )
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update(version=UserDataVersion.version + 1)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserDataVersion.user_id],
+        set_={"version": UserDataVersion.version + 1}
+    )
+
+async def bump_data_version(db: DBSession, *user_ids: int):
+    """Advance the users' data versions inside the caller's transaction"""
+    await db.execute(data_version_upsert(db, user_ids))
+
+async def next_revision(db: DBSession, user_id: int) -> int:
+    """
+    Advance the user's data version and return it
     
-    # Check if email is taken
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already registered")
+    Task and note writes stamp their rows with the result. The version row
+    stays locked until commit, so a user's revisions commit in order.
+    """
+    stmt = data_version_upsert(db, [user_id])
+    dialect = db.get_bind().dialect
+    if dialect.name != "mysql" and dialect.insert_returning:
+        return await db.scalar(stmt.returning(UserDataVersion.version))
+    await db.execute(stmt)
+    return await data_version(db, user_id)
+
+def mark_principal_changed(db: DBSession, *user_ids: int):
+    """Record that the users' own rows changed, so cached principals are dropped everywhere"""
+    changed = db.info.setdefault("changed_users", {})
+    for user_id in user_ids:
+        changed[user_id] = "principal"
+
+def record_event(db: DBSession, user_id: int, event_type: str, **data):
+    """Queue a change event for the user's streams; sent only if the session finishes"""
+    db.info.setdefault("change_events", []).append((user_id, event_type, data))
+
+async def publish_changes(db: DBSession, source: Optional[str] = None):
+    """Publish invalidations and change events for what the session wrote; called once it is done"""
+    for user_id, event_type, data in db.info.pop("change_events", ()):
+        if source:
+            data["source"] = source
+        change_broker.publish(user_id, event_type, data)
+    changed = db.info.pop("changed_users", None)
+    if not changed or response_cache is None:
+        return
+    for scope in ("data", "principal"):
+        user_ids = [user_id for user_id, changed_scope in changed.items() if changed_scope == scope]
+        if user_ids:
+            await response_cache.invalidate(user_ids, scope)
+
+def on_user_invalidated(user_id: int, scope: str):
+    """Apply an invalidation from this or another worker to process-local state"""
+    if scope == "principal":
+        principal_cache.invalidate(user_id)
+        leaderboard.mark_stale(user_id)
+    # A write on another worker should also steer this worker's reads to the primary
+    read_routing.mark(user_id)
+
+async def data_version(db: DBSession, user_id: int) -> int:
+    """
+    Read the user's data version
     
+    Must run before the collection is read, so a concurrent write can only
+    make the version (and the ETag and cache entry derived from it) older
+    than the body, never newer.
+    """
+    return await db.scalar(select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)) or 0
+
+def not_modified_response(request: Request, response: Response, version: Union[int, str]) -> Optional[Response]:
+    """
+    Answer a conditional GET from the user's data version alone
+    
+    Returns:
+        A 304 response when If-None-Match matches, otherwise None after
+        setting the ETag on the outgoing response
+    """
+    etag = f'W/"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        # Weak comparison: W/"1" and "1" name the same version
+        if "*" in candidates or etag in candidates or etag[2:] in candidates:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def json_response(content: bytes, response: Response) -> Response:
+    """Wrap serialised JSON, keeping headers set on response"""
+    fast_response = Response(content=content, media_type="application/json")
+    for name, value in response.headers.items():
+        if name not in ("content-length", "content-type"):
+            fast_response.headers[name] = value
+    return fast_response
+
+def rows_json(adapter: TypeAdapter, rows) -> bytes:
+    """Serialise column rows directly to JSON"""
+    return adapter.dump_json([row._asdict() for row in rows], warnings=False)
+
+def rows_json_response(adapter: TypeAdapter, rows, response: Response) -> Response:
+    return json_response(rows_json(adapter, rows), response)
+
+def cache_field(request: Request, version: int) -> str:
+    """Cache entry name for this read of the user's data at one version"""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}@{version}"
+
+async def cached_json_response(user_id: int, field: str, response: Response, load) -> Response:
+    """Serve the body from the response cache, or build it with load() and store it"""
+    if response_cache is not None:
+        cached = await response_cache.get(user_id, field)
+        if cached is not None:
+            return json_response(cached, response)
+    content = await load()
+    if response_cache is not None:
+        await response_cache.set(user_id, field, content)
+    return json_response(content, response)
+
+# Authentication endpoints
+@app.post("/auth/register", response_model=TokenResponse)
+async def register_user(user_data: UserCreate, db: DBSession = Depends(get_session)):
     # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_dict = user_data.model_dump()
     user_dict.pop('password')
     user_dict['hashed_password'] = hashed_password
     
+    # The unique indexes on username and email reject duplicates in the INSERT itself
     db_user = User(**user_dict)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.flush()
+    except IntegrityError as e:
+        await db.rollback()
+        # MySQL echoes the duplicate value first; only the key name identifies the column
+        constraint = str(e.orig).lower().rsplit("for key", 1)[-1]
+        if "username" in constraint:
+            username_index.add(user_data.username)
+            raise HTTPException(status_code=400, detail="Username already taken")
+        if "email" in constraint:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        raise
+    
+    # Defaults are populated by the flush, so no refresh round trip is needed
+    user = UserResponse(
+        id=db_user.id,
+        username=db_user.username,
+        email=db_user.email,
+        display_name=db_user.display_name,
+        experience_points=db_user.experience_points,
+        created_at=db_user.created_at
+    )
+    await db.commit()
+    username_index.add(user.username)
+    leaderboard.set(user.id, user.experience_points)
     
     # Create access token
-    access_token = create_access_token(data={"sub": str(db_user.id)})
+    access_token = create_access_token(data={"sub": str(user.id)})
     
     return TokenResponse(
         access_token=access_token,
         token_type="bearer",
-        user=UserResponse(
-            id=db_user.id,
-            username=db_user.username,
-            email=db_user.email,
-            display_name=db_user.display_name,
-            experience_points=db_user.experience_points,
-            created_at=db_user.created_at
-        )
+        user=user
     )
 
 @app.post("/auth/login", response_model=TokenResponse)
-def login_user(login_data: UserLogin, db: Session = Depends(get_db)):
+async def login_user(login_data: UserLogin, db: DBSession = Depends(get_session)):
     """Authenticate user with username and password"""
     # Find user by username
-    user = db.query(User).filter(User.username == login_data.username).first()
+    user = await db.scalar(select(User).where(User.username == login_data.username))
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
+    valid, new_hash = await password_hasher.verify_and_update(login_data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    
+    # Upgrade hashes created with an outdated cost factor
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        await db.refresh(user)
+    
     # Create access token
     access_token = create_access_token(data={"sub": str(user.id)})
     
@@ -269,105 +1074,1126 @@ def login_user(login_data: UserLogin, db: Session = Depends(get_db)):
         )
     )
 
-@app.get("/auth/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return current_user
+@app.get("/auth/me", response_model=UserProfileResponse)
+async def get_current_user_info(request: Request, response: Response, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_read_session)):
+    """The user with their stats: one primary-key read of user_stats, however many tasks and notes they own"""
+    today = utc_today()
+    user = with_pending_experience(current_user)
+    # tasks_today and streak_days also change at midnight, so the day is part of the ETag, and so is
+    # XP still buffered by the coalescer, which reaches the data version only when it is flushed
+    version = f"{await data_version(db, current_user.id)}-{today.isoformat()}"
+    if user.experience_points != current_user.experience_points:
+        version += f"-{user.experience_points - current_user.experience_points}"
+    not_modified = not_modified_response(request, response, version)
+    if not_modified:
+        return not_modified
+    stats = await db.get(UserStats, current_user.id)
+    return UserProfileResponse(**user.model_dump(), **user_stats_fields(stats, today))
 
 @app.post("/auth/check-username")
-def check_username(request: dict, db: Session = Depends(get_db)):
+async def check_username(request: dict, db: DBSession = Depends(get_session)):
     username = request.get("username")
     if not username:
         raise HTTPException(status_code=400, detail="Username is required")
-    existing_user = db.query(User).filter(User.username == username).first()
+    # A Bloom negative is definitive; other workers' recent signups are caught at register time
+    if username_index.ready and not username_index.might_contain(username):
+        return {"available": True}
+    existing_user = await db.scalar(select(User.id).where(User.username == username))
     return {"available": existing_user is None}
 
 # User endpoints
 @app.get("/users/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: int, db: DBSession = Depends(get_session)):
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+# Search documents, written in the same transaction as the rows they describe
+async def index_search_documents(db: DBSession, user_id: int, kind: str, rows) -> None:
+    """Index (id, text) pairs of one kind, replacing earlier versions"""
+    rows = list(rows)
+    if not rows:
+        return
+    await unindex_search_documents(db, kind, [ref_id for ref_id, _ in rows])
+    await db.execute(insert(SearchDocument), [
+        {"user_id": user_id, "kind": kind, "ref_id": ref_id, "terms": document_terms(user_id, text)}
+        for ref_id, text in rows
+    ])
+
+async def unindex_search_documents(db: DBSession, kind: str, ref_ids) -> None:
+    await db.execute(
+        delete(SearchDocument)
+        .where(SearchDocument.kind == kind, SearchDocument.ref_id.in_(ref_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+def rebuild_search_documents(conn, user_ids) -> int:
+    """Recreate the users' search documents from their tasks and notes.
+
+    For bulk loads and databases created before GET /search; takes a sync
+    connection and returns the number of documents written.
+    """
+    conn.execute(delete(SearchDocument).where(SearchDocument.user_id.in_(user_ids)))
+    tasks = conn.execute(select(Task.user_id, Task.id, Task.label).where(Task.user_id.in_(user_ids), Task.deleted_at.is_(None)))
+    notes = conn.execute(select(CalendarNote.user_id, CalendarNote.id, CalendarNote.content).where(CalendarNote.user_id.in_(user_ids)))
+    documents = [
+        {"user_id": user_id, "kind": kind, "ref_id": ref_id, "terms": document_terms(user_id, text or "")}
+        for kind, rows in (("task", tasks), ("note", notes))
+        for user_id, ref_id, text in rows
+    ]
+    if documents:
+        conn.execute(insert(SearchDocument), documents)
+    return len(documents)
+
+# User stats, written in the same transaction as the tasks and notes they count
+def utc_today() -> Date:
+    return datetime.utcnow().date()
+
+async def bump_user_stats(db: DBSession, user_id: int, tasks: int = 0, completed: int = 0,
+                          notes: int = 0, completed_on: Optional[Date] = None) -> None:
+    """Add to the user's counters in one upsert.
+
+    ``completed_on`` puts the completions in that day's bucket: the bucket
+    grows on the same day, the streak grows when the previous bucket was the
+    day before and restarts otherwise. Callers hold the user's data version
+    row (next_revision), so a user's updates apply one at a time.
+    """
+    values = {"user_id": user_id, "tasks_count": tasks, "tasks_completed": completed, "calendar_notes_count": notes}
+    changes = [
+        ("tasks_count", UserStats.tasks_count + tasks),
+        ("tasks_completed", UserStats.tasks_completed + completed),
+        ("calendar_notes_count", UserStats.calendar_notes_count + notes),
+    ]
+    if completed_on is not None and completed:
+        day = completed_on.isoformat()
+        previous_day = (completed_on - timedelta(days=1)).isoformat()
+        values.update(last_completed_on=day, completed_on_last_day=completed, streak_days=1)
+        # MySQL assigns left to right, so the day moves only after the bucket and streak read it
+        changes += [
+            ("completed_on_last_day", case(
+                (UserStats.last_completed_on == day, UserStats.completed_on_last_day + completed), else_=completed
+            )),
+            ("streak_days", case(
+                (UserStats.last_completed_on == day, UserStats.streak_days),
+                (UserStats.last_completed_on == previous_day, UserStats.streak_days + 1),
+                else_=1
+            )),
+            ("last_completed_on", day),
+        ]
+    dialect_name = db.get_bind().dialect.name
+    stmt = dialect_insert(dialect_name, UserStats).values(**values)
+    if dialect_name == "mysql":
+        stmt = stmt.on_duplicate_key_update(changes)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=[UserStats.user_id], set_=dict(changes))
+    await db.execute(stmt)
+
+def user_stats_fields(stats, today: Date) -> dict:
+    """UserProfileResponse fields from a user_stats row (or None); a bucket older than yesterday ends the streak"""
+    if stats is None:
+        return {}
+    day = today.isoformat()
+    streak_alive = stats.last_completed_on in (day, (today - timedelta(days=1)).isoformat())
+    return {
+        "tasks_count": stats.tasks_count,
+        "total_tasks_completed": stats.tasks_completed,
+        "tasks_today": stats.completed_on_last_day if stats.last_completed_on == day else 0,
+        "streak_days": stats.streak_days if streak_alive else 0,
+        "calendar_notes_count": stats.calendar_notes_count,
+    }
+
+def rebuild_user_stats(conn, user_ids) -> None:
+    """Recount the users' stats from their tasks and notes.
+
+    For bulk loads and databases created before user_stats; takes a sync
+    connection. Rows carry no completion history, so streaks start over.
+    """
+    conn.execute(delete(UserStats).where(UserStats.user_id.in_(user_ids)))
+    stats = {user_id: {"user_id": user_id, "tasks_count": 0, "tasks_completed": 0, "calendar_notes_count": 0}
+             for user_id in user_ids}
+    # Tombstoned tasks keep their completions until compaction removes them
+    for user_id, live, completed in conn.execute(
+        select(Task.user_id, func.count(case((Task.deleted_at.is_(None), 1))), func.count(case((Task.completed, 1))))
+        .where(Task.user_id.in_(user_ids)).group_by(Task.user_id)
+    ):
+        stats[user_id].update(tasks_count=live, tasks_completed=completed)
+    for user_id, notes in conn.execute(
+        select(CalendarNote.user_id, func.count()).where(CalendarNote.user_id.in_(user_ids)).group_by(CalendarNote.user_id)
+    ):
+        stats[user_id]["calendar_notes_count"] = notes
+    if stats:
+        conn.execute(insert(UserStats), list(stats.values()))
+
 # Task endpoints
+TASK_PAGE_MAX_LIMIT = 500
+
+def encode_cursor(**position) -> str:
+    """Encode where the next page starts (the last task id, a result offset) as an opaque cursor"""
+    raw = json.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Largest value a cursor may carry: a signed 64-bit column or LIMIT/OFFSET argument
+MAX_CURSOR_VALUE = 2 ** 63 - 1
+
+def decode_cursor(cursor: str, field: str) -> int:
+    """The position stored under field; malformed, negative or out-of-range cursors get 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        # float("1e400") is inf, which int() rejects with OverflowError
+        position = int(json.loads(raw)[field])
+    except (ValueError, KeyError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not 0 <= position <= MAX_CURSOR_VALUE:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+def parse_bbox(bbox: str) -> tuple:
+    """Parse ``x0,y0,x1,y1`` (min corner, then max corner)"""
+    try:
+        x0, y0, x1, y1 = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+    if not all(math.isfinite(value) for value in (x0, y0, x1, y1)) or x0 > x1 or y0 > y1:
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+    return x0, y0, x1, y1
+
+def within_bbox(query, x0: float, y0: float, x1: float, y1: float):
+    """Restrict a task query to the box, in id order.
+
+    Ordering by the bare id column would let the planner walk (user_id, id)
+    to skip the sort and test every task of the user; ``id + 0`` leaves the
+    cell lookups as the cheapest plan and sorts the few rows they return.
+    """
+    cells, ranges = bbox_cells(x0, y0, x1, y1)
+    if cells is not None:
+        in_cells = Task.cell.in_(cells)
+    else:
+        in_cells = or_(*(Task.cell.between(first, last) for first, last in ranges))
+    return query.where(in_cells, Task.x.between(x0, x1), Task.y.between(y0, y1)).order_by(Task.id + 0)
+
 @app.get("/tasks", response_model=List[TaskResponse])
-def get_tasks(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    tasks = db.query(Task).filter(Task.user_id == current_user.id).all()
-    return tasks
+async def get_tasks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=TASK_PAGE_MAX_LIMIT),
+    after: Optional[str] = None,
+    completed: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
+    db: DBSession = Depends(get_read_session)
+):
+    """List tasks in id order.
+
+    Without ``limit`` every matching task is returned. With ``limit`` the
+    response is one page and ``X-Next-Cursor`` carries the ``after`` value
+    for the next page (absent on the last page). ``bbox=x0,y0,x1,y1`` keeps
+    only tasks whose position lies inside the box, edges included; clients
+    pad their viewport by the drawn radius to also get partly visible tasks.
+    """
+    version = await data_version(db, current_user.id)
+    not_modified = not_modified_response(request, response, version)
+    if not_modified:
+        return not_modified
+    
+    query = select(*TASK_ROW_COLUMNS).where(Task.user_id == current_user.id, Task.deleted_at.is_(None))
+    if after is not None:
+        query = query.where(Task.id > decode_cursor(after, "id"))
+    if completed is not None:
+        query = query.where(Task.completed == completed)
+    if created_from is not None:
+        query = query.where(Task.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Task.created_at < created_to)
+    if bbox is not None:
+        query = within_bbox(query, *parse_bbox(bbox))
+    else:
+        query = query.order_by(Task.id)
+    
+    if limit is None:
+        async def load():
+            return rows_json(task_rows_adapter, (await db.execute(query)).all())
+        # Only the whole-board read is cached: every viewport or date range would
+        # get its own near-duplicate entry that is rarely asked for again
+        if bbox is None and created_from is None and created_to is None:
+            return await cached_json_response(current_user.id, cache_field(request, version), response, load)
+        return json_response(await load(), response)
+    
+    # Fetch one extra row to learn whether another page exists
+    tasks = (await db.execute(query.limit(limit + 1))).all()
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(id=tasks[-1].id)
+    return rows_json_response(task_rows_adapter, tasks, response)
 
 @app.post("/tasks", response_model=TaskResponse)
-def create_task(task_data: TaskCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_task = Task(**task_data.model_dump(), user_id=current_user.id)
+async def create_task(task_data: TaskCreate, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    revision = await next_revision(db, current_user.id)
+    db_task = Task(**task_data.model_dump(), user_id=current_user.id, revision=revision)
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
-    return db_task
+    await db.flush()
+    await bump_user_stats(db, current_user.id, tasks=1)
+    await index_search_documents(db, current_user.id, "task", [(db_task.id, db_task.label)])
+    await db.commit()
+    await db.refresh(db_task)
+    task = TaskResponse.model_validate(db_task, from_attributes=True)
+    record_event(db, current_user.id, "task_created", task=task.model_dump(mode="json"), revision=revision)
+    return task
+
+BATCH_EVENT_TYPES = {"complete": "task_completed", "delete": "task_deleted"}
+
+@app.post("/tasks/batch", response_model=TaskBatchResponse)
+async def batch_tasks(batch: TaskBatchRequest, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    """Apply create/complete/delete operations in one transaction.
+
+    Creates are one multi-row INSERT, completes and deletes (tombstones) one
+    ``UPDATE ... WHERE id IN`` each. Results come back in request order;
+    unknown ids report status 404 without failing the batch.
+    """
+    creates = [op for op in batch.operations if op.op == "create"]
+    referenced_ids = {op.id for op in batch.operations if op.op != "create"}
+    
+    # One lookup tells which referenced ids belong to this user
+    owned = {}
+    if referenced_ids:
+        owned = dict((await db.execute(select(Task.id, Task.completed).where(
+            Task.user_id == current_user.id,
+            Task.id.in_(referenced_ids),
+            Task.deleted_at.is_(None)
+        ))).all())
+    owned_ids = set(owned)
+    complete_ids = {op.id for op in batch.operations if op.op == "complete"} & owned_ids
+    delete_ids = {op.id for op in batch.operations if op.op == "delete"} & owned_ids
+    
+    try:
+        # Every row the batch touches carries the same revision
+        revision = await next_revision(db, current_user.id) if creates or complete_ids or delete_ids else None
+        now = datetime.utcnow()
+        new_tasks = [
+            Task(**op.model_dump(exclude={"op"}), user_id=current_user.id, completed=False, revision=revision)
+            for op in creates
+        ]
+        if new_tasks:
+            db.add_all(new_tasks)
+            # insertmanyvalues: a single INSERT ... VALUES (...), (...) RETURNING where the dialect supports it
+            await db.flush()
+            await index_search_documents(db, current_user.id, "task", [(task.id, task.label) for task in new_tasks])
+        if complete_ids:
+            await db.execute(
+                update(Task)
+                .where(Task.user_id == current_user.id, Task.id.in_(complete_ids))
+                .values(completed=True, revision=revision, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        if delete_ids:
+            await db.execute(
+                update(Task)
+                .where(Task.user_id == current_user.id, Task.id.in_(delete_ids))
+                .values(deleted_at=now, revision=revision, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await unindex_search_documents(db, "task", delete_ids)
+        if revision is not None:
+            # Completing an already completed task is not a new completion
+            newly_completed = sum(1 for task_id in complete_ids if not owned[task_id])
+            await bump_user_stats(db, current_user.id, tasks=len(new_tasks) - len(delete_ids),
+                                  completed=newly_completed, completed_on=utc_today())
+        
+        # Read the flushed rows before commit expires them
+        results = []
+        created = iter(new_tasks)
+        for op in batch.operations:
+            if op.op == "create":
+                task = next(created)
+                results.append(TaskBatchResult(
+                    op=op.op,
+                    status=200,
+                    id=task.id,
+                    task=TaskResponse(
+                        id=task.id,
+                        label=task.label,
+                        x=task.x,
+                        y=task.y,
+                        color=task.color,
+                        completed=False,
+                        created_at=task.created_at
+                    )
+                ))
+            else:
+                results.append(TaskBatchResult(op=op.op, status=200 if op.id in owned_ids else 404, id=op.id))
+        await db.commit()
+        for result in results:
+            if result.op == "create":
+                record_event(db, current_user.id, "task_created", task=result.task.model_dump(mode="json"), revision=revision)
+            elif result.status == 200:
+                record_event(db, current_user.id, BATCH_EVENT_TYPES[result.op], id=result.id, revision=revision)
+    except Exception:
+        await db.rollback()
+        raise
+    
+    return TaskBatchResponse(results=results)
 
 @app.delete("/tasks/{task_id}")
-def delete_task(task_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == current_user.id).first()
+async def delete_task(task_id: int, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    task = await db.scalar(select(Task).where(Task.id == task_id, Task.user_id == current_user.id, Task.deleted_at.is_(None)))
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    db.delete(task)
-    db.commit()
+    # Tombstone: GET /sync reports the deletion until compaction removes the row
+    revision = await next_revision(db, current_user.id)
+    task.deleted_at = task.updated_at = datetime.utcnow()
+    task.revision = revision
+    await unindex_search_documents(db, "task", [task_id])
+    await bump_user_stats(db, current_user.id, tasks=-1)
+    await db.commit()
+    record_event(db, current_user.id, "task_deleted", id=task_id, revision=revision)
     return {"message": "Task deleted successfully"}
 
 @app.patch("/tasks/{task_id}/complete")
-def complete_task(task_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == current_user.id).first()
+async def complete_task(task_id: int, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    task = await db.scalar(select(Task).where(Task.id == task_id, Task.user_id == current_user.id, Task.deleted_at.is_(None)))
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    revision = await next_revision(db, current_user.id)
+    if not task.completed:
+        await bump_user_stats(db, current_user.id, completed=1, completed_on=utc_today())
     task.completed = True
-    db.commit()
+    task.updated_at = datetime.utcnow()
+    task.revision = revision
+    await db.commit()
+    record_event(db, current_user.id, "task_completed", id=task_id, revision=revision)
     return {"message": "Task completed successfully"}
 
 # Experience points endpoints
+users_table = User.__table__
+add_experience_statement = (
+    update(users_table)
+    .where(users_table.c.id == bindparam("b_user_id"))
+    .values(experience_points=users_table.c.experience_points + bindparam("b_delta"))
+)
+
+async def apply_experience_deltas(deltas: dict):
+    """Write buffered {user_id: points} increments in one transaction"""
+    async with open_session() as db:
+        await db.execute(
+            add_experience_statement,
+            [{"b_user_id": user_id, "b_delta": delta} for user_id, delta in deltas.items()]
+        )
+        await bump_data_version(db, *deltas)
+        mark_principal_changed(db, *deltas)
+        await db.commit()
+        # Several buffered increments arrive as one delta; the absolute total is not read back
+        for user_id, delta in deltas.items():
+            record_event(db, user_id, "xp_changed", delta=delta)
+    for user_id, delta in deltas.items():
+        principal_cache.invalidate(user_id)
+        leaderboard.add(user_id, delta)
+
+def with_pending_experience(user: UserResponse) -> UserResponse:
+    """Add XP that is still buffered by the coalescer"""
+    if xp_coalescer is None:
+        return user
+    pending = xp_coalescer.pending(user.id)
+    if not pending:
+        return user
+    return user.model_copy(update={"experience_points": user.experience_points + pending})
+
 @app.patch("/users/experience", response_model=UserResponse)
-def update_experience(exp_data: ExperienceUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    current_user.experience_points += exp_data.points
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+async def update_experience(exp_data: ExperienceUpdate, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    if xp_coalescer is not None:
+        if not xp_coalescer.add(current_user.id, exp_data.points):
+            return with_pending_experience(current_user)
+        # Buffer is full: flush now and answer from the database
+        await xp_coalescer.flush(apply_experience_deltas)
+        user = await db.scalar(select(User).where(User.id == current_user.id).execution_options(populate_existing=True))
+        return UserResponse.model_validate(user, from_attributes=True)
+    
+    # Increment in SQL so concurrent completions cannot overwrite each other
+    stmt = (
+        update(User)
+        .where(User.id == current_user.id)
+        .values(experience_points=User.experience_points + exp_data.points)
+    )
+    if db.get_bind().dialect.update_returning:
+        user = await db.scalar(stmt.returning(User).execution_options(populate_existing=True))
+    else:
+        await db.execute(stmt)
+        user = await db.scalar(select(User).where(User.id == current_user.id).execution_options(populate_existing=True))
+    response = UserResponse.model_validate(user, from_attributes=True)
+    await bump_data_version(db, current_user.id)
+    mark_principal_changed(db, current_user.id)
+    await db.commit()
+    principal_cache.invalidate(current_user.id)
+    leaderboard.set(current_user.id, response.experience_points)
+    record_event(db, current_user.id, "xp_changed", delta=exp_data.points, experience_points=response.experience_points)
+    return response
+
+# Leaderboard endpoints
+async def current_leaderboard(db: DBSession) -> Leaderboard:
+    """The leaderboard, loaded if startup did not, with users changed on other workers re-read"""
+    if not leaderboard.loaded:
+        leaderboard.load((await db.execute(select(User.id, User.experience_points))).all())
+    stale = leaderboard.take_stale()
+    if stale:
+        for user_id, experience_points in (await db.execute(
+            select(User.id, User.experience_points).where(User.id.in_(stale))
+        )).all():
+            leaderboard.set(user_id, experience_points)
+    return leaderboard
+
+@app.get("/leaderboard", response_model=List[LeaderboardEntry])
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+    current_user: UserResponse = Depends(get_current_user),
+    db: DBSession = Depends(get_session)
+):
+    """Users with the most XP; equal XP shares a rank and lists the older account first"""
+    board = await current_leaderboard(db)
+    rows, generation = board.top(limit)
+    if rows is None:
+        result = await db.execute(
+            select(User.id, User.username, User.display_name, User.experience_points)
+            .order_by(User.experience_points.desc(), User.id)
+            .limit(board.top_size)
+        )
+        rows = [row._asdict() for row in result.all()]
+        board.cache_top(rows, generation)
+        rows = rows[:limit]
+    return [LeaderboardEntry(**row, rank=board.rank_of(row["experience_points"])) for row in rows]
+
+@app.get("/users/me/rank", response_model=RankResponse)
+async def get_my_rank(current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    """The user's leaderboard rank by committed XP (coalesced increments count once flushed)"""
+    board = await current_leaderboard(db)
+    experience_points = board.experience_points(current_user.id)
+    if experience_points is None:
+        # Registered through another worker since this one loaded the board
+        experience_points = await db.scalar(select(User.experience_points).where(User.id == current_user.id))
+        board.set(current_user.id, experience_points)
+    return RankResponse(rank=board.rank_of(experience_points), experience_points=experience_points, users=len(board))
 
 # Calendar notes endpoints
+def calendar_note_upsert(dialect_name: str, values: Optional[dict] = None):
+    """Build a single-statement insert-or-update of a user's note for one date
+
+    Without values the statement takes its parameters at execution, which
+    also allows executemany.
+    """
+    stmt = dialect_insert(dialect_name, CalendarNote)
+    if values is not None:
+        stmt = stmt.values(**values)
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update(
+            content=stmt.inserted.content,
+            updated_at=stmt.inserted.updated_at,
+            revision=stmt.inserted.revision
+        )
+    return stmt.on_conflict_do_update(
+        index_elements=[CalendarNote.user_id, CalendarNote.date],
+        set_={
+            "content": stmt.excluded.content,
+            "updated_at": stmt.excluded.updated_at,
+            "revision": stmt.excluded.revision
+        }
+    )
+
+def add_calendar_note_date_index(conn) -> int:
+    """Give a calendar_notes table created before uq_calendar_notes_user_id_date one note per user and day.
+
+    The note upserts match on that index: without it SQLite rejects them and
+    MySQL inserts another row. Keeps each day's newest note (highest id),
+    deletes the others with their search documents and stats, then creates
+    the index. Takes a sync connection, returns the number of notes deleted
+    and does nothing once the index exists.
+    """
+    index = next(index for index in CalendarNote.__table__.indexes if index.name == "uq_calendar_notes_user_id_date")
+    if any(existing["name"] == index.name for existing in inspect(conn).get_indexes(CalendarNote.__tablename__)):
+        return 0
+    # A derived table, so MySQL reads the notes before deleting from them
+    newest = select(func.max(CalendarNote.id).label("id")).group_by(CalendarNote.user_id, CalendarNote.date).subquery()
+    duplicate = CalendarNote.id.not_in(select(newest.c.id))
+    removed = dict(conn.execute(
+        select(CalendarNote.user_id, func.count()).where(duplicate).group_by(CalendarNote.user_id)
+    ).all())
+    if removed:
+        conn.execute(delete(SearchDocument).where(
+            SearchDocument.kind == "note",
+            SearchDocument.ref_id.in_(select(CalendarNote.id).where(duplicate))
+        ))
+        conn.execute(delete(CalendarNote).where(duplicate))
+        conn.execute(
+            update(UserStats)
+            .where(UserStats.user_id == bindparam("uid"))
+            .values(calendar_notes_count=UserStats.calendar_notes_count - bindparam("removed")),
+            [{"uid": user_id, "removed": count} for user_id, count in removed.items()]
+        )
+    index.create(conn)
+    return sum(removed.values())
+
 @app.get("/calendar-notes", response_model=List[CalendarNoteResponse])
-def get_calendar_notes(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notes = db.query(CalendarNote).filter(CalendarNote.user_id == current_user.id).all()
-    return notes
+async def get_calendar_notes(
+    request: Request,
+    response: Response,
+    date_from: Optional[Date] = Query(None, alias="from"),
+    date_to: Optional[Date] = Query(None, alias="to"),
+    current_user: UserResponse = Depends(get_current_user),
+    db: DBSession = Depends(get_read_session)
+):
+    """List notes, optionally limited to the inclusive range from..to"""
+    version = await data_version(db, current_user.id)
+    not_modified = not_modified_response(request, response, version)
+    if not_modified:
+        return not_modified
+    
+    query = select(*CALENDAR_NOTE_ROW_COLUMNS).where(CalendarNote.user_id == current_user.id)
+    # Dates are stored as YYYY-MM-DD, so string order is date order
+    if date_from is not None:
+        query = query.where(CalendarNote.date >= date_from.isoformat())
+    if date_to is not None:
+        query = query.where(CalendarNote.date <= date_to.isoformat())
+    
+    async def load():
+        return rows_json(calendar_note_rows_adapter, (await db.execute(query.order_by(CalendarNote.date))).all())
+    return await cached_json_response(current_user.id, cache_field(request, version), response, load)
 
 @app.post("/calendar-notes", response_model=CalendarNoteResponse)
-def create_calendar_note(note_data: CalendarNoteCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Check if note already exists for this date
-    existing_note = db.query(CalendarNote).filter(
-        CalendarNote.user_id == current_user.id,
-        CalendarNote.date == note_data.date
-    ).first()
-    
-    if existing_note:
-        existing_note.content = note_data.content
-        db.commit()
-        db.refresh(existing_note)
-        return existing_note
+async def create_calendar_note(note_data: CalendarNoteCreate, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    dialect = db.get_bind().dialect
+    revision = await next_revision(db, current_user.id)
+    now = datetime.utcnow()
+    stmt = calendar_note_upsert(dialect.name, {
+        **note_data.model_dump(),
+        "user_id": current_user.id,
+        "created_at": now,
+        "updated_at": now,
+        "revision": revision
+    })
+    
+    if dialect.name != "mysql" and dialect.insert_returning:
+        note = await db.scalar(stmt.returning(CalendarNote).execution_options(populate_existing=True))
     else:
-        db_note = CalendarNote(**note_data.model_dump(), user_id=current_user.id)
-        db.add(db_note)
-        db.commit()
-        db.refresh(db_note)
-        return db_note
+        result = await db.execute(stmt)
+        note = await db.scalar(select(CalendarNote).where(
+            CalendarNote.user_id == current_user.id,
+            CalendarNote.date == note_data.date
+        ))
+    # Replacing the day's note does not add one. The upsert keeps created_at on conflict; MySQL reports
+    # 1 affected row for an insert and 2 for an update, and truncates DATETIME so the timestamps cannot be compared
+    inserted = result.rowcount == 1 if dialect.name == "mysql" else note.created_at == now
+    if inserted:
+        await bump_user_stats(db, current_user.id, notes=1)
+    response = CalendarNoteResponse.model_validate(note, from_attributes=True)
+    await index_search_documents(db, current_user.id, "note", [(note.id, note.content)])
+    await db.commit()
+    record_event(db, current_user.id, "note_upserted", note=response.model_dump(mode="json"), revision=revision)
+    return response
 
 @app.get("/calendar-notes/{date}", response_model=CalendarNoteResponse)
-def get_calendar_note(date: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    note = db.query(CalendarNote).filter(
+async def get_calendar_note(date: str, current_user: UserResponse = Depends(get_current_user), db: DBSession = Depends(get_read_session)):
+    note = await db.scalar(select(CalendarNote).where(
         CalendarNote.user_id == current_user.id,
         CalendarNote.date == date
-    ).first()
+    ))
     
     if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     return note
 
+# Search endpoint
+SEARCH_PAGE_MAX_LIMIT = 100
+SEARCH_MAX_WORDS = 8
+
+# Per dialect: the match expression builder and the ranked lookup, best first
+SEARCH_STATEMENTS = {
+    "sqlite": (fts5_query, text(
+        "SELECT d.kind, d.ref_id, -bm25(search_documents_fts) AS score "
+        "FROM search_documents_fts JOIN search_documents AS d ON d.id = search_documents_fts.rowid "
+        "WHERE search_documents_fts MATCH :match AND d.user_id = :user_id "
+        "ORDER BY score DESC, d.id LIMIT :limit OFFSET :offset"
+    )),
+    "mysql": (boolean_mode_query, text(
+        "SELECT kind, ref_id, MATCH (terms) AGAINST (:match IN BOOLEAN MODE) AS score "
+        "FROM search_documents "
+        "WHERE MATCH (terms) AGAINST (:match IN BOOLEAN MODE) AND user_id = :user_id "
+        "ORDER BY score DESC, id LIMIT :limit OFFSET :offset"
+    )),
+}
+
+@app.get("/search", response_model=List[SearchHit])
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=SEARCH_PAGE_MAX_LIMIT),
+    after: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
+    db: DBSession = Depends(get_read_session)
+):
+    """Tasks and notes containing every word of ``q`` (words match as prefixes), best match first.
+
+    ``X-Next-Cursor`` carries the ``after`` value for the next page, as in
+    GET /tasks.
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name not in SEARCH_STATEMENTS:
+        raise HTTPException(status_code=501, detail="Search is not available on this database")
+    build_match, statement = SEARCH_STATEMENTS[dialect_name]
+    match = build_match(current_user.id, q, SEARCH_MAX_WORDS)
+    if match is None:
+        return json_response(b"[]", response)
+    
+    offset = decode_cursor(after, "offset") if after is not None else 0
+    hits = (await db.execute(statement, {
+        "match": match, "user_id": current_user.id, "limit": limit + 1, "offset": offset
+    })).all()
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(offset=offset + limit)
+    
+    task_ids = [hit.ref_id for hit in hits if hit.kind == "task"]
+    note_ids = [hit.ref_id for hit in hits if hit.kind == "note"]
+    tasks, notes = {}, {}
+    if task_ids:
+        tasks = {row.id: row._asdict() for row in (await db.execute(select(*TASK_ROW_COLUMNS).where(
+            Task.id.in_(task_ids), Task.user_id == current_user.id, Task.deleted_at.is_(None)
+        ))).all()}
+    if note_ids:
+        notes = {row.id: row._asdict() for row in (await db.execute(select(*CALENDAR_NOTE_ROW_COLUMNS).where(
+            CalendarNote.id.in_(note_ids), CalendarNote.user_id == current_user.id
+        ))).all()}
+    results = []
+    for hit in hits:
+        row = (tasks if hit.kind == "task" else notes).get(hit.ref_id)
+        if row is not None:
+            results.append({
+                "type": hit.kind,
+                "score": hit.score,
+                "task": row if hit.kind == "task" else None,
+                "note": row if hit.kind == "note" else None,
+            })
+    return json_response(search_hits_adapter.dump_json(results), response)
+
+# Delta sync endpoint
+# Task tombstones are kept this long, so clients offline for less resync incrementally
+SYNC_TOMBSTONE_RETENTION_DAYS = float(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+SYNC_COMPACT_INTERVAL = float(os.getenv("SYNC_COMPACT_INTERVAL", "3600"))
+SYNC_COMPACT_BATCH_USERS = int(os.getenv("SYNC_COMPACT_BATCH_USERS", "1000"))
+
+versions_table = UserDataVersion.__table__
+set_purged_revision_statement = (
+    update(versions_table)
+    .where(versions_table.c.user_id == bindparam("b_user_id"))
+    .values(purged_revision=bindparam("b_revision"))
+)
+
+async def compact_tombstones(cutoff: datetime, batch_users: int = SYNC_COMPACT_BATCH_USERS) -> int:
+    """
+    Delete task tombstones older than cutoff, one transaction per batch of users
+    
+    Each user's purged_revision moves up to the newest revision removed, in
+    the same transaction as the delete, so a sync from before it resets.
+    
+    Returns:
+        int: Tombstones removed
+    """
+    async with open_session() as db:
+        purged = (await db.execute(
+            select(Task.user_id, func.max(Task.revision))
+            .where(Task.deleted_at < cutoff)
+            .group_by(Task.user_id)
+        )).all()
+    removed = 0
+    for start in range(0, len(purged), batch_users):
+        batch = purged[start:start + batch_users]
+        async with open_session() as db:
+            await db.execute(
+                set_purged_revision_statement,
+                [{"b_user_id": user_id, "b_revision": revision} for user_id, revision in batch]
+            )
+            result = await db.execute(
+                delete(Task)
+                .where(Task.user_id.in_([user_id for user_id, _ in batch]), Task.deleted_at < cutoff)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            removed += result.rowcount
+    return removed
+
+async def run_tombstone_compaction():
+    """Compact tombstones every SYNC_COMPACT_INTERVAL seconds until cancelled"""
+    while True:
+        await asyncio.sleep(SYNC_COMPACT_INTERVAL)
+        try:
+            removed = await compact_tombstones(datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS))
+            if removed:
+                logger.info(f"Compacted {removed} task tombstones")
+        except Exception as e:
+            logger.error(f"Error compacting task tombstones: {e}")
+
+@app.get("/sync", response_model=SyncResponse)
+async def sync_changes(
+    since: int = Query(0, ge=0),
+    current_user: UserResponse = Depends(get_current_user),
+    db: DBSession = Depends(get_read_session)
+):
+    """Tasks and notes changed after revision ``since``, plus deleted task ids.
+
+    Clients store the returned ``revision`` and send it as ``since`` next
+    time. With ``since=0``, or a ``since`` older than compacted tombstones,
+    ``reset`` is true and the response is the full live state, which
+    replaces the client's copy.
+    """
+    # Read first: rows written meanwhile are returned again next time, never skipped
+    revision = await data_version(db, current_user.id)
+    if since == revision:
+        return Response(sync_response_adapter.dump_json(
+            {"revision": revision, "reset": False, "tasks": [], "deleted_task_ids": [], "calendar_notes": []}
+        ), media_type="application/json")
+    
+    async def load(reset: bool):
+        task_query = select(*TASK_ROW_COLUMNS, Task.deleted_at).where(Task.user_id == current_user.id)
+        note_query = select(*CALENDAR_NOTE_ROW_COLUMNS).where(CalendarNote.user_id == current_user.id)
+        if reset:
+            task_query = task_query.where(Task.deleted_at.is_(None))
+        else:
+            task_query = task_query.where(Task.revision > since)
+            note_query = note_query.where(CalendarNote.revision > since)
+        body = {"revision": revision, "reset": reset, "tasks": [], "deleted_task_ids": [], "calendar_notes": []}
+        for row in (await db.execute(task_query.order_by(Task.id))).all():
+            task = row._asdict()
+            if task.pop("deleted_at") is None:
+                body["tasks"].append(task)
+            else:
+                body["deleted_task_ids"].append(task["id"])
+        body["calendar_notes"] = [row._asdict() for row in (await db.execute(note_query.order_by(CalendarNote.date))).all()]
+        return body
+    
+    # A since ahead of the server (e.g. a restored database) also starts over
+    body = await load(reset=since == 0 or since > revision)
+    if not body["reset"]:
+        # Checked after the rows: a compaction that removed tombstones this
+        # read missed has committed its purged_revision by now
+        purged = await db.scalar(select(UserDataVersion.purged_revision).where(UserDataVersion.user_id == current_user.id))
+        if purged and since < purged:
+            body = await load(reset=True)
+    return Response(sync_response_adapter.dump_json(body, warnings=False), media_type="application/json")
+
+# Export and import
+EXPORT_FORMAT = 1
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+IMPORT_MAX_ERRORS = 100
+
+async def stream_partitions(db: DBSession, statement, size: int):
+    """Yield lists of up to size rows, fetched through a server-side cursor"""
+    statement = statement.execution_options(yield_per=size)
+    if isinstance(db, AsyncSession):
+        result = await db.stream(statement)
+        async for partition in result.partitions():
+            yield partition
+        return
+    result = await run_in_threadpool(db.sync_session.execute, statement)
+    partitions = result.partitions()
+    while True:
+        partition = await run_in_threadpool(next, partitions, None)
+        if partition is None:
+            return
+        yield partition
+
+async def export_lines(user_id: int):
+    """NDJSON for one user: a profile line, then tasks and notes, one chunk per partition"""
+    # The request session is closed before the body is sent, so the stream opens its own
+    async with open_session() as db:
+        revision = await data_version(db, user_id)
+        user = await db.get(User, user_id)
+        yield profile_record_adapter.dump_json({
+            **UserResponse.model_validate(user, from_attributes=True).model_dump(exclude={"id"}),
+            "type": "profile",
+            "format": EXPORT_FORMAT,
+            "revision": revision,
+        }) + b"\n"
+        tasks = select(*TASK_ROW_COLUMNS).where(Task.user_id == user_id, Task.deleted_at.is_(None)).order_by(Task.id)
+        async for rows in stream_partitions(db, tasks, EXPORT_CHUNK_ROWS):
+            yield b"".join(task_record_adapter.dump_json({**row._asdict(), "type": "task"}) + b"\n" for row in rows)
+        notes = select(*CALENDAR_NOTE_ROW_COLUMNS).where(CalendarNote.user_id == user_id).order_by(CalendarNote.date)
+        async for rows in stream_partitions(db, notes, EXPORT_CHUNK_ROWS):
+            yield b"".join(calendar_note_record_adapter.dump_json({**row._asdict(), "type": "note"}) + b"\n" for row in rows)
+
+@app.get("/export")
+async def export_data(current_user: UserResponse = Depends(get_current_user)):
+    """Stream the user's profile, tasks and notes as NDJSON in constant memory"""
+    return StreamingResponse(
+        export_lines(current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="todoweb-export.ndjson"'}
+    )
+
+async def ndjson_lines(chunks, max_line_bytes: int):
+    """
+    Split a byte stream into (line number, line) pairs as it arrives
+    
+    Blank lines are skipped but counted. A line longer than max_line_bytes
+    is yielded as None instead of being buffered.
+    """
+    buffer = b""
+    line_number = 0
+    # Set once an unfinished line outgrows the limit: it is reported right
+    # away and the rest of it is dropped as it arrives
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if skipping:
+                skipping = False
+            elif line.strip():
+                yield line_number, line if len(line) <= max_line_bytes else None
+        if skipping or len(buffer) > max_line_bytes:
+            if not skipping:
+                yield line_number + 1, None
+                skipping = True
+            buffer = b""
+    if buffer.strip() and not skipping:
+        yield line_number + 1, buffer
+
+def describe_validation_error(e: ValidationError) -> str:
+    error = e.errors(include_url=False)[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+@app.post("/import", response_model=ImportResult)
+async def import_data(
+    request: Request,
+    dry_run: bool = False,
+    current_user: UserResponse = Depends(get_current_user_unpinned)
+):
+    """Add tasks and notes from an NDJSON body in the /export format.
+
+    The body is parsed as it arrives and written IMPORT_CHUNK_ROWS rows per
+    transaction: tasks get new ids, notes replace the user's note for the
+    same date. The first invalid line stops the import; chunks before it stay
+    committed and the response (422) says which line failed. ``dry_run``
+    validates the whole body, reporting up to 100 errors, and writes nothing.
+
+    No session is held while the body is read: each chunk is parsed first,
+    then written in a session of its own, so a slow upload does not keep a
+    database connection from other requests.
+    """
+    source = request.headers.get("x-client-id", "")[:64] or None
+    result = ImportResult(dry_run=dry_run, lines=0, tasks=0, calendar_notes=0, errors=[])
+    tasks: List[ImportTask] = []
+    notes: dict = {}
+    
+    async def write_rows(db: DBSession):
+        revision = await next_revision(db, current_user.id)
+        now = datetime.utcnow()
+        try:
+            if tasks:
+                await db.execute(insert(Task), [{
+                    **task.model_dump(exclude={"type", "created_at"}),
+                    "user_id": current_user.id,
+                    "created_at": task.created_at or now,
+                    "updated_at": now,
+                    "revision": revision,
+                } for task in tasks])
+                # The chunk's revision picks out the rows it just inserted
+                added = await db.execute(select(Task.id, Task.label).where(Task.user_id == current_user.id, Task.revision == revision))
+                await index_search_documents(db, current_user.id, "task", added.all())
+            new_notes = 0
+            if notes:
+                # Notes for dates the user already has replace them rather than add to the count
+                new_notes = len(notes) - await db.scalar(select(func.count()).select_from(CalendarNote).where(
+                    CalendarNote.user_id == current_user.id,
+                    CalendarNote.date.in_([note_date.isoformat() for note_date in notes])
+                ))
+                await db.execute(calendar_note_upsert(db.get_bind().dialect.name), [{
+                    "user_id": current_user.id,
+                    "date": note.date.isoformat(),
+                    "content": note.content,
+                    "created_at": note.created_at or now,
+                    "updated_at": now,
+                    "revision": revision,
+                } for note in notes.values()])
+                written = await db.execute(select(CalendarNote.id, CalendarNote.content).where(
+                    CalendarNote.user_id == current_user.id, CalendarNote.revision == revision
+                ))
+                await index_search_documents(db, current_user.id, "note", written.all())
+            # Imported completions have no completion day, so they leave the streak alone
+            await bump_user_stats(db, current_user.id, tasks=len(tasks), completed=sum(task.completed for task in tasks),
+                                  notes=new_notes)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    
+    async def write_chunk():
+        if not dry_run and (tasks or notes):
+            async with open_session(source, slot=True) as db:
+                await write_rows(db)
+        result.tasks += len(tasks)
+        result.calendar_notes += len(notes)
+        tasks.clear()
+        notes.clear()
+    
+    async for line_number, line in ndjson_lines(request.stream(), IMPORT_MAX_LINE_BYTES):
+        result.lines = line_number
+        if line is None:
+            error = f"line is longer than {IMPORT_MAX_LINE_BYTES} bytes"
+        else:
+            try:
+                record = import_record_adapter.validate_json(line)
+                error = None
+            except ValidationError as e:
+                error = describe_validation_error(e)
+        if error is not None:
+            result.errors.append(ImportLineError(line=line_number, error=error))
+            if not dry_run or len(result.errors) >= IMPORT_MAX_ERRORS:
+                break
+            continue
+        if isinstance(record, ImportTask):
+            tasks.append(record)
+        elif isinstance(record, ImportCalendarNote):
+            # One row per date within a chunk, so the upsert never hits a row twice
+            notes[record.date] = record
+        if len(tasks) + len(notes) >= IMPORT_CHUNK_ROWS:
+            await write_chunk()
+    await write_chunk()
+    
+    if not dry_run and (result.tasks or result.calendar_notes):
+        # Open streams refetch once instead of receiving an event per row
+        change_broker.publish(current_user.id, "resync", {"source": source} if source else {})
+    if result.errors:
+        return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=result.model_dump())
+    return result
+
+# Change stream endpoint
+optional_security = HTTPBearer(auto_error=False)
+
+@app.post("/events/token", response_model=StreamTokenResponse)
+async def create_stream_token(current_user: UserResponse = Depends(get_current_user)):
+    """A token for one GET /events connection, valid for STREAM_TOKEN_SECONDS and nowhere else"""
+    token = create_access_token(
+        data={"sub": str(current_user.id), "scope": STREAM_TOKEN_SCOPE},
+        expires=timedelta(seconds=STREAM_TOKEN_SECONDS)
+    )
+    return StreamTokenResponse(stream_token=token, expires_in=STREAM_TOKEN_SECONDS)
+
+@app.get("/events", include_in_schema=False)
+async def stream_changes(
+    stream_token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """
+    Server-Sent Events with the user's task, note and XP changes
+
+    EventSource cannot set headers, so it passes ?stream_token= from
+    POST /events/token instead of the access token, which would otherwise
+    be written to every access log. The token is only checked on connect.
+    No database session is held while the stream is open.
+    """
+    if credentials:
+        user_id = token_user_id(credentials.credentials)
+    elif stream_token:
+        user_id = token_user_id(stream_token, scope=STREAM_TOKEN_SCOPE)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not change_broker.accepting():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open streams, please retry",
+            headers={"Retry-After": "5"}
+        )
+    return StreamingResponse(
+        change_broker.stream(user_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx must pass frames through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Metrics endpoint
+def pool_samples(pool_method: str):
+    """One sample per engine whose pool reports pool_method"""
+    engines = {
+        "primary": engine,
+        "async": async_engine.sync_engine if async_engine else None,
+        "replica": getattr(read_engine, "sync_engine", read_engine),
+    }
+    for name, db_engine in engines.items():
+        if db_engine is not None and hasattr(db_engine.pool, pool_method):
+            yield {"engine": name}, getattr(db_engine.pool, pool_method)()
+
+def render_metrics() -> str:
+    lines = request_metrics.render()
+    lines += format_metric("db_pool_checked_out", "gauge", "Connections currently checked out", pool_samples("checkedout"))
+    lines += format_metric("db_pool_overflow", "gauge", "Connections open beyond pool_size", pool_samples("overflow"))
+    lines += format_metric("db_pool_size", "gauge", "Configured pool size", pool_samples("size"))
+    wait = pool_wait.stats()
+    lines += format_metric("db_pool_checkouts_total", "counter", "Pool checkouts", [({}, wait["checkouts"])])
+    lines += format_metric("db_pool_wait_seconds_total", "counter", "Time spent waiting on pool checkout", [({}, wait["wait_seconds_total"])])
+    lines += format_metric("db_pool_wait_seconds_max", "gauge", "Longest pool checkout wait", [({}, wait["wait_seconds_max"])])
+    hasher = password_hasher.stats()
+    lines += format_metric("password_hash_queue_depth", "gauge", "Hashes queued or running", [({}, hasher["pending"])])
+    lines += format_metric("password_hash_total", "counter", "Completed hash/verify calls", [({}, hasher["completed"])])
+    lines += format_metric("password_hash_seconds_total", "counter", "Time spent in hash/verify calls", [({}, hasher["total_seconds"])])
+    lines += format_metric("password_hash_rejected_total", "counter", "Hash requests rejected with 503", [({}, hasher["rejected"])])
+    cache = principal_cache.stats()
+    lines += format_metric("principal_cache_requests_total", "counter", "Principal cache lookups",
+                           [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])])
+    lines += format_metric("principal_cache_size", "gauge", "Cached principals", [({}, cache["size"])])
+    if response_cache is not None:
+        cache_stats = response_cache.stats()
+        lines += format_metric("response_cache_requests_total", "counter", "Response cache lookups",
+                               [({"result": "hit"}, cache_stats["hits"]), ({"result": "miss"}, cache_stats["misses"])])
+        lines += format_metric("response_cache_errors_total", "counter", "Failed cache server calls", [({}, cache_stats["errors"])])
+        if "bytes" in cache_stats:
+            lines += format_metric("response_cache_bytes", "gauge", "Bytes held by this worker's response cache", [({}, cache_stats["bytes"])])
+        lines += format_metric("cache_invalidations_total", "counter", "Per-user invalidations",
+                               [({"direction": "published"}, cache_stats["invalidations_published"]),
+                                ({"direction": "received"}, cache_stats["invalidations_received"])])
+        lines += format_metric("cache_invalidation_latency_seconds_total", "counter", "Publish-to-delivery time of received invalidations",
+                               [({}, cache_stats["invalidation_latency_seconds_total"])])
+        lines += format_metric("cache_invalidation_latency_seconds_max", "gauge", "Slowest invalidation delivery",
+                               [({}, cache_stats["invalidation_latency_seconds_max"])])
+    if ADMISSION_MAX_CONCURRENCY > 0:
+        admission = admission_controller.stats()
+        lines += format_metric("admission_active", "gauge", "Requests holding an admission slot", [({}, admission["active"])])
+        lines += format_metric("admission_queued", "gauge", "Requests waiting for an admission slot",
+                               [({"priority": name}, count) for name, count in admission["queued"].items()])
+        lines += format_metric("admission_admitted_total", "counter", "Requests admitted",
+                               [({"priority": name}, count) for name, count in admission["admitted"].items()])
+        lines += format_metric("admission_shed_total", "counter", "Requests answered 503 by admission control",
+                               [({"priority": name, "reason": reason}, count)
+                                for (name, reason), count in admission["shed"].items()])
+        lines += format_metric("admission_service_seconds", "gauge", "Average service time used to predict queue waits",
+                               [({"priority": name}, seconds) for name, seconds in admission["service_seconds"].items()])
+        lines += admission_controller.queue_wait.render()
+    board = leaderboard.stats()
+    lines += format_metric("leaderboard_users", "gauge", "Users in the in-memory leaderboard", [({}, board["users"])])
+    lines += format_metric("leaderboard_top_cache_total", "counter", "GET /leaderboard top-row cache lookups",
+                           [({"result": "hit"}, board["top_hits"]), ({"result": "miss"}, board["top_misses"])])
+    lines += format_metric("leaderboard_stale_refreshes_total", "counter", "Users re-read after a change on another worker",
+                           [({}, board["stale_refreshes"])])
+    routing = read_routing.stats()
+    lines += format_metric("db_read_routing_total", "counter", "Read-only requests by chosen database",
+                           [({"target": "replica"}, routing["replica_reads"]), ({"target": "primary"}, routing["primary_reads"])])
+    stream = change_broker.stats()
+    lines += format_metric("change_stream_connections", "gauge", "Open change streams", [({}, stream["connections"])])
+    lines += format_metric("change_stream_events_total", "counter", "Change events by outcome",
+                           [({"result": "published"}, stream["published"]), ({"result": "delivered"}, stream["delivered"]),
+                            ({"result": "dropped"}, stream["dropped"])])
+    lines += format_metric("change_stream_rejected_total", "counter", "Streams refused at STREAM_MAX_CONNECTIONS", [({}, stream["rejected"])])
+    lines += format_metric("db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS", [({}, slow_query_log.slow_queries)])
+    lines += format_metric("request_profiles_total", "counter", "Request profiles written", [({}, request_profiler.profiles_written)])
+    return "\n".join(lines) + "\n"
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
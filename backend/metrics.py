@@ -0,0 +1,169 @@
+"""
+Runtime metrics for TodoWeb 2.0
+Per-route request counters and histograms collected by an ASGI middleware, rendered as Prometheus text
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+# Mutable holder per request; threadpool workers see the same list through the copied context
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    holder = _request_queries.get()
+    if holder is not None:
+        holder[0] += 1
+
+
+@contextmanager
+def counting_queries() -> Iterator[List[int]]:
+    """Count the current request's statements in the yielded holder, reusing one an outer middleware already set"""
+    holder = _request_queries.get()
+    if holder is not None:
+        yield holder
+        return
+    holder = [0]
+    token = _request_queries.set(holder)
+    try:
+        yield holder
+    finally:
+        _request_queries.reset(token)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_metric(name: str, metric_type: str, help_text: str,
+                  samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Render one gauge or counter family as exposition-format lines"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        names = tuple(labels)
+        lines.append(f"{name}{_labels(names, tuple(labels.values()))} {value}")
+    return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, label_values: Tuple, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            # bucket counts, then +Inf count, then sum
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                bucket_labels = _labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            bucket_labels = _labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series[-2]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {series[-2]}")
+        return lines
+
+
+class RequestMetrics:
+    """Request counters, latency and per-request query-count histograms"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Request latency by route",
+            ("method", "route"), LATENCY_BUCKETS
+        )
+        self.queries = Histogram(
+            "http_request_db_queries", "Database statements executed per request",
+            ("method", "route"), QUERY_COUNT_BUCKETS
+        )
+
+    def record(self, method: str, route: str, status: int, seconds: float, queries: int) -> None:
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.latency.observe((method, route), seconds)
+        self.queries.observe((method, route), queries)
+
+    def render(self) -> List[str]:
+        lines = format_metric(
+            "http_requests_in_flight", "gauge", "Requests currently being served",
+            [({}, self.in_flight)]
+        )
+        lines += format_metric(
+            "http_requests_total", "counter", "Requests by route and status",
+            [({"method": method, "route": route, "status": str(status)}, count)
+             for (method, route, status), count in self.requests.items()]
+        )
+        return lines + self.latency.render() + self.queries.render()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware; labels requests with the matched route template"""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        holder = [0]
+        token = _request_queries.set(holder)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.in_flight -= 1
+            _request_queries.reset(token)
+            # The router stores the matched route in scope; unmatched paths share one label
+            route = scope.get("route")
+            self.metrics.record(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+                time.perf_counter() - started,
+                holder[0],
+            )
@@ -0,0 +1,132 @@
+"""
+Password hashing worker pool for TodoWeb 2.0
+Runs bcrypt in a dedicated process pool so auth bursts cannot starve other endpoints
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+_contexts: Dict[int, CryptContext] = {}
+
+
+def build_context(rounds: int) -> CryptContext:
+    """Build a bcrypt context that treats any other cost factor as outdated"""
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def _context(rounds: int) -> CryptContext:
+    # Worker processes keep one context per cost factor
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = build_context(rounds)
+    return context
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Bounded front end to a bcrypt process pool.
+
+    At most ``workers + queue_size`` hashes are in flight; further requests
+    are rejected immediately with PasswordHasherBusy instead of queueing.
+    """
+
+    def __init__(self, rounds: int = 12, workers: Optional[int] = None,
+                 queue_size: int = 64, retry_after: int = 1):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    @property
+    def max_pending(self) -> int:
+        return self.workers + self.queue_size
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps workers independent of the threads running in the server
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after)
+        self.pending += 1
+        started = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died; release the broken pool and start a fresh one for the next request.
+            # Other callers fail on the same pool, and only the first of them may replace it
+            if self._executor is executor:
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost"""
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and produce a replacement hash when its parameters are outdated
+
+        Returns:
+            (valid, new_hash): new_hash is None unless the stored hash should be replaced
+        """
+        return await self._submit(_verify_and_update, password, hashed_password, self.rounds)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "total_seconds": self.total_seconds,
+        }
@@ -0,0 +1,87 @@
+"""
+Authenticated-principal cache for TodoWeb 2.0
+Keeps recently seen users in process so authenticated requests skip the user lookup
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class PrincipalCache:
+    """Bounded LRU cache with a per-entry TTL.
+
+    Entries are keyed by the JWT ``sub`` claim. Writers that change a user row
+    must call ``invalidate`` once their transaction has committed.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached principal for key, or None on a miss
+
+        Args:
+            key: Token subject
+
+        Returns:
+            The cached value if present and not expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry when full"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop the entry for key so the next request reloads it"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,273 @@
+"""
+Query and request profiling for TodoWeb 2.0
+Slow-query logging with parameter shapes and routes, plus an opt-in per-request sampling profiler
+"""
+
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import counting_queries
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+MAX_LOGGED_STATEMENT = 1000
+
+
+class RequestTrace:
+    """Per-request state shared with the cursor listeners through a contextvar"""
+
+    __slots__ = ("scope", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router fills in scope["route"] once the path has been matched
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "-")
+
+
+_request_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def _type_name(value) -> str:
+    return "NULL" if value is None else type(value).__name__
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by name and type only, never by value"""
+    if executemany:
+        rows = list(parameters or ())
+        if not rows:
+            return "[]"
+        return f"{parameter_shape(rows[0])} x {len(rows)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{name}: {_type_name(value)}" for name, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_type_name(value) for value in parameters) + ")"
+    return _type_name(parameters)
+
+
+class SlowQueryLog:
+    """Times every cursor execution and logs the ones above the threshold.
+
+    Timing is always on so profiled requests can report their database time;
+    a threshold of None only turns the log lines off.
+    """
+
+    def __init__(self, threshold_ms: Optional[float] = 200.0):
+        self.threshold_ms = threshold_ms
+        self.slow_queries = 0
+        self._installed = False
+
+    def install(self) -> None:
+        """Listen on every Engine, including the sync engine behind an async one"""
+        if self._installed:
+            return
+        event.listen(Engine, "before_cursor_execute", self._before)
+        event.listen(Engine, "after_cursor_execute", self._after)
+        self._installed = True
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, so a statement that raises leaves nothing behind on the connection
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.db_seconds += elapsed
+        if self.threshold_ms is None or elapsed * 1000 < self.threshold_ms:
+            return
+        self.slow_queries += 1
+        logger.warning(
+            "Slow query %.1f ms on %s: %s params=%s",
+            elapsed * 1000,
+            trace.route if trace is not None else "-",
+            " ".join(statement.split())[:MAX_LOGGED_STATEMENT],
+            parameter_shape(parameters, executemany),
+        )
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _is_idle(frame) -> bool:
+    # Pool workers and executor management threads parked in a wait add nothing to the picture
+    return os.path.basename(frame.f_code.co_filename) in ("threading.py", "queue.py", "selectors.py")
+
+
+class SamplingProfiler:
+    """Samples every thread's stack while one request runs.
+
+    Output is the collapsed-stack format read by flamegraph.pl, speedscope
+    and inferno: one ``thread;outer;...;inner count`` line per distinct
+    stack. Bcrypt runs in worker processes, so hashing shows up as the event
+    loop idling in its selector.
+    """
+
+    def __init__(self, interval_seconds: float = 0.005):
+        self.interval_seconds = interval_seconds
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._origin: Optional[int] = None
+        self._switch_interval: Optional[float] = None
+
+    def _sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (ident != self._origin and _is_idle(frame)):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self._sample()
+
+    def start(self) -> None:
+        # The thread serving the request is always sampled, even while it waits
+        self._origin = threading.get_ident()
+        # Let the sampler take the GIL at least as often as it wants to sample
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval_seconds))
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+
+    def collapsed(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.samples.most_common()]
+
+
+class RequestProfiler:
+    """Decides which requests to profile and where their stacks are written"""
+
+    def __init__(self, directory: str = "./profiles", token: Optional[str] = None,
+                 sample_rate: float = 0.0, interval_seconds: float = 0.005):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_seconds
+        # One profile at a time; sampling every thread is not free
+        self._busy = threading.Lock()
+        self.profiles_written = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def wants(self, headers: Dict[bytes, bytes]) -> bool:
+        """A matching admin token always profiles; otherwise sample at the configured rate"""
+        supplied = headers.get(PROFILE_HEADER.encode())
+        if supplied is not None and self.token:
+            return hmac.compare_digest(supplied, self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def acquire(self) -> bool:
+        return self._busy.acquire(blocking=False)
+
+    def write(self, name: str, profiler: SamplingProfiler) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            for line in profiler.collapsed():
+                f.write(line + "\n")
+        self.profiles_written += 1
+        return path
+
+    def release(self) -> None:
+        self._busy.release()
+
+
+def _profile_name(scope) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_") or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}.folded"
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; tags queries with their request and runs the sampler when asked"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope)
+        token = _request_trace.set(trace)
+        try:
+            if not (self.profiler.enabled and self.profiler.wants(dict(scope["headers"]))
+                    and self.profiler.acquire()):
+                await self.app(scope, receive, send)
+                return
+            try:
+                await self._profile(scope, receive, send, trace)
+            finally:
+                self.profiler.release()
+        finally:
+            _request_trace.reset(token)
+
+    async def _profile(self, scope, receive, send, trace: RequestTrace):
+        name = _profile_name(scope)
+        sampler = SamplingProfiler(self.profiler.interval_seconds)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = (f'db;dur={trace.db_seconds * 1000:.1f};desc="{queries[0]} queries", '
+                          f"total;dur={total_ms:.1f}")
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode()),
+                    (b"x-profile-id", name.encode()),
+                ]
+            await send(message)
+
+        # The metrics listener counts the statements; with metrics off this sets up its holder
+        with counting_queries() as queries:
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                sampler.stop()
+                path = self.profiler.write(name, sampler)
+                logger.info("Profiled %s %s in %.1f ms -> %s", scope["method"], trace.route,
+                            (time.perf_counter() - started) * 1000, path)
@@ -0,0 +1,69 @@
+"""
+Read replica routing for TodoWeb 2.0
+Tracks recent writers so their reads stay on the primary until replicas catch up
+"""
+
+import threading
+import time
+from typing import Dict
+
+
+class ReadYourWrites:
+    """Process-local map of user id to the end of their primary-pinned window.
+
+    Every write path marks its users; a read-only handler may use a replica
+    only when the user is not pinned. Marks live in this process only, so
+    with several workers the guarantee holds for requests that reach the
+    worker which served the write (sticky routing per user).
+    """
+
+    def __init__(self, window_seconds: float = 5.0, max_users: int = 100000):
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        self._until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def mark(self, *user_ids: int) -> None:
+        until = time.monotonic() + self.window_seconds
+        with self._lock:
+            if len(self._until) >= self.max_users:
+                self._prune()
+            for user_id in user_ids:
+                self._until[user_id] = until
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        expired = [user_id for user_id, until in self._until.items() if until <= now]
+        # Live windows are kept even past max_users; dropping one could serve a stale read
+        for user_id in expired:
+            del self._until[user_id]
+
+    def pinned(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def route(self, user_id: int) -> bool:
+        """
+        Decide where a read goes and count it
+
+        Returns:
+            bool: True when the read may use a replica
+        """
+        if self.pinned(user_id):
+            self.primary_reads += 1
+            return False
+        self.replica_reads += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._until.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_users": len(self._until),
+        }
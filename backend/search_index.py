@@ -0,0 +1,64 @@
+"""
+Search terms for GET /search
+
+Task labels and note contents are indexed as user-scoped terms: every word
+is folded (case and accents) and prefixed with the owner's id, so ``Buy
+milk`` of user 42 becomes ``42_buy 42_milk``. The database's full-text
+index (SQLite FTS5 or MySQL FULLTEXT) then keeps one posting list per user
+and word, and a query only ever reads the asking user's postings, however
+many other users share the word. Folding happens here rather than in the
+database tokenizer so both backends match the same words.
+"""
+
+import re
+import unicodedata
+from typing import List, Optional
+
+WORD = re.compile(r"[^\W_]+")
+
+# SQLite: an external-content FTS5 index over search_documents.terms, kept in
+# step with the table by triggers. Underscore is a token character, so a
+# scoped term stays one token.
+FTS5_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5(
+        terms, content='search_documents', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_documents_fts(rowid, terms) VALUES (new.id, new.terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, terms) VALUES ('delete', old.id, old.terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, terms) VALUES ('delete', old.id, old.terms);
+        INSERT INTO search_documents_fts(rowid, terms) VALUES (new.id, new.terms);
+    END""",
+]
+FTS5_DROP_STATEMENT = "DROP TABLE IF EXISTS search_documents_fts"
+
+
+def words(text: str) -> List[str]:
+    """Lowercase, accent-free runs of letters and digits"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return WORD.findall("".join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def document_terms(user_id: int, text: str) -> str:
+    return " ".join(f"{user_id}_{word}" for word in words(text))
+
+
+def fts5_query(user_id: int, text: str, max_words: int) -> Optional[str]:
+    """FTS5 MATCH expression: every word of the query, as a prefix"""
+    query_words = words(text)[:max_words]
+    if not query_words:
+        return None
+    return " AND ".join(f'"{user_id}_{word}"*' for word in query_words)
+
+
+def boolean_mode_query(user_id: int, text: str, max_words: int) -> Optional[str]:
+    """MySQL ``IN BOOLEAN MODE`` expression with the same meaning"""
+    query_words = words(text)[:max_words]
+    if not query_words:
+        return None
+    return " ".join(f"+{user_id}_{word}*" for word in query_words)
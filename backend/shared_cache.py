@@ -0,0 +1,354 @@
+"""
+Shared response cache for TodoWeb 2.0
+Per-user cache entries with an in-memory LRU or a Redis-protocol backend, and cross-worker invalidation
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "todoweb:invalidate"
+
+# "data" for task/note changes, "principal" when the user row itself (e.g. XP) changed
+InvalidationHandler = Callable[[int, str], None]
+
+
+class CacheStats:
+    """Counters shared by the backends"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.errors = 0
+        self.invalidations_published = 0
+        self.invalidations_received = 0
+        self.invalidation_latency_total = 0.0
+        self.invalidation_latency_max = 0.0
+
+    def received(self, sent_at: float) -> None:
+        latency = max(0.0, time.time() - sent_at)
+        self.invalidations_received += 1
+        self.invalidation_latency_total += latency
+        if latency > self.invalidation_latency_max:
+            self.invalidation_latency_max = latency
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "sets": self.sets,
+            "errors": self.errors,
+            "invalidations_published": self.invalidations_published,
+            "invalidations_received": self.invalidations_received,
+            "invalidation_latency_seconds_total": self.invalidation_latency_total,
+            "invalidation_latency_seconds_max": self.invalidation_latency_max,
+        }
+
+
+class MemoryCache(CacheStats):
+    """Process-local LRU of per-user entries, bounded by count and by total bytes.
+
+    Least recently used entries are evicted until both limits hold, and a
+    value larger than ``max_bytes`` is not stored at all. Invalidations only
+    reach this process, so it suits a single worker; with several workers
+    each keeps its own copy and relies on versioned keys.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 300.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = 0
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[float, bytes]]" = OrderedDict()
+        self._fields: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._handlers: List[InvalidationHandler] = []
+
+    async def start(self, on_invalidate: InvalidationHandler) -> None:
+        self._handlers.append(on_invalidate)
+
+    async def close(self) -> None:
+        self._handlers.clear()
+
+    def _drop(self, key: Tuple[int, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+        fields = self._fields.get(key[0])
+        if fields is not None:
+            fields.discard(key[1])
+            if not fields:
+                del self._fields[key[0]]
+
+    async def get(self, user_id: int, field: str) -> Optional[bytes]:
+        key = (user_id, field)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    async def set(self, user_id: int, field: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        key = (user_id, field)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.size_bytes += len(value)
+            self._fields.setdefault(user_id, set()).add(field)
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+            self.sets += 1
+
+    async def invalidate(self, user_ids: Iterable[int], scope: str = "data") -> None:
+        sent_at = time.time()
+        for user_id in user_ids:
+            with self._lock:
+                for field in list(self._fields.get(user_id, ())):
+                    self._drop((user_id, field))
+            self.invalidations_published += 1
+            for handler in self._handlers:
+                handler(user_id, scope)
+            self.received(sent_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._fields.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "entries": len(self._entries), "bytes": self.size_bytes}
+
+
+class RespError(Exception):
+    """Error reply from the server"""
+
+
+class RespConnection:
+    """One connection speaking the Redis serialization protocol (RESP2)"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Cache server closed the connection")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self.read_reply() for _ in range(count)]
+        raise RespError(f"Unexpected reply type {kind!r}")
+
+    async def pipeline(self, *commands):
+        """Send several commands in one write and read their replies in order"""
+        self.writer.write(b"".join(self.encode(*command) for command in commands))
+        await self.writer.drain()
+        return [await self.read_reply() for _ in commands]
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class RedisCache(CacheStats):
+    """Cache on a Redis-protocol server shared by every worker.
+
+    A user's entries live in one hash (``cache:user:<id>``), so invalidation
+    is a single DEL. Every invalidation is also published on a channel that
+    each worker subscribes to, so process-local state such as the principal
+    cache is dropped everywhere. Server errors count as misses.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl_seconds: float = 300.0,
+                 pool_size: int = 10, timeout: float = 1.0):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.ttl_seconds = ttl_seconds
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.origin = uuid.uuid4().hex
+        self._idle: List[RespConnection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriber: Optional[asyncio.Task] = None
+        self._handlers: List[InvalidationHandler] = []
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"cache:user:{user_id}"
+
+    async def _connect(self) -> RespConnection:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        connection = RespConnection(reader, writer)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await connection.pipeline(*setup)
+        return connection
+
+    def _bind_loop(self) -> None:
+        # Connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = []
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+    async def _execute(self, *commands):
+        self._bind_loop()
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                replies = await asyncio.wait_for(connection.pipeline(*commands), self.timeout)
+            except BaseException:
+                # The reply stream may be half-read; never reuse the connection
+                connection.close()
+                raise
+            self._idle.append(connection)
+            return replies
+
+    async def start(self, on_invalidate: InvalidationHandler) -> None:
+        self._handlers.append(on_invalidate)
+        self._bind_loop()
+        self._subscriber = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                connection = await self._connect()
+                try:
+                    await connection.pipeline(("SUBSCRIBE", INVALIDATION_CHANNEL))
+                    while True:
+                        message = await connection.read_reply()
+                        if isinstance(message, list) and message[0] == b"message":
+                            self._deliver(message[2])
+                finally:
+                    connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation subscription lost: {e}")
+                await asyncio.sleep(1)
+
+    def _deliver(self, payload: bytes) -> None:
+        origin, sent_at, scope, *user_ids = payload.decode().split()
+        for user_id in user_ids:
+            self.received(float(sent_at))
+            # The publisher already ran its own handlers before publishing
+            if origin != self.origin:
+                for handler in self._handlers:
+                    handler(int(user_id), scope)
+
+    async def close(self) -> None:
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+            self._subscriber = None
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+        self._handlers.clear()
+
+    async def get(self, user_id: int, field: str) -> Optional[bytes]:
+        try:
+            value, = await self._execute(("HGET", self.key(user_id), field))
+        except (OSError, asyncio.TimeoutError, RespError) as e:
+            self.errors += 1
+            logger.warning(f"Cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, user_id: int, field: str, value: bytes) -> None:
+        key = self.key(user_id)
+        try:
+            await self._execute(("HSET", key, field, value), ("EXPIRE", key, int(self.ttl_seconds)))
+            self.sets += 1
+        except (OSError, asyncio.TimeoutError, RespError) as e:
+            self.errors += 1
+            logger.warning(f"Cache write failed: {e}")
+
+    async def invalidate(self, user_ids: Iterable[int], scope: str = "data") -> None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            for handler in self._handlers:
+                handler(user_id, scope)
+        payload = " ".join([self.origin, repr(time.time()), scope] + [str(user_id) for user_id in user_ids])
+        try:
+            await self._execute(
+                ("DEL", *[self.key(user_id) for user_id in user_ids]),
+                ("PUBLISH", INVALIDATION_CHANNEL, payload),
+            )
+            self.invalidations_published += len(user_ids)
+        except (OSError, asyncio.TimeoutError, RespError) as e:
+            self.errors += 1
+            logger.error(f"Cache invalidation failed for users {user_ids}: {e}")
+
+
+def create_cache(backend: str, url: str = "", max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 300.0):
+    """Build the cache named by CACHE_BACKEND; returns None when caching is off"""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    if backend == "redis":
+        return RedisCache(url or "redis://localhost:6379/0", ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown cache backend: {backend}")
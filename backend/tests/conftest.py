@@ -0,0 +1,38 @@
+import os
+import pytest
+
+# Minimum bcrypt cost keeps the suite fast; must be set before main is imported
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import main
+from main import principal_cache, read_routing, response_cache, username_index, xp_coalescer
+
+def clear_response_cache():
+    # Only the in-memory backend is process-owned; CACHE_BACKEND may also be none or redis
+    if hasattr(response_cache, "clear"):
+        response_cache.clear()
+
+def clear_xp_buffer():
+    # Only set with XP_COALESCE=true; buffered points would land on whichever user reuses the id
+    if xp_coalescer is not None:
+        xp_coalescer.clear()
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    """Each test recreates the schema, so user ids and data versions are reused across tests"""
+    principal_cache.clear()
+    username_index.clear()
+    read_routing.clear()
+    clear_response_cache()
+    clear_xp_buffer()
+    yield
+    principal_cache.clear()
+    username_index.clear()
+    read_routing.clear()
+    clear_response_cache()
+    clear_xp_buffer()
+
+@pytest.fixture
+def direct_experience(monkeypatch):
+    """Write XP updates straight to the database, as without XP_COALESCE, for tests that read them back at once"""
+    monkeypatch.setattr(main, "xp_coalescer", None)
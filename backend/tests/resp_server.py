@@ -0,0 +1,83 @@
+"""
+Minimal Redis-protocol server for cache tests
+Implements the commands RedisCache uses (hashes, DEL, EXPIRE, pub/sub) on a background event loop
+"""
+
+import asyncio
+import threading
+
+from shared_cache import RespConnection
+
+
+def bulk(value):
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespServer:
+    def __init__(self):
+        self.hashes = {}
+        self.subscribers = {}
+        self.commands = []
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.port = None
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, "127.0.0.1", 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    async def _serve(self, reader, writer):
+        connection = RespConnection(reader, writer)
+        try:
+            while True:
+                command = await connection.read_reply()
+                name, args = command[0].upper().decode(), command[1:]
+                self.commands.append(name)
+                writer.write(self._reply(name, args, writer))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for writers in self.subscribers.values():
+                writers.discard(writer)
+            writer.close()
+
+    def _reply(self, name, args, writer):
+        if name in ("PING", "AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if name == "HGET":
+            return bulk(self.hashes.get(args[0], {}).get(args[1]))
+        if name == "HSET":
+            self.hashes.setdefault(args[0], {})[args[1]] = args[2]
+            return b":1\r\n"
+        if name == "EXPIRE":
+            return b":1\r\n"
+        if name == "DEL":
+            return b":%d\r\n" % sum(self.hashes.pop(key, None) is not None for key in args)
+        if name == "PUBLISH":
+            writers = self.subscribers.get(args[0], set())
+            for subscriber in writers:
+                subscriber.write(RespConnection.encode(b"message", args[0], args[1]))
+            return b":%d\r\n" % len(writers)
+        if name == "SUBSCRIBE":
+            self.subscribers.setdefault(args[0], set()).add(writer)
+            return b"*3\r\n" + bulk(b"subscribe") + bulk(args[0]) + b":1\r\n"
+        return b"-ERR unknown command\r\n"
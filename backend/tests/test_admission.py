@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from main import app, admission_controller, admission_priority, ADMISSION_MAX_CONCURRENCY
+from admission import AdmissionController, AdmissionMiddleware
+
+client = TestClient(app)
+
+HIGH, NORMAL, LOW = 0, 1, 2
+
+def test_freed_slot_goes_to_most_urgent_waiter():
+    """Test a queued read is admitted before a login that queued earlier"""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=4, max_wait_seconds=5)
+        assert await controller.acquire(NORMAL) is None
+        order = []
+
+        async def request(priority):
+            assert await controller.acquire(priority) is None
+            order.append(priority)
+            controller.release(priority, 0.001)
+
+        waiters = [asyncio.create_task(request(LOW)), asyncio.create_task(request(HIGH))]
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == {"high": 1, "normal": 0, "low": 1}
+        controller.release(NORMAL, 0.001)
+        await asyncio.gather(*waiters)
+        return order, controller.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == [HIGH, LOW]
+    assert stats["active"] == 0
+    assert stats["admitted"] == {"high": 1, "normal": 1, "low": 1}
+
+def test_full_queue_displaces_less_urgent_waiters():
+    """Test an urgent arrival takes a low-priority waiter's place, and a full queue of equals sheds it"""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=1, max_wait_seconds=5)
+        await controller.acquire(NORMAL)
+        login = asyncio.create_task(controller.acquire(LOW))
+        await asyncio.sleep(0)
+        read = asyncio.create_task(controller.acquire(HIGH))
+        await asyncio.sleep(0)
+        assert await login == "displaced"
+        assert await controller.acquire(HIGH) == "queue_full"
+        assert await controller.acquire(LOW) == "queue_full"
+        controller.release(NORMAL, 0.001)
+        assert await read is None
+        return controller.stats()["shed"]
+
+    assert asyncio.run(scenario()) == {("low", "displaced"): 1, ("high", "queue_full"): 1, ("low", "queue_full"): 1}
+
+def test_predicted_and_actual_waits_are_bounded():
+    """Test a request is shed at once when the queue ahead is too slow, and a waiter is shed at the deadline"""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=8, max_wait_seconds=0.1)
+        await controller.acquire(LOW)
+        # The only waiter times out, however short its predicted wait
+        assert await controller.acquire(HIGH) == "timeout"
+        controller.release(LOW, 0.2)
+
+        await controller.acquire(LOW)
+        first = asyncio.create_task(controller.acquire(LOW))
+        await asyncio.sleep(0)
+        started = asyncio.get_running_loop().time()
+        # One queued login at 0.2 s each already exceeds the 0.1 s deadline
+        assert await controller.acquire(LOW) == "deadline"
+        assert asyncio.get_running_loop().time() - started < 0.01
+        # Reads do not wait behind queued logins
+        high = asyncio.create_task(controller.acquire(HIGH))
+        await asyncio.sleep(0)
+        controller.release(LOW, 0.2)
+        assert await high is None
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        controller.release(HIGH, 0.001)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed"] == {("high", "timeout"): 1, ("low", "deadline"): 1}
+    assert stats["active"] == 0 and sum(stats["queued"].values()) == 0
+
+def test_middleware_answers_503_with_retry_after():
+    """Test shed requests get a 503 with Retry-After while exempt paths bypass the limit"""
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        if scope["path"] == "/slow":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=0, max_wait_seconds=1, retry_after=3)
+        middleware = AdmissionMiddleware(slow_app, controller, lambda method, path: None if path == "/metrics" else HIGH)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test") as http:
+            slow = asyncio.create_task(http.get("/slow"))
+            await asyncio.sleep(0.05)
+            shed = await http.get("/fast")
+            exempt = await http.get("/metrics")
+            release.set()
+            return (await slow).status_code, shed, exempt.status_code
+
+    slow, shed, exempt = asyncio.run(scenario())
+    assert (slow, shed.status_code, exempt) == (200, 503, 200)
+    assert shed.headers["retry-after"] == "3"
+    assert shed.json() == {"detail": "Server is busy, please retry"}
+
+def test_route_priorities():
+    """Test reads outrank writes, which outrank logins, and streams bypass admission"""
+    assert admission_priority("GET", "/tasks") == HIGH
+    assert admission_priority("POST", "/tasks") == NORMAL
+    assert admission_priority("POST", "/auth/login") == LOW
+    assert admission_priority("GET", "/events") is None
+
+@pytest.mark.skipif(ADMISSION_MAX_CONCURRENCY == 0, reason="ADMISSION_MAX_CONCURRENCY=0")
+def test_admission_metrics():
+    """Test admissions and shed counts reach /metrics"""
+    client.get("/tasks")
+    shed = dict(admission_controller.shed)
+    admission_controller.shed[(LOW, "deadline")] = shed.get((LOW, "deadline"), 0) + 1
+    try:
+        body = client.get("/metrics").text
+    finally:
+        admission_controller.shed.clear()
+        admission_controller.shed.update(shed)
+    assert 'admission_shed_total{priority="low",reason="deadline"}' in body
+    assert 'admission_admitted_total{priority="high"}' in body
+    assert "admission_queue_wait_seconds_bucket" in body
@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from main import app, get_db, to_async_url, Base
+
+# Test database setup - same file as the sync suites, opened through aiosqlite
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def async_db():
+    """Serve requests from an AsyncSession for the duration of a test"""
+    async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL))
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    Base.metadata.create_all(bind=engine)
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    yield
+    app.dependency_overrides[get_db] = previous
+    Base.metadata.drop_all(bind=engine)
+
+def test_to_async_url():
+    """Test sync URLs map onto their asyncio drivers"""
+    assert to_async_url("sqlite:///./todoweb.db") == "sqlite+aiosqlite:///./todoweb.db"
+    assert to_async_url("mysql+pymysql://user:pw@db:3306/todoweb") == "mysql+asyncmy://user:pw@db:3306/todoweb"
+
+def test_task_flow_on_async_session(async_db):
+    """Test register, task CRUD and XP updates through the async driver"""
+    response = client.post("/auth/register", json={
+        "username": "asyncuser",
+        "email": "async@example.com",
+        "password": "testpassword123"
+    })
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    task_data = {"label": "Async Task", "x": 1, "y": 2, "color": "#00ff00"}
+    task_id = client.post("/tasks", json=task_data, headers=headers).json()["id"]
+    assert client.patch(f"/tasks/{task_id}/complete", headers=headers).status_code == 200
+
+    tasks = client.get("/tasks", headers=headers).json()
+    assert len(tasks) == 1
+    assert tasks[0]["completed"] == True
+
+    response = client.patch("/users/experience", json={"points": 10}, headers=headers)
+    assert response.json()["experience_points"] == 10
+
+    assert client.delete(f"/tasks/{task_id}", headers=headers).status_code == 200
+    assert client.get("/tasks", headers=headers).json() == []
@@ -1,8 +1,13 @@
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
-from main import app, get_db, User, Base
+from main import app, get_db, password_hasher, principal_cache, response_cache, username_index, User, Base
+from password_hasher import PasswordHasher
 import os
 
 # Test database setup
@@ -156,3 +161,130 @@ def test_get_current_user(setup_database):
     data = response.json()
     assert data["username"] == "testuser"
     assert data["email"] == "test@example.com"
+
+def test_authenticated_request_uses_principal_cache(setup_database):
+    """Test cached principals skip the users lookup for GET /tasks"""
+    user_data = {
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    }
+    token = client.post("/auth/register", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # First request loads the user and fills the cache
+    misses = principal_cache.stats()["misses"]
+    client.get("/tasks", headers=headers)
+    assert principal_cache.stats()["misses"] == misses + 1
+    
+    hits = principal_cache.stats()["hits"]
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/tasks", headers=headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_statement)
+    
+    assert response.status_code == 200
+    # The ETag version lookup, then the task list unless the response cache has it
+    assert not any("FROM users" in statement for statement in statements)
+    assert "FROM user_data_versions" in statements[0]
+    assert len(statements) == (1 if response_cache is not None else 2)
+    assert principal_cache.stats()["hits"] == hits + 1
+
+def test_experience_update_invalidates_principal_cache(setup_database, direct_experience):
+    """Test /auth/me reflects XP changes made after the user was cached"""
+    user_data = {
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    }
+    token = client.post("/auth/register", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    assert client.get("/auth/me", headers=headers).json()["experience_points"] == 0
+    invalidations = principal_cache.stats()["invalidations"]
+    client.patch("/users/experience", json={"points": 15}, headers=headers)
+    
+    response = client.get("/auth/me", headers=headers)
+    assert response.json()["experience_points"] == 15
+    assert principal_cache.stats()["invalidations"] == invalidations + 1
+
+def test_register_rejected_when_hashing_queue_full(setup_database, monkeypatch):
+    """Test a saturated hashing pool answers 503 with Retry-After"""
+    monkeypatch.setattr(password_hasher, "pending", password_hasher.max_pending)
+    user_data = {
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    }
+    
+    response = client.post("/auth/register", json=user_data)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(password_hasher.retry_after)
+
+def test_broken_hashing_pool_is_shut_down_and_replaced():
+    """Test a pool whose worker died is shut down and the next hash gets a fresh one"""
+    hasher = PasswordHasher(rounds=4, workers=1)
+
+    async def scenario():
+        broken = hasher._get_executor()
+        shutdowns = []
+        shutdown = broken.shutdown
+        broken.shutdown = lambda **options: shutdowns.append(options) or shutdown(**options)
+        with pytest.raises(BrokenProcessPool):
+            await hasher._submit(os._exit, 1)
+        assert hasher._executor is None
+        assert shutdowns == [{"wait": False, "cancel_futures": True}]
+        return await hasher.hash("testpassword123")
+
+    try:
+        assert asyncio.run(scenario()).startswith("$2b$04$")
+    finally:
+        hasher.shutdown()
+
+def test_login_rehashes_outdated_password_hash(setup_database, monkeypatch):
+    """Test login upgrades hashes created with a different bcrypt cost"""
+    user_data = {
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    }
+    client.post("/auth/register", json=user_data)
+    
+    monkeypatch.setattr(password_hasher, "rounds", password_hasher.rounds + 1)
+    response = client.post("/auth/login", json={"username": "testuser", "password": "testpassword123"})
+    assert response.status_code == 200
+    
+    db = TestingSessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "testuser").first()
+        assert user.hashed_password.startswith(f"$2b${password_hasher.rounds:02d}$")
+    finally:
+        db.close()
+
+def test_check_username_answered_from_index(setup_database):
+    """Test a warmed index answers misses without querying users"""
+    username_index.warm([])
+    client.post("/auth/register", json={
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    })
+    
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count_statement)
+    try:
+        available = client.post("/auth/check-username", json={"username": "newuser"}).json()["available"]
+        assert statements == []
+        taken = client.post("/auth/check-username", json={"username": "testuser"}).json()["available"]
+        assert len(statements) == 1
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_statement)
+    
+    assert available == True
+    assert taken == False
@@ -1,8 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, inspect, select
 from sqlalchemy.orm import sessionmaker
-from main import app, get_db, User, CalendarNote, Base
+from main import app, get_db, add_calendar_note_date_index, rebuild_search_documents, rebuild_user_stats, User, CalendarNote, SearchDocument, Base
 import os
 
 # Test database setup
@@ -138,3 +138,57 @@ def test_update_calendar_note_same_date(setup_database, auth_headers):
     # Verify only one note exists
     get_response = client.get("/calendar-notes", headers=auth_headers)
     assert len(get_response.json()) == 1
+
+def test_get_calendar_notes_date_range(setup_database, auth_headers):
+    """Test notes can be limited to an inclusive date range"""
+    for date in ["2024-01-31", "2024-02-01", "2024-02-29", "2024-03-01"]:
+        client.post("/calendar-notes", json={"date": date, "content": f"Note {date}"}, headers=auth_headers)
+    
+    response = client.get("/calendar-notes", params={"from": "2024-02-01", "to": "2024-02-29"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [note["date"] for note in response.json()] == ["2024-02-01", "2024-02-29"]
+
+def test_upsert_keeps_single_note_per_date(setup_database, auth_headers):
+    """Test repeated saves for a date update one row in place"""
+    first = client.post("/calendar-notes", json={"date": "2024-01-15", "content": "First"}, headers=auth_headers).json()
+    second = client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Second"}, headers=auth_headers).json()
+    
+    assert second["id"] == first["id"]
+    assert second["content"] == "Second"
+    assert second["created_at"] == first["created_at"]
+    assert len(client.get("/calendar-notes", headers=auth_headers).json()) == 1
+
+def test_date_index_migration_removes_duplicates(setup_database, auth_headers):
+    """Test a table from before the unique index keeps each day's newest note and gets the index"""
+    client.post("/calendar-notes", json={"date": "2024-01-16", "content": "Single"}, headers=auth_headers)
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX uq_calendar_notes_user_id_date")
+        for content in ("Old", "New"):
+            conn.execute(CalendarNote.__table__.insert().values(user_id=user_id, date="2024-01-15", content=content))
+        rebuild_search_documents(conn, [user_id])
+        rebuild_user_stats(conn, [user_id])
+    assert client.get("/auth/me", headers=auth_headers).json()["calendar_notes_count"] == 3
+
+    with engine.begin() as conn:
+        assert add_calendar_note_date_index(conn) == 1
+        assert add_calendar_note_date_index(conn) == 0
+        assert "uq_calendar_notes_user_id_date" in {index["name"] for index in inspect(conn).get_indexes("calendar_notes")}
+        assert conn.scalar(select(func.count()).select_from(SearchDocument).where(SearchDocument.kind == "note")) == 2
+
+    notes = client.get("/calendar-notes", headers=auth_headers).json()
+    assert sorted((note["date"], note["content"]) for note in notes) == [("2024-01-15", "New"), ("2024-01-16", "Single")]
+    assert client.get("/auth/me", headers=auth_headers).json()["calendar_notes_count"] == 2
+    response = client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Saved"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert len(client.get("/calendar-notes", headers=auth_headers).json()) == 2
+
+def test_get_calendar_notes_conditional_request(setup_database, auth_headers):
+    """Test note saves invalidate the notes ETag"""
+    etag = client.get("/calendar-notes", headers=auth_headers).headers["ETag"]
+    assert client.get("/calendar-notes", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+    
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Note"}, headers=auth_headers)
+    response = client.get("/calendar-notes", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from main import app, get_db, change_broker, create_access_token, Base
+from change_stream import ChangeBroker, RedactStreamToken, HEARTBEAT_FRAME, RESYNC_FRAME
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def register(username="testuser"):
+    response = client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpassword123"
+    })
+    return response.json()["access_token"]
+
+def parse_frames(body: bytes):
+    """(event, data) pairs from an SSE body, skipping comments and retry hints"""
+    events = []
+    for frame in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+class OpenStream:
+    """Drives GET /events directly over ASGI, since the test clients buffer whole bodies"""
+
+    def __init__(self, query_string: bytes):
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/events", "raw_path": b"/events", "root_path": "",
+            "query_string": query_string, "headers": [(b"host", b"test")],
+            "server": ("test", 80), "client": ("127.0.0.1", 1234),
+        }
+        self.disconnected = asyncio.Event()
+        self.status = None
+        self.body = b""
+        self.chunk = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        else:
+            self.body += message.get("body", b"")
+        self.chunk.set()
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(app(self.scope, self.receive, self.send))
+        await self.wait_for(lambda: self.body)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+    async def wait_for(self, condition):
+        while not condition():
+            self.chunk.clear()
+            await asyncio.wait_for(self.chunk.wait(), 5)
+
+def test_broker_fans_out_and_resyncs_slow_readers():
+    """Test per-user delivery, heartbeats and the resync marker for a full queue"""
+    async def scenario():
+        broker = ChangeBroker(queue_size=2)
+        first, second = broker.subscribe(1), broker.subscribe(1)
+        other = broker.subscribe(2)
+        assert broker.publish(1, "task_deleted", {"id": 5}) == 2
+        assert other.queue.empty()
+        assert await first.queue.get() == b'event: task_deleted\ndata: {"id":5}\n\n'
+
+        broker.heartbeat()
+        assert await first.queue.get() == HEARTBEAT_FRAME
+
+        # second still holds the event and the heartbeat: the next event overflows it
+        broker.publish(1, "task_deleted", {"id": 6})
+        broker.publish(1, "task_deleted", {"id": 7})
+        assert second.queue.qsize() == 2
+        assert await second.queue.get() == RESYNC_FRAME
+        assert await second.queue.get() == b'event: task_deleted\ndata: {"id":7}\n\n'
+        assert broker.dropped == 3
+
+        broker.unsubscribe(first)
+        broker.unsubscribe(first)
+        assert broker.subscriber_count(1) == 1
+        assert broker.stats()["connections"] == 2
+
+    asyncio.run(scenario())
+
+def test_stream_rejected_at_capacity():
+    """Test the worker-wide connection cap"""
+    broker = ChangeBroker(max_connections=1)
+    assert broker.accepting()
+    broker.subscribe(1)
+    assert not broker.accepting()
+    assert broker.stats()["rejected"] == 1
+
+def test_stream_requires_token(setup_database):
+    """Test that the stream needs a valid token"""
+    assert client.get("/events").status_code == 401
+    assert client.get("/events", params={"stream_token": "invalid"}).status_code == 401
+
+def test_stream_token_only_opens_streams(setup_database):
+    """Test the URL carries a short-lived stream token: access tokens are refused there and stream tokens everywhere else"""
+    token = register()
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/events/token").status_code in (401, 403)
+    issued = client.post("/events/token", headers=headers).json()
+    assert issued["expires_in"] == 60
+
+    # Access tokens are only accepted in the Authorization header
+    assert client.get("/events", params={"access_token": token}).status_code == 401
+    assert client.get("/events", params={"stream_token": token}).status_code == 401
+    assert client.get("/tasks", headers={"Authorization": f"Bearer {issued['stream_token']}"}).status_code == 401
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    expired = create_access_token(data={"sub": str(user_id), "scope": "events"}, expires=timedelta(seconds=-1))
+    assert client.get("/events", params={"stream_token": expired}).status_code == 401
+
+def test_access_log_redacts_stream_token():
+    """Test uvicorn access lines keep the path but not the stream token"""
+    record = logging.LogRecord("uvicorn.access", logging.INFO, __file__, 0, '%s - "%s %s HTTP/%s" %d',
+                               ("127.0.0.1:5000", "GET", "/events?stream_token=abc.def.ghi&x=1", "1.1", 200), None)
+    assert RedactStreamToken().filter(record)
+    assert record.getMessage() == '127.0.0.1:5000 - "GET /events?stream_token=[redacted]&x=1 HTTP/1.1" 200'
+
+def test_stream_delivers_mutations(setup_database, direct_experience):
+    """Test that writes reach an open stream as compact events, after commit"""
+    token = register()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+            stream_token = (await api.post("/events/token", headers=headers)).json()["stream_token"]
+            async with OpenStream(f"stream_token={stream_token}".encode()) as stream:
+                assert stream.status == 200
+                assert change_broker.subscriber_count(stream_user_id) == 1
+
+                created = (await api.post("/tasks", json={"label": "Stream", "x": 1, "y": 2, "color": "#fff"},
+                                          headers={**headers, "X-Client-Id": "tab-1"})).json()
+                await api.patch(f"/tasks/{created['id']}/complete", headers=headers)
+                await api.patch("/users/experience", json={"points": 10}, headers=headers)
+                await api.post("/calendar-notes", json={"date": "2024-01-15", "content": "Note"}, headers=headers)
+                await api.delete(f"/tasks/{created['id']}", headers=headers)
+                # A rejected write publishes nothing
+                assert (await api.delete("/tasks/999999", headers=headers)).status_code == 404
+                await stream.wait_for(lambda: b"task_deleted" in stream.body)
+
+            assert change_broker.subscriber_count(stream_user_id) == 0
+            return parse_frames(stream.body), created
+
+    stream_user_id = client.get("/auth/me", headers=headers).json()["id"]
+    events, created = asyncio.run(scenario())
+    assert [event for event, _ in events] == [
+        "task_created", "task_completed", "xp_changed", "note_upserted", "task_deleted"
+    ]
+    # Task and note events carry the revision GET /sync would report for them
+    assert events[0][1] == {"task": created, "revision": 1, "source": "tab-1"}
+    assert events[1][1] == {"id": created["id"], "revision": 2}
+    assert events[2][1] == {"delta": 10, "experience_points": 10}
+    assert events[3][1]["note"]["content"] == "Note"
+    assert events[4][1] == {"id": created["id"], "revision": 5}
+
+def test_batch_publishes_per_operation(setup_database):
+    """Test that a batch publishes one event per applied operation"""
+    token = register()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    task_id = client.post("/tasks", json={"label": "A", "x": 0, "y": 0, "color": "#fff"}, headers=headers).json()["id"]
+
+    async def scenario():
+        subscription = change_broker.subscribe(user_id)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+                await api.post("/tasks/batch", headers=headers, json={"operations": [
+                    {"op": "create", "label": "B", "x": 1, "y": 1, "color": "#000"},
+                    {"op": "complete", "id": task_id},
+                    {"op": "delete", "id": 999999},
+                ]})
+            frames = b""
+            while not subscription.queue.empty():
+                frames += subscription.queue.get_nowait()
+            return parse_frames(frames)
+        finally:
+            change_broker.unsubscribe(subscription)
+
+    events = asyncio.run(scenario())
+    assert [event for event, _ in events] == ["task_created", "task_completed"]
+    assert events[1][1] == {"id": task_id, "revision": 2}
@@ -0,0 +1,69 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from main import app, get_db, pwd_context, task_cell, Base, CalendarNote, Task, User
+from benchmarks.generate_dataset import build_parser, generate
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def snapshot():
+    with engine.connect() as conn:
+        return (
+            conn.execute(select(User.username, User.experience_points, User.created_at).order_by(User.id)).all(),
+            conn.execute(select(Task.user_id, Task.label, Task.x, Task.y, Task.completed, Task.cell).order_by(Task.id)).all(),
+            conn.execute(select(CalendarNote.user_id, CalendarNote.date, CalendarNote.content).order_by(CalendarNote.id)).all(),
+        )
+
+def test_generator_is_deterministic(setup_database):
+    """Test the same seed and parameters produce identical rows"""
+    options = build_parser().parse_args(["--users", "25", "--tasks-mean", "8", "--note-density", "0.05",
+                                         "--chunk-users", "10", "--seed", "3"])
+    password_hash = pwd_context.hash(options.password)
+    totals = generate(engine, options, password_hash)
+    first = snapshot()
+    assert totals["users"] == 25
+    assert len(first[1]) == totals["tasks"]
+    # Bulk inserts fill the grid cell through the column default
+    assert all(task.cell == task_cell(task.x, task.y) for task in first[1])
+    assert len(first[2]) == 25 * round(365 * 0.05)
+    
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    generate(engine, options, password_hash)
+    assert snapshot() == first
+
+def test_generated_users_can_log_in(setup_database):
+    """Test generated users share the precomputed password hash"""
+    options = build_parser().parse_args(["--users", "2", "--tasks-mean", "3", "--distribution", "constant",
+                                         "--completion-ratio", "1"])
+    generate(engine, options, pwd_context.hash(options.password))
+    
+    response = client.post("/auth/login", json={"username": "gen1", "password": options.password})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    tasks = client.get("/tasks", headers=headers).json()
+    assert len(tasks) == 3 and all(task["completed"] for task in tasks)
+    me = client.get("/auth/me", headers=headers).json()
+    assert me["experience_points"] == 30
+    assert (me["tasks_count"], me["total_tasks_completed"], me["streak_days"]) == (3, 3, 0)
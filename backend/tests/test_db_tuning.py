@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine, text
+from db_tuning import TimedQueuePool, install_sqlite_pragmas, pool_options, pool_wait, sqlite_pragmas
+
+def test_production_profile_sqlite_pragmas(tmp_path, monkeypatch):
+    """Test every new connection runs in WAL mode with the profile pragmas"""
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "1234")
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'tuning.db'}",
+        poolclass=TimedQueuePool,
+        **pool_options("production")
+    )
+    install_sqlite_pragmas(engine, sqlite_pragmas("production"))
+    
+    checkouts = pool_wait.stats()["checkouts"]
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    assert pool_wait.stats()["checkouts"] == checkouts + 1
+    engine.dispose()
+
+def test_default_profile_keeps_driver_defaults(monkeypatch):
+    """Test the default profile sets no pragmas and SQLAlchemy's pool sizes"""
+    assert sqlite_pragmas("default") == {}
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    assert pool_options("default") == {"pool_size": 7, "max_overflow": 10, "pool_timeout": 30.0}
+
+def test_unknown_profile_rejected():
+    """Test a misspelt profile fails loudly"""
+    with pytest.raises(ValueError):
+        pool_options("fast")
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, apply_experience_deltas, User, Base
+from xp_coalescer import ExperienceCoalescer
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def auth_headers(setup_database):
+    """Create a test user and return auth headers"""
+    user_data = {
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    }
+    response = client.post("/auth/register", json=user_data)
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def stored_experience(username):
+    db = TestingSessionLocal()
+    try:
+        return db.query(User).filter(User.username == username).first().experience_points
+    finally:
+        db.close()
+
+def test_update_experience_accumulates(auth_headers, direct_experience):
+    """Test successive XP updates add up in the database"""
+    for expected in (10, 15, 25):
+        response = client.patch("/users/experience", json={"points": expected - stored_experience("testuser")}, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["experience_points"] == expected
+    assert stored_experience("testuser") == 25
+
+def test_coalesced_experience_flushes_in_batch(auth_headers, monkeypatch):
+    """Test buffered XP is reported immediately and written on flush"""
+    coalescer = ExperienceCoalescer(max_users=100)
+    monkeypatch.setattr(main, "xp_coalescer", coalescer)
+    # Background flushes open their own session; point it at the test database
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main, "AsyncSessionLocal", None)
+    
+    client.patch("/users/experience", json={"points": 10}, headers=auth_headers)
+    response = client.patch("/users/experience", json={"points": 5}, headers=auth_headers)
+    assert response.json()["experience_points"] == 15
+    assert client.get("/auth/me", headers=auth_headers).json()["experience_points"] == 15
+    assert stored_experience("testuser") == 0
+    
+    # Buffered XP is part of the ETag, so a conditional read sees it before the flush
+    etag = client.get("/auth/me", headers=auth_headers).headers["etag"]
+    client.patch("/users/experience", json={"points": 5}, headers=auth_headers)
+    response = client.get("/auth/me", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["experience_points"] == 20
+    client.patch("/users/experience", json={"points": -5}, headers=auth_headers)
+    
+    assert asyncio.run(coalescer.flush(apply_experience_deltas)) == 1
+    assert stored_experience("testuser") == 15
+    assert coalescer.pending(1) == 0
+    assert client.get("/auth/me", headers=auth_headers).json()["experience_points"] == 15
@@ -0,0 +1,164 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, Base
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database(monkeypatch):
+    # The export stream opens its own session; point it at the test database
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main, "AsyncSessionLocal", None)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def register(username):
+    response = client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def export_records(headers):
+    response = client.get("/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def ndjson(*records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+def test_export_streams_profile_tasks_and_notes(setup_database, monkeypatch):
+    """Test the export holds the profile, live tasks and notes"""
+    monkeypatch.setattr(main, "EXPORT_CHUNK_ROWS", 2)
+    headers = register("exporter")
+    task_ids = [
+        client.post("/tasks", json={"label": f"Task {i}", "x": i, "y": i, "color": "#fff"}, headers=headers).json()["id"]
+        for i in range(5)
+    ]
+    client.delete(f"/tasks/{task_ids[0]}", headers=headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Note"}, headers=headers)
+
+    records = export_records(headers)
+    profile = records[0]
+    assert profile["type"] == "profile"
+    assert profile["username"] == "exporter"
+    assert profile["revision"] == 7
+    assert [record["label"] for record in records if record["type"] == "task"] == [f"Task {i}" for i in range(1, 5)]
+    assert [record["content"] for record in records if record["type"] == "note"] == ["Note"]
+
+def test_import_round_trip_with_dry_run(setup_database):
+    """Test an export imports into another account, after a dry run that writes nothing"""
+    source = register("source")
+    for i in range(3):
+        client.post("/tasks", json={"label": f"Task {i}", "x": i, "y": i, "color": "#fff"}, headers=source)
+    client.patch("/tasks/1/complete", headers=source)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Note"}, headers=source)
+    body = client.get("/export", headers=source).content
+
+    target = register("target")
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Replaced"}, headers=target)
+
+    response = client.post("/import", params={"dry_run": True}, content=body, headers=target)
+    assert response.status_code == 200
+    assert response.json() == {"dry_run": True, "lines": 5, "tasks": 3, "calendar_notes": 1, "errors": []}
+    assert client.get("/tasks", headers=target).json() == []
+
+    response = client.post("/import", content=body, headers=target)
+    assert response.status_code == 200
+    assert response.json()["tasks"] == 3
+    tasks = client.get("/tasks", headers=target).json()
+    assert [(task["label"], task["completed"]) for task in tasks] == [("Task 0", True), ("Task 1", False), ("Task 2", False)]
+    assert [note["content"] for note in client.get("/calendar-notes", headers=target).json()] == ["Note"]
+    # Imported rows are visible to incremental sync
+    assert len(client.get("/sync", params={"since": 1}, headers=target).json()["tasks"]) == 3
+
+def test_import_writes_in_chunks(setup_database, monkeypatch):
+    """Test each chunk is its own transaction with its own revision"""
+    monkeypatch.setattr(main, "IMPORT_CHUNK_ROWS", 2)
+    headers = register("chunked")
+    body = ndjson(*[{"type": "task", "label": f"Task {i}", "x": i, "y": i, "color": "#fff"} for i in range(5)])
+    response = client.post("/import", content=body, headers=headers)
+    assert response.json()["tasks"] == 5
+    assert client.get("/sync", headers=headers).json()["revision"] == 3
+
+def test_import_holds_no_session_while_reading(setup_database, monkeypatch):
+    """Test the body is read with every session slot free, and each chunk takes one only to write"""
+    monkeypatch.setattr(main, "IMPORT_CHUNK_ROWS", 2)
+    monkeypatch.setattr(main, "sync_session_slots", main.anyio.Semaphore(1))
+    headers = register("uploader")
+    free_slots = []
+    read_lines = main.ndjson_lines
+
+    async def watched_lines(chunks, max_line_bytes):
+        async for line in read_lines(chunks, max_line_bytes):
+            free_slots.append(main.sync_session_slots.value)
+            yield line
+    monkeypatch.setattr(main, "ndjson_lines", watched_lines)
+
+    body = ndjson(*[{"type": "task", "label": f"Task {i}", "x": i, "y": i, "color": "#fff"} for i in range(5)])
+    response = client.post("/import", content=body, headers=headers)
+    assert response.json()["tasks"] == 5
+    assert free_slots == [1] * 5
+    assert len(client.get("/tasks", headers=headers).json()) == 5
+
+def test_import_stops_at_first_invalid_line(setup_database, monkeypatch):
+    """Test rows before an invalid line are kept and the line is reported"""
+    monkeypatch.setattr(main, "IMPORT_CHUNK_ROWS", 1)
+    headers = register("invalid")
+    body = ndjson(
+        {"type": "task", "label": "Good", "x": 1, "y": 1, "color": "#fff"},
+        {"type": "task", "label": "Bad", "x": "left", "y": 1, "color": "#fff"},
+        {"type": "task", "label": "Never", "x": 1, "y": 1, "color": "#fff"},
+    )
+    response = client.post("/import", content=body, headers=headers)
+    assert response.status_code == 422
+    result = response.json()
+    assert result["tasks"] == 1
+    assert result["errors"] == [{"line": 2, "error": "task.x: Input should be a valid integer, unable to parse string as an integer"}]
+    assert [task["label"] for task in client.get("/tasks", headers=headers).json()] == ["Good"]
+
+def test_import_dry_run_reports_every_error(setup_database, monkeypatch):
+    """Test a dry run validates the whole body"""
+    monkeypatch.setattr(main, "IMPORT_MAX_LINE_BYTES", 200)
+    headers = register("dryrun")
+    body = (
+        "not json\n"
+        + ndjson({"type": "note", "date": "2024-02-30", "content": "x"}, {"type": "unknown"})
+        + json.dumps({"type": "task", "label": "x" * 300, "x": 1, "y": 1, "color": "#fff"}) + "\n"
+        + "\n"
+        + ndjson({"type": "task", "label": "Fine", "x": 1, "y": 1, "color": "#fff"})
+    )
+    response = client.post("/import", params={"dry_run": True}, content=body, headers=headers)
+    assert response.status_code == 422
+    result = response.json()
+    assert [error["line"] for error in result["errors"]] == [1, 2, 3, 4]
+    assert result["lines"] == 6
+    assert result["tasks"] == 1
+    assert client.get("/tasks", headers=headers).json() == []
+
+def test_export_requires_auth(setup_database):
+    """Test export and import need a token"""
+    assert client.get("/export").status_code == 403
+    assert client.post("/import", content=b"").status_code == 403
@@ -0,0 +1,133 @@
+import asyncio
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, leaderboard, on_user_invalidated, User, Base
+from leaderboard import RankIndex
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database(monkeypatch):
+    # Coalesced XP flushes open their own session; point it at the test database
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main, "AsyncSessionLocal", None)
+    Base.metadata.create_all(bind=engine)
+    leaderboard.clear()
+    yield
+    leaderboard.clear()
+    Base.metadata.drop_all(bind=engine)
+
+def register(username):
+    response = client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpassword123"
+    })
+    body = response.json()
+    return body["user"]["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+def add_xp(headers, points):
+    client.patch("/users/experience", json={"points": points}, headers=headers)
+
+def standings(headers, **params):
+    response = client.get("/leaderboard", params=params, headers=headers)
+    assert response.status_code == 200
+    return [(entry["username"], entry["experience_points"], entry["rank"]) for entry in response.json()]
+
+def test_rank_index_counts_match_a_sorted_list():
+    """Test counts stay exact through block splits and removals"""
+    rng = random.Random(7)
+    index, values = RankIndex(block_size=4), []
+    for _ in range(3000):
+        if values and rng.random() < 0.4:
+            value = values.pop(rng.randrange(len(values)))
+            index.remove(value)
+        else:
+            value = rng.randrange(-20, 100)
+            values.append(value)
+            index.add(value)
+        probe = rng.randrange(-30, 110)
+        assert index.count_greater(probe) == sum(1 for value in values if value > probe)
+    assert len(index) == len(values)
+    with pytest.raises(ValueError):
+        index.remove(1000)
+
+def test_leaderboard_and_rank(setup_database, direct_experience):
+    """Test order, shared ranks for equal XP and the caller's own rank"""
+    _, alice = register("alice")
+    _, bob = register("bob")
+    _, carol = register("carol")
+    add_xp(alice, 30)
+    add_xp(bob, 50)
+    add_xp(carol, 30)
+    
+    assert standings(alice) == [("bob", 50, 1), ("alice", 30, 2), ("carol", 30, 2)]
+    assert standings(alice, limit=1) == [("bob", 50, 1)]
+    assert client.get("/users/me/rank", headers=carol).json() == {"rank": 2, "experience_points": 30, "users": 3}
+    
+    add_xp(carol, 25)
+    assert standings(alice) == [("carol", 55, 1), ("bob", 50, 2), ("alice", 30, 3)]
+    assert client.get("/users/me/rank", headers=alice).json()["rank"] == 3
+    
+    _, dave = register("dave")
+    assert client.get("/users/me/rank", headers=dave).json() == {"rank": 4, "experience_points": 0, "users": 4}
+
+def test_top_rows_cached_until_a_change_reaches_them(setup_database, monkeypatch, direct_experience):
+    """Test repeated reads skip the database and changes below the cached rows keep them"""
+    monkeypatch.setattr(leaderboard, "top_size", 2)
+    headers = {}
+    for name, points in (("first", 30), ("second", 20), ("third", 10)):
+        _, headers[name] = register(name)
+        add_xp(headers[name], points)
+    
+    misses = leaderboard.top_misses
+    assert standings(headers["first"], limit=2) == [("first", 30, 1), ("second", 20, 2)]
+    assert standings(headers["first"], limit=2) == [("first", 30, 1), ("second", 20, 2)]
+    assert leaderboard.top_misses == misses + 1
+    
+    add_xp(headers["third"], 5)
+    standings(headers["first"], limit=2)
+    assert leaderboard.top_misses == misses + 1
+    
+    add_xp(headers["third"], 10)
+    assert standings(headers["first"], limit=2) == [("first", 30, 1), ("third", 25, 2)]
+    assert leaderboard.top_misses == misses + 2
+
+def test_changes_from_elsewhere_are_picked_up(setup_database):
+    """Test coalesced flushes and other workers' writes reach the board"""
+    alice_id, alice = register("alice")
+    bob_id, bob = register("bob")
+    assert client.get("/users/me/rank", headers=alice).json()["users"] == 2
+    
+    asyncio.run(main.apply_experience_deltas({alice_id: 15}))
+    assert standings(alice) == [("alice", 15, 1), ("bob", 0, 2)]
+    
+    # Another worker's XP write arrives here only as an invalidation
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == bob_id).values(experience_points=40))
+    on_user_invalidated(bob_id, "principal")
+    assert client.get("/users/me/rank", headers=bob).json() == {"rank": 1, "experience_points": 40, "users": 2}
+
+def test_leaderboard_requires_auth(setup_database):
+    """Test both endpoints need a token"""
+    assert client.get("/leaderboard").status_code == 403
+    assert client.get("/users/me/rank").status_code == 403
@@ -0,0 +1,55 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from main import app, get_db, request_metrics, Base
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def test_metrics_report_route_latency_and_queries(setup_database):
+    """Test requests are labelled by route template with query counts"""
+    response = client.post("/auth/register", json={
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    })
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    client.get("/tasks", headers=headers)
+    client.delete("/tasks/999", headers=headers)
+    
+    body = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/tasks",status="200"}' in body
+    assert 'http_requests_total{method="DELETE",route="/tasks/{task_id}",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/tasks",le="+Inf"}' in body
+    assert 'http_request_db_queries_count{method="GET",route="/tasks"}' in body
+    assert "password_hash_queue_depth 0" in body
+    assert 'db_pool_checked_out{engine="primary"}' in body
+    
+    # At least the ETag version lookup and the task list itself
+    assert request_metrics.queries._series[("GET", "/tasks")][-1] >= 2
+
+def test_metrics_unmatched_paths_share_label(setup_database):
+    """Test unknown paths do not create one series per URL"""
+    client.get("/no-such-path/1")
+    client.get("/no-such-path/2")
+    assert 'route="unmatched",status="404"' in client.get("/metrics").text
@@ -0,0 +1,111 @@
+import logging
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from main import app, get_db, request_profiler, slow_query_log, Base
+from profiling import parameter_shape
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def auth_headers(setup_database):
+    response = client.post("/auth/register", json={
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def profiler_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(request_profiler, "directory", str(tmp_path))
+    monkeypatch.setattr(request_profiler, "token", "secret-token")
+    monkeypatch.setattr(request_profiler, "sample_rate", 0.0)
+    monkeypatch.setattr(request_profiler, "interval_seconds", 0.0001)
+    return tmp_path
+
+def test_parameter_shape_hides_values():
+    """Test parameter shapes carry names and types only"""
+    assert parameter_shape({"user_id": 7, "label": "secret"}) == "{user_id: int, label: str}"
+    assert parameter_shape((1, None)) == "(int, NULL)"
+    assert parameter_shape([{"a": 1}, {"a": 2}], executemany=True) == "{a: int} x 2"
+
+def test_slow_query_logged_with_route(auth_headers, monkeypatch, caplog):
+    """Test statements over the threshold are logged with their route template"""
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0.0)
+    before = slow_query_log.slow_queries
+    with caplog.at_level(logging.WARNING, logger="profiling"):
+        client.delete("/tasks/999", headers=auth_headers)
+    
+    messages = [record.getMessage() for record in caplog.records if record.name == "profiling"]
+    assert messages
+    assert all(" on /tasks/{task_id}: " in message for message in messages)
+    assert any("params=(int, int)" in message for message in messages)
+    assert slow_query_log.slow_queries > before
+
+def test_failed_statement_leaves_connection_clean(monkeypatch, caplog):
+    """Test a statement that raises leaves no timing state behind on its pooled connection"""
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0.0)
+    scratch = create_engine("sqlite://")
+    with scratch.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("SELECT * FROM missing_table")
+        info = dict(conn.info)
+        with caplog.at_level(logging.WARNING, logger="profiling"):
+            conn.exec_driver_sql("SELECT 1")
+        assert dict(conn.info) == info
+    assert any("SELECT 1" in record.getMessage() for record in caplog.records if record.name == "profiling")
+
+def test_fast_queries_not_logged(auth_headers, monkeypatch, caplog):
+    """Test statements under the threshold stay out of the log"""
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 60000.0)
+    with caplog.at_level(logging.WARNING, logger="profiling"):
+        client.get("/tasks", headers=auth_headers)
+    assert not [record for record in caplog.records if record.name == "profiling"]
+
+def test_admin_header_profiles_request(auth_headers, profiler_settings):
+    """Test a matching X-Profile token writes a collapsed-stack profile"""
+    response = client.get("/tasks", headers={**auth_headers, "X-Profile": "secret-token"})
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    # Statements are counted once, by the metrics listener
+    queries = int(response.headers["server-timing"].split('desc="')[1].split(" ")[0])
+    assert queries >= 2
+    
+    path = profiler_settings / response.headers["x-profile-id"]
+    lines = path.read_text().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+def test_wrong_profile_token_ignored(auth_headers, profiler_settings):
+    """Test requests without the admin token are not profiled"""
+    response = client.get("/tasks", headers={**auth_headers, "X-Profile": "guess"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert os.listdir(profiler_settings) == []
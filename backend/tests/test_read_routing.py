@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from main import app, get_db, get_read_db, read_routing, Base, CalendarNote, Task
+from read_routing import ReadYourWrites
+
+# Test database setup - a second SQLite file stands in for the replica
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+REPLICA_DATABASE_URL = "sqlite:///./test_replica.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+replica_engine = create_engine(REPLICA_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+def override_get_read_db():
+    try:
+        db = ReplicaSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_databases():
+    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=replica_engine)
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    yield
+    app.dependency_overrides.pop(get_read_db, None)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=replica_engine)
+
+@pytest.fixture
+def auth_headers(setup_databases):
+    response = client.post("/auth/register", json={
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def add_replica_task(label):
+    with ReplicaSessionLocal() as db:
+        db.add(Task(user_id=1, label=label, x=0, y=0, color="#ffffff"))
+        db.commit()
+
+def test_reads_go_to_replica(auth_headers):
+    """Test read-only handlers use the replica when the user has not written"""
+    add_replica_task("Replica Task")
+    tasks = client.get("/tasks", headers=auth_headers).json()
+    assert [task["label"] for task in tasks] == ["Replica Task"]
+    assert client.get("/calendar-notes", headers=auth_headers).json() == []
+    assert read_routing.stats()["replica_reads"] >= 2
+
+def test_reads_after_write_stay_on_primary(auth_headers):
+    """Test a user's reads follow their own write to the primary for the window"""
+    add_replica_task("Replica Task")
+    client.post("/tasks", json={"label": "Primary Task", "x": 1, "y": 2, "color": "#ff0000"}, headers=auth_headers)
+    
+    tasks = client.get("/tasks", headers=auth_headers).json()
+    assert [task["label"] for task in tasks] == ["Primary Task"]
+    
+    # Once the window has passed the replica is trusted again
+    read_routing.clear()
+    tasks = client.get("/tasks", headers=auth_headers).json()
+    assert [task["label"] for task in tasks] == ["Replica Task"]
+
+def test_writes_never_use_replica(auth_headers):
+    """Test mutating handlers keep using the primary session"""
+    response = client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Note"}, headers=auth_headers)
+    assert response.status_code == 200
+    with ReplicaSessionLocal() as db:
+        assert db.query(CalendarNote).count() == 0
+    read_routing.clear()
+    assert client.get("/calendar-notes/2024-01-15", headers=auth_headers).status_code == 404
+
+def test_pin_window_expires():
+    """Test marks pin a user only for the configured window"""
+    routing = ReadYourWrites(window_seconds=0)
+    routing.mark(1)
+    assert not routing.pinned(1)
+    routing = ReadYourWrites(window_seconds=60)
+    routing.mark(1, 2)
+    assert routing.pinned(2) and not routing.route(1) and routing.route(3)
+    assert routing.stats() == {"replica_reads": 1, "primary_reads": 1, "pinned_users": 2}
@@ -0,0 +1,138 @@
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, rebuild_search_documents, Base
+from search_index import document_terms, fts5_query
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database(monkeypatch):
+    # Import writes each chunk in a session of its own; point it at the test database
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main, "AsyncSessionLocal", None)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def register(username):
+    response = client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def create_task(headers, label):
+    return client.post("/tasks", json={"label": label, "x": 1, "y": 2, "color": "#ff0000"}, headers=headers).json()["id"]
+
+def search(headers, q, **params):
+    response = client.get("/search", params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200
+    return response
+
+def test_terms_are_folded_and_scoped():
+    """Test words are case- and accent-folded and prefixed with the owner"""
+    assert document_terms(7, "Café au LAIT, x_y!") == "7_cafe 7_au 7_lait 7_x 7_y"
+    assert fts5_query(7, "CAFÉ or", 8) == '"7_cafe"* AND "7_or"*'
+    assert fts5_query(7, "?!", 8) is None
+
+def test_search_tasks_and_notes(setup_database):
+    """Test matches come from both kinds, every word must match and words match as prefixes"""
+    headers = register("searcher")
+    milk = create_task(headers, "Buy milk")
+    create_task(headers, "Buy bread")
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Milkshake with milk and more milk"}, headers=headers)
+    
+    hits = search(headers, "milk").json()
+    assert [(hit["type"], hit["score"] > 0) for hit in hits] == [("note", True), ("task", True)]
+    assert hits[0]["note"]["date"] == "2024-01-15" and hits[0]["task"] is None
+    assert hits[1]["task"]["id"] == milk
+    
+    assert [hit["task"]["label"] for hit in search(headers, "buy MIL").json()] == ["Buy milk"]
+    assert search(headers, "buy cheese").json() == []
+    assert search(headers, "***").json() == []
+
+def test_search_follows_writes(setup_database):
+    """Test deletes, note edits, batches and imports keep the index current"""
+    headers = register("writer")
+    removed = create_task(headers, "Water plants")
+    client.delete(f"/tasks/{removed}", headers=headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Dentist"}, headers=headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Haircut"}, headers=headers)
+    client.post("/tasks/batch", json={"operations": [
+        {"op": "create", "label": "Water garden", "x": 0, "y": 0, "color": "#000"},
+    ]}, headers=headers)
+    client.post("/import", content=b'{"type": "task", "label": "Water lawn", "x": 1, "y": 1, "color": "#fff"}\n', headers=headers)
+    
+    assert [hit["task"]["label"] for hit in search(headers, "water").json()] == ["Water garden", "Water lawn"]
+    assert search(headers, "dentist").json() == []
+    assert [hit["note"]["content"] for hit in search(headers, "haircut").json()] == ["Haircut"]
+
+def test_search_is_per_user_and_paginated(setup_database):
+    """Test other users' words never match and pages cover every hit once"""
+    headers = register("owner")
+    other = register("other")
+    for i in range(5):
+        create_task(headers, f"Report {i}")
+    create_task(other, "Report elsewhere")
+    
+    labels = []
+    params = {"limit": 2}
+    while True:
+        response = search(headers, "report", **params)
+        labels.extend(hit["task"]["label"] for hit in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "after": cursor}
+    assert sorted(labels) == [f"Report {i}" for i in range(5)]
+    assert [hit["task"]["label"] for hit in search(other, "report").json()] == ["Report elsewhere"]
+
+def test_crafted_cursors_rejected(setup_database):
+    """Test cursors with negative or out-of-range offsets answer 400 instead of reaching the query"""
+    headers = register("crafty")
+    create_task(headers, "Report")
+    for raw in (b'{"offset": -5}', b'{"offset": 1e400}', b'{"offset": 1e30}', b'{"offset": "x"}'):
+        cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        response = client.get("/search", params={"q": "report", "after": cursor}, headers=headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+def test_rebuild_search_documents(setup_database):
+    """Test rows written without documents become searchable after a rebuild"""
+    headers = register("rebuilt")
+    create_task(headers, "Old task")
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM search_documents")
+    assert search(headers, "old").json() == []
+    
+    with engine.begin() as conn:
+        assert rebuild_search_documents(conn, [user_id]) == 1
+    assert [hit["task"]["label"] for hit in search(headers, "old").json()] == ["Old task"]
+
+def test_search_validation(setup_database):
+    """Test the query is required and the token checked"""
+    headers = register("validator")
+    assert client.get("/search", headers=headers).status_code == 422
+    assert client.get("/search", params={"q": "x", "after": "bad"}, headers=headers).status_code == 400
+    assert client.get("/search", params={"q": "x"}).status_code == 403
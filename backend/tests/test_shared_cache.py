@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, response_cache, Base
+from shared_cache import MemoryCache, RedisCache
+from tests.resp_server import RespServer
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def resp_server():
+    server = RespServer().start()
+    yield server
+    server.stop()
+
+def register(test_client, username="testuser"):
+    response = test_client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_memory_cache_lru_and_invalidation():
+    """Test LRU eviction, per-user invalidation and the hit ratio"""
+    async def scenario():
+        cache = MemoryCache(max_entries=2)
+        await cache.set(1, "a", b"1a")
+        await cache.set(1, "b", b"1b")
+        assert await cache.get(1, "a") == b"1a"
+        await cache.set(2, "a", b"2a")
+        # "b" was least recently used
+        assert await cache.get(1, "b") is None
+        
+        await cache.invalidate([1])
+        assert await cache.get(1, "a") is None
+        assert await cache.get(2, "a") == b"2a"
+        return cache.stats()
+    
+    stats = asyncio.run(scenario())
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["hit_ratio"] == 0.5
+    assert stats["invalidations_published"] == 1
+
+def test_memory_cache_byte_budget():
+    """Test entries are evicted to stay within max_bytes and oversized bodies are not stored"""
+    async def scenario():
+        cache = MemoryCache(max_entries=100, max_bytes=10)
+        await cache.set(1, "a", b"aaaa")
+        await cache.set(1, "b", b"bbbb")
+        await cache.set(1, "a", b"aaaaa")
+        assert cache.size_bytes == 9
+        await cache.set(2, "a", b"cccc")
+        # "b" was least recently used
+        assert await cache.get(1, "b") is None
+        await cache.set(2, "b", b"x" * 11)
+        assert await cache.get(2, "b") is None
+        assert await cache.get(1, "a") == b"aaaaa"
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["entries"] == 2 and stats["bytes"] == 9
+
+@pytest.mark.skipif(response_cache is None, reason="CACHE_BACKEND=none")
+def test_viewport_and_range_reads_not_cached(setup_database):
+    """Test bbox and created_at range reads bypass the response cache"""
+    headers = register(client)
+    client.post("/tasks", json={"label": "Task", "x": 1, "y": 2, "color": "#ff0000"}, headers=headers)
+    sets = response_cache.sets
+    for _ in range(2):
+        assert len(client.get("/tasks?bbox=0,0,10,10", headers=headers).json()) == 1
+        assert len(client.get("/tasks?created_from=2000-01-01T00:00:00", headers=headers).json()) == 1
+    assert response_cache.sets == sets
+
+@pytest.mark.skipif(response_cache is None, reason="CACHE_BACKEND=none")
+def test_task_list_cached_until_write(setup_database):
+    """Test repeated list reads hit the cache and a write serves fresh data"""
+    headers = register(client)
+    client.post("/tasks", json={"label": "First", "x": 1, "y": 2, "color": "#ff0000"}, headers=headers)
+    
+    hits = response_cache.hits
+    assert len(client.get("/tasks", headers=headers).json()) == 1
+    assert len(client.get("/tasks", headers=headers).json()) == 1
+    assert response_cache.hits == hits + 1
+    
+    client.post("/tasks", json={"label": "Second", "x": 3, "y": 4, "color": "#00ff00"}, headers=headers)
+    assert [task["label"] for task in client.get("/tasks", headers=headers).json()] == ["First", "Second"]
+    # Different query strings are separate entries
+    assert client.get("/tasks?completed=true", headers=headers).json() == []
+
+def test_redis_invalidation_reaches_other_workers(resp_server):
+    """Test invalidations published by one worker run the handlers of another"""
+    async def scenario():
+        received = []
+        worker_a = RedisCache(resp_server.url)
+        worker_b = RedisCache(resp_server.url)
+        await worker_a.start(lambda user_id, scope: None)
+        await worker_b.start(lambda user_id, scope: received.append((user_id, scope)))
+        await asyncio.sleep(0.05)
+        
+        await worker_a.set(7, "/tasks?@1", b"[]")
+        assert await worker_b.get(7, "/tasks?@1") == b"[]"
+        await worker_a.invalidate([7], "principal")
+        assert await worker_b.get(7, "/tasks?@1") is None
+        
+        deadline = time.monotonic() + 2
+        while not received and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await worker_a.close()
+        await worker_b.close()
+        return received, worker_b.stats()
+    
+    received, stats = asyncio.run(scenario())
+    assert received == [(7, "principal")]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["invalidations_received"] == 1
+    assert stats["invalidation_latency_seconds_max"] < 2
+
+def test_app_on_redis_backend(setup_database, resp_server, monkeypatch, direct_experience):
+    """Test list caching and XP invalidation through the Redis-protocol backend"""
+    monkeypatch.setattr(main, "response_cache", RedisCache(resp_server.url))
+    with TestClient(app) as redis_client:
+        headers = register(redis_client)
+        redis_client.post("/tasks", json={"label": "Task", "x": 1, "y": 2, "color": "#ff0000"}, headers=headers)
+        redis_client.get("/tasks", headers=headers)
+        redis_client.get("/tasks", headers=headers)
+        assert main.response_cache.hits == 1
+        
+        user = redis_client.patch("/users/experience", json={"points": 10}, headers=headers).json()
+        assert "DEL" in resp_server.commands and "PUBLISH" in resp_server.commands
+        assert user["experience_points"] == 10
+        assert redis_client.get("/auth/me", headers=headers).json()["experience_points"] == 10
+        assert len(redis_client.get("/tasks", headers=headers).json()) == 1
+
+def test_redis_backend_down_is_a_miss(setup_database, monkeypatch):
+    """Test an unreachable cache server degrades to database reads"""
+    monkeypatch.setattr(main, "response_cache", RedisCache("redis://127.0.0.1:1/0", timeout=0.2))
+    headers = register(client)
+    client.post("/tasks", json={"label": "Task", "x": 1, "y": 2, "color": "#ff0000"}, headers=headers)
+    assert len(client.get("/tasks", headers=headers).json()) == 1
+    assert main.response_cache.errors >= 1
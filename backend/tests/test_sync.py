@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, compact_tombstones, Task, Base
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def auth_headers(setup_database):
+    """Create a test user and return auth headers"""
+    response = client.post("/auth/register", json={
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def create_task(headers, label):
+    return client.post("/tasks", json={"label": label, "x": 1, "y": 2, "color": "#ff0000"}, headers=headers).json()["id"]
+
+def test_sync_from_zero_returns_live_state(auth_headers):
+    """Test the initial sync is a full snapshot without tombstones"""
+    kept = create_task(auth_headers, "Kept")
+    removed = create_task(auth_headers, "Removed")
+    client.delete(f"/tasks/{removed}", headers=auth_headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Note"}, headers=auth_headers)
+
+    response = client.get("/sync", headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["reset"] is True
+    assert body["revision"] == 4
+    assert [task["id"] for task in body["tasks"]] == [kept]
+    assert body["deleted_task_ids"] == []
+    assert [note["content"] for note in body["calendar_notes"]] == ["Note"]
+
+def test_sync_since_returns_only_changes(auth_headers, direct_experience):
+    """Test an incremental sync returns changed rows and tombstones"""
+    first = create_task(auth_headers, "First")
+    second = create_task(auth_headers, "Second")
+    third = create_task(auth_headers, "Third")
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Old"}, headers=auth_headers)
+    client.post("/calendar-notes", json={"date": "2024-01-16", "content": "Untouched"}, headers=auth_headers)
+    since = client.get("/sync", headers=auth_headers).json()["revision"]
+
+    client.patch(f"/tasks/{first}/complete", headers=auth_headers)
+    client.post("/tasks/batch", json={"operations": [{"op": "delete", "id": second}]}, headers=auth_headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "New"}, headers=auth_headers)
+    # XP writes advance the revision without changing tasks or notes
+    client.patch("/users/experience", json={"points": 10}, headers=auth_headers)
+
+    body = client.get("/sync", params={"since": since}, headers=auth_headers).json()
+    assert body["reset"] is False
+    assert body["revision"] == since + 4
+    assert [(task["id"], task["completed"]) for task in body["tasks"]] == [(first, True)]
+    assert body["deleted_task_ids"] == [second]
+    assert [note["content"] for note in body["calendar_notes"]] == ["New"]
+
+    # Deleted tasks are gone from every other read and cannot be changed again
+    assert [task["id"] for task in client.get("/tasks", headers=auth_headers).json()] == [first, third]
+    assert client.delete(f"/tasks/{second}", headers=auth_headers).status_code == 404
+    assert client.patch(f"/tasks/{second}/complete", headers=auth_headers).status_code == 404
+
+    caught_up = client.get("/sync", params={"since": body["revision"]}, headers=auth_headers).json()
+    assert caught_up == {"revision": body["revision"], "reset": False, "tasks": [], "deleted_task_ids": [], "calendar_notes": []}
+
+def test_sync_is_per_user(auth_headers):
+    """Test another user's changes never appear"""
+    create_task(auth_headers, "Mine")
+    response = client.post("/auth/register", json={
+        "username": "otheruser",
+        "email": "other@example.com",
+        "password": "testpassword123"
+    })
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    body = client.get("/sync", headers=other_headers).json()
+    assert body["revision"] == 0
+    assert body["tasks"] == []
+
+def test_compaction_forces_reset_for_older_sync_points(auth_headers, monkeypatch):
+    """Test old tombstones are removed and clients behind them start over"""
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main, "AsyncSessionLocal", None)
+    kept = create_task(auth_headers, "Kept")
+    old = create_task(auth_headers, "Old")
+    since = client.get("/sync", headers=auth_headers).json()["revision"]
+    client.delete(f"/tasks/{old}", headers=auth_headers)
+    recent = create_task(auth_headers, "Recent")
+    client.delete(f"/tasks/{recent}", headers=auth_headers)
+
+    db = TestingSessionLocal()
+    db.execute(update(Task).where(Task.id == old).values(deleted_at=datetime.utcnow() - timedelta(days=60)))
+    db.commit()
+
+    assert asyncio.run(compact_tombstones(datetime.utcnow() - timedelta(days=30))) == 1
+    assert db.get(Task, old) is None
+    assert db.get(Task, recent).deleted_at is not None
+    db.close()
+
+    # The deletion of "Old" can no longer be reported, so this client resets
+    body = client.get("/sync", params={"since": since}, headers=auth_headers).json()
+    assert body["reset"] is True
+    assert [task["id"] for task in body["tasks"]] == [kept]
+
+    # Clients that synced after the compacted tombstone still get deltas
+    latest = client.get("/sync", params={"since": since + 1}, headers=auth_headers).json()
+    assert latest["reset"] is False
+    assert latest["deleted_task_ids"] == [recent]
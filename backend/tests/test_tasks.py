@@ -1,3 +1,5 @@
+import base64
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -152,3 +154,131 @@ def test_complete_task_not_found(setup_database, auth_headers):
     response = client.patch("/tasks/999/complete", headers=auth_headers)
     assert response.status_code == 404
     assert "Task not found" in response.json()["detail"]
+
+def test_get_tasks_paginated(setup_database, auth_headers):
+    """Test keyset pagination walks every task exactly once"""
+    for i in range(5):
+        task_data = {"label": f"Task {i}", "x": i, "y": i, "color": "#ff0000"}
+        client.post("/tasks", json=task_data, headers=auth_headers)
+    
+    labels = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/tasks", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        labels.extend(task["label"] for task in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "after": cursor}
+    
+    assert labels == [f"Task {i}" for i in range(5)]
+
+def test_get_tasks_filter_completed(setup_database, auth_headers):
+    """Test filtering tasks by completion state"""
+    task_ids = []
+    for i in range(3):
+        task_data = {"label": f"Task {i}", "x": i, "y": i, "color": "#ff0000"}
+        task_ids.append(client.post("/tasks", json=task_data, headers=auth_headers).json()["id"])
+    client.patch(f"/tasks/{task_ids[1]}/complete", headers=auth_headers)
+    
+    response = client.get("/tasks", params={"completed": False}, headers=auth_headers)
+    assert [task["id"] for task in response.json()] == [task_ids[0], task_ids[2]]
+    
+    response = client.get("/tasks", params={"completed": True, "limit": 10}, headers=auth_headers)
+    assert [task["id"] for task in response.json()] == [task_ids[1]]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_tasks_invalid_cursor(setup_database, auth_headers):
+    """Test a malformed cursor is rejected"""
+    response = client.get("/tasks", params={"limit": 2, "after": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+    for raw in (b'{"id": -1}', b'{"id": 1e400}', b'{"id": 99999999999999999999}'):
+        cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        response = client.get("/tasks", params={"limit": 2, "after": cursor}, headers=auth_headers)
+        assert response.status_code == 400
+
+def test_batch_task_operations(setup_database, auth_headers):
+    """Test mixed create/complete/delete operations in one request"""
+    task_ids = []
+    for i in range(2):
+        task_data = {"label": f"Task {i}", "x": i, "y": i, "color": "#ff0000"}
+        task_ids.append(client.post("/tasks", json=task_data, headers=auth_headers).json()["id"])
+    
+    operations = [
+        {"op": "create", "label": "New Task", "x": 5, "y": 6, "color": "#00ff00"},
+        {"op": "complete", "id": task_ids[0]},
+        {"op": "delete", "id": task_ids[1]},
+        {"op": "delete", "id": 999}
+    ]
+    response = client.post("/tasks/batch", json={"operations": operations}, headers=auth_headers)
+    assert response.status_code == 200
+    
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [200, 200, 200, 404]
+    assert results[0]["task"]["label"] == "New Task"
+    
+    tasks = {task["id"]: task for task in client.get("/tasks", headers=auth_headers).json()}
+    assert set(tasks) == {task_ids[0], results[0]["id"]}
+    assert tasks[task_ids[0]]["completed"] == True
+
+def test_batch_task_invalid_operation(setup_database, auth_headers):
+    """Test operations missing their fields are rejected before any write"""
+    operations = [
+        {"op": "create", "label": "New Task", "x": 5, "y": 6, "color": "#00ff00"},
+        {"op": "complete"}
+    ]
+    response = client.post("/tasks/batch", json={"operations": operations}, headers=auth_headers)
+    assert response.status_code == 422
+    assert client.get("/tasks", headers=auth_headers).json() == []
+
+def test_get_tasks_conditional_request(setup_database, auth_headers):
+    """Test If-None-Match answers 304 until the task list changes"""
+    response = client.get("/tasks", headers=auth_headers)
+    etag = response.headers["ETag"]
+    
+    response = client.get("/tasks", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    task_data = {"label": "Test Task", "x": 100, "y": 200, "color": "#ff0000"}
+    client.post("/tasks", json=task_data, headers=auth_headers)
+    
+    response = client.get("/tasks", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 1
+
+def test_get_tasks_bbox(setup_database, auth_headers):
+    """Test a bounding box returns only the tasks inside it, across grid cells"""
+    positions = {"inside": (300, 300), "edge": (600, 500), "left": (-10, 300), "below": (300, 501),
+                 "far": (100000000, 300), "negative": (-700, -900)}
+    task_ids = {}
+    for label, (x, y) in positions.items():
+        task_data = {"label": label, "x": x, "y": y, "color": "#ff0000"}
+        task_ids[label] = client.post("/tasks", json=task_data, headers=auth_headers).json()["id"]
+    operations = [{"op": "create", "label": "batched", "x": 250, "y": 260, "color": "#00ff00"}]
+    client.post("/tasks/batch", json={"operations": operations}, headers=auth_headers)
+    
+    response = client.get("/tasks", params={"bbox": "0,0,600,500"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [task["label"] for task in response.json()] == ["inside", "edge", "batched"]
+    
+    client.delete(f"/tasks/{task_ids['inside']}", headers=auth_headers)
+    response = client.get("/tasks", params={"bbox": "0,0,600,500", "limit": 1}, headers=auth_headers)
+    assert [task["label"] for task in response.json()] == ["edge"]
+    response = client.get("/tasks", params={"bbox": "0,0,600,500", "limit": 1, "after": response.headers["X-Next-Cursor"]}, headers=auth_headers)
+    assert [task["label"] for task in response.json()] == ["batched"]
+    
+    # Boxes taller than the range limit and beyond the grid edge
+    response = client.get("/tasks", params={"bbox": "-1000,-1000000,1e9,1000000"}, headers=auth_headers)
+    assert {task["label"] for task in response.json()} == set(positions) - {"inside"} | {"batched"}
+    response = client.get("/tasks", params={"bbox": "-800,-1000,-600.5,-800"}, headers=auth_headers)
+    assert [task["label"] for task in response.json()] == ["negative"]
+
+def test_get_tasks_invalid_bbox(setup_database, auth_headers):
+    """Test malformed or inverted boxes are rejected"""
+    for bbox in ["1,2,3", "a,b,c,d", "10,0,0,10", "0,0,inf,10", "0,0,nan,10"]:
+        response = client.get("/tasks", params={"bbox": bbox}, headers=auth_headers)
+        assert response.status_code == 400
@@ -0,0 +1,161 @@
+import json
+import pytest
+from datetime import date
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+import main
+from main import app, get_db, rebuild_user_stats, Base
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup_database(monkeypatch):
+    # Import writes each chunk in a session of its own; point it at the test database
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main, "AsyncSessionLocal", None)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def register(username):
+    response = client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpassword123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def create_task(headers):
+    return client.post("/tasks", json={"label": "Task", "x": 1, "y": 2, "color": "#ff0000"}, headers=headers).json()["id"]
+
+def stats(headers):
+    me = client.get("/auth/me", headers=headers).json()
+    return {name: me[name] for name in ("tasks_count", "total_tasks_completed", "tasks_today", "streak_days", "calendar_notes_count")}
+
+def test_counters_follow_writes(setup_database):
+    """Test creates, completions, deletes and notes update the counters once each"""
+    headers = register("counter")
+    assert stats(headers) == {"tasks_count": 0, "total_tasks_completed": 0, "tasks_today": 0, "streak_days": 0, "calendar_notes_count": 0}
+
+    first, second = create_task(headers), create_task(headers)
+    client.patch(f"/tasks/{first}/complete", headers=headers)
+    client.patch(f"/tasks/{first}/complete", headers=headers)
+    client.delete(f"/tasks/{first}", headers=headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "One"}, headers=headers)
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "One, edited"}, headers=headers)
+    client.post("/calendar-notes", json={"date": "2024-01-16", "content": "Two"}, headers=headers)
+
+    # Deleting the completed task keeps its completion
+    assert stats(headers) == {"tasks_count": 1, "total_tasks_completed": 1, "tasks_today": 1, "streak_days": 1, "calendar_notes_count": 2}
+
+    response = client.post("/tasks/batch", json={"operations": [
+        {"op": "create", "label": "New", "x": 0, "y": 0, "color": "#00ff00"},
+        {"op": "complete", "id": second},
+        {"op": "complete", "id": first},
+        {"op": "delete", "id": second},
+    ]}, headers=headers)
+    assert response.status_code == 200
+    assert stats(headers)["tasks_count"] == 1
+    assert stats(headers)["total_tasks_completed"] == 2
+    assert stats(headers)["tasks_today"] == 2
+
+def test_auth_me_reads_stats_without_counting(setup_database):
+    """Test /auth/me reads one stats row instead of scanning tasks and notes"""
+    headers = register("reader")
+    for _ in range(3):
+        create_task(headers)
+    client.get("/auth/me", headers=headers)
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/auth/me", headers=headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_statement)
+
+    assert response.json()["tasks_count"] == 3
+    assert not any("FROM tasks" in statement or "count(" in statement.lower() for statement in statements)
+    assert any("FROM user_stats" in statement for statement in statements)
+
+def test_note_upsert_counts_without_reading_first(setup_database):
+    """Test saving a note tells insert from update through the upsert itself"""
+    headers = register("noter")
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "One"}, headers=headers)
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count_statement)
+    try:
+        client.post("/calendar-notes", json={"date": "2024-01-15", "content": "One, edited"}, headers=headers)
+        client.post("/calendar-notes", json={"date": "2024-01-16", "content": "Two"}, headers=headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_statement)
+
+    assert not any(statement.lstrip().startswith("SELECT") and "FROM calendar_notes" in statement for statement in statements)
+    assert stats(headers)["calendar_notes_count"] == 2
+
+def test_streak_from_daily_buckets(setup_database, monkeypatch):
+    """Test consecutive completion days extend the streak and a missed day ends it"""
+    headers = register("streaker")
+    today = date(2024, 3, 1)
+    monkeypatch.setattr(main, "utc_today", lambda: today)
+    task_ids = [create_task(headers) for _ in range(5)]
+
+    client.patch(f"/tasks/{task_ids[0]}/complete", headers=headers)
+    today = date(2024, 3, 2)
+    client.patch(f"/tasks/{task_ids[1]}/complete", headers=headers)
+    client.patch(f"/tasks/{task_ids[2]}/complete", headers=headers)
+    assert (stats(headers)["tasks_today"], stats(headers)["streak_days"]) == (2, 2)
+
+    # The next day the streak still stands but nothing is done yet; the ETag moves with the day
+    etag = client.get("/auth/me", headers=headers).headers["etag"]
+    today = date(2024, 3, 3)
+    response = client.get("/auth/me", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert (response.json()["tasks_today"], response.json()["streak_days"]) == (0, 2)
+
+    # A day without completions ends it
+    today = date(2024, 3, 5)
+    assert (stats(headers)["tasks_today"], stats(headers)["streak_days"]) == (0, 0)
+    client.patch(f"/tasks/{task_ids[3]}/complete", headers=headers)
+    assert (stats(headers)["tasks_today"], stats(headers)["streak_days"]) == (1, 1)
+    assert stats(headers)["total_tasks_completed"] == 4
+
+def test_import_and_rebuild_counts(setup_database):
+    """Test imports add to the counters and a rebuild recounts them"""
+    headers = register("importer")
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    client.post("/calendar-notes", json={"date": "2024-01-15", "content": "Existing"}, headers=headers)
+    lines = [
+        {"type": "task", "label": "Done", "x": 1, "y": 1, "color": "#fff", "completed": True},
+        {"type": "task", "label": "Open", "x": 2, "y": 2, "color": "#fff"},
+        {"type": "note", "date": "2024-01-15", "content": "Replaced"},
+        {"type": "note", "date": "2024-01-16", "content": "New"},
+    ]
+    response = client.post("/import", content="\n".join(json.dumps(line) for line in lines), headers=headers)
+    assert response.status_code == 200
+
+    expected = {"tasks_count": 2, "total_tasks_completed": 1, "tasks_today": 0, "streak_days": 0, "calendar_notes_count": 2}
+    assert stats(headers) == expected
+    with engine.begin() as conn:
+        rebuild_user_stats(conn, [user_id])
+    assert stats(headers) == expected
@@ -0,0 +1,80 @@
+"""
+Username availability index for TodoWeb 2.0
+Bloom filter over registered usernames so availability checks rarely reach the database
+"""
+
+import hashlib
+import math
+import threading
+from typing import Dict, Iterable
+
+
+class UsernameIndex:
+    """Process-local Bloom filter of registered usernames.
+
+    A negative answer means the username is definitely not registered (as
+    far as this process knows); a positive answer only means it might be and
+    must be confirmed against the database. Names are folded to lower case
+    so the filter never reports a name free that a case-insensitive
+    collation would reject.
+    """
+
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.ready = False
+        self.size = 0
+        self.lookups = 0
+        self.negatives = 0
+
+    def _positions(self, username: str):
+        digest = hashlib.blake2b(username.lower().encode(), digest_size=16).digest()
+        # Kirsch-Mitzenmacher: derive k positions from two 64-bit hashes
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, username: str) -> None:
+        positions = self._positions(username)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.size += 1
+
+    def warm(self, usernames: Iterable[str]) -> None:
+        """Load every registered username and start answering lookups"""
+        for username in usernames:
+            self.add(username)
+        self.ready = True
+
+    def might_contain(self, username: str) -> bool:
+        """
+        Check whether username may already be registered
+
+        Returns:
+            bool: False only when the username is certainly not in the index
+        """
+        self.lookups += 1
+        for position in self._positions(username):
+            if not self._bits[position >> 3] & (1 << (position & 7)):
+                self.negatives += 1
+                return False
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bits = bytearray(len(self._bits))
+            self.size = 0
+            self.ready = False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "ready": int(self.ready),
+            "size": self.size,
+            "lookups": self.lookups,
+            "negatives": self.negatives,
+        }
@@ -0,0 +1,103 @@
+"""
+Experience point write coalescing for TodoWeb 2.0
+Buffers XP increments per user and applies them to the users table in batches
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ExperienceCoalescer:
+    """Per-user XP increment buffer.
+
+    ``add`` only touches memory; ``drain`` hands the accumulated deltas to a
+    flush callback, which applies them with one UPDATE per user in a single
+    transaction. Deltas from a failed flush are merged back into the buffer.
+    """
+
+    def __init__(self, interval_seconds: float = 1.0, max_users: int = 1000):
+        self.interval_seconds = interval_seconds
+        self.max_users = max_users
+        self._deltas: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.increments = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def add(self, user_id: int, points: int) -> bool:
+        """
+        Buffer an increment
+
+        Returns:
+            bool: True when the buffer has reached max_users and should be flushed now
+        """
+        with self._lock:
+            self._deltas[user_id] = self._deltas.get(user_id, 0) + points
+            self.increments += 1
+            return len(self._deltas) >= self.max_users
+
+    def pending(self, user_id: int) -> int:
+        """Points buffered for user_id that are not yet in the database"""
+        with self._lock:
+            return self._deltas.get(user_id, 0)
+
+    def drain(self) -> Dict[int, int]:
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+    def restore(self, deltas: Dict[int, int]) -> None:
+        """Put back deltas whose flush failed so they are retried"""
+        with self._lock:
+            for user_id, delta in deltas.items():
+                self._deltas[user_id] = self._deltas.get(user_id, 0) + delta
+
+    async def flush(self, apply: Callable[[Dict[int, int]], Awaitable[None]]) -> int:
+        """
+        Drain the buffer through apply
+
+        Args:
+            apply: Coroutine that writes {user_id: delta} in one transaction
+
+        Returns:
+            int: Number of user rows written
+        """
+        deltas = self.drain()
+        if not deltas:
+            return 0
+        try:
+            await apply(deltas)
+        except Exception:
+            self.restore(deltas)
+            raise
+        self.flushes += 1
+        self.rows_written += len(deltas)
+        return len(deltas)
+
+    async def run(self, apply: Callable[[Dict[int, int]], Awaitable[None]]) -> None:
+        """Flush every interval until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.flush(apply)
+            except Exception as e:
+                logger.error(f"Error flushing experience points: {e}")
+
+    def clear(self) -> None:
+        """Drop buffered deltas without writing them"""
+        with self._lock:
+            self._deltas.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            buffered_users = len(self._deltas)
+        return {
+            "increments": self.increments,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "buffered_users": buffered_users,
+        }
@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/AuthContext';
-import { calendarAPI } from '../services/api';
+import { calendarAPI, clientId, subscribeChanges } from '../services/api';
 import './Calendar.css';
 
 const Calendar = () => {
@@ -30,10 +30,36 @@ const Calendar = () => {
     }
   }, [user, currentDate]);
 
+  // Notes saved in other tabs or devices arrive over the change stream. The
+  // subscription outlives month changes, so resync reloads whichever month is shown
+  const loadCalendarNotesRef = useRef(null);
+  useEffect(() => {
+    if (!user) {
+      return undefined;
+    }
+    return subscribeChanges({
+      note_upserted: ({ note, source }) => {
+        if (source === clientId) {
+          return;
+        }
+        const [year, month, day] = note.date.split('-').map(Number);
+        setDayTexts(prev => ({ ...prev, [`${year}-${month - 1}-${day}`]: note.content }));
+      },
+      resync: () => loadCalendarNotesRef.current(),
+    });
+  }, [user]);
+
   const loadCalendarNotes = async () => {
     try {
       setLoading(true);
-      const response = await calendarAPI.getNotes();
+      // Only the visible month is needed
+      const year = currentDate.getFullYear();
+      const month = String(currentDate.getMonth() + 1).padStart(2, '0');
+      const lastDay = String(daysInMonth(year, currentDate.getMonth())).padStart(2, '0');
+      const response = await calendarAPI.getNotes({
+        from: `${year}-${month}-01`,
+        to: `${year}-${month}-${lastDay}`,
+      });
       const notes = response.data;
       
       // Convert notes to dayTexts format
@@ -50,6 +76,7 @@ const Calendar = () => {
       setLoading(false);
     }
   };
+  loadCalendarNotesRef.current = loadCalendarNotes;
 
   const saveCalendarNote = async (dayKey, content) => {
     if (!user) return;
@@ -1,6 +1,6 @@
 import React, { useRef, useEffect, useState } from 'react';
 import { useAuth } from '../context/AuthContext';
-import { tasksAPI, userAPI } from '../services/api';
+import { tasksAPI, userAPI, clientId, subscribeChanges } from '../services/api';
 import ExperienceNotis from './ExperienceNotis';
 import './TodoList.css';
 
@@ -47,6 +47,22 @@ function TodoList() {
     }
   }, [user]);
 
+  // Tasks finished in another tab or device leave this board too
+  useEffect(() => {
+    if (!user) {
+      return undefined;
+    }
+    const removeTask = ({ id, source }) => {
+      if (source !== clientId) {
+        circlesRef.current = circlesRef.current.filter(circle => circle.taskId !== id);
+      }
+    };
+    return subscribeChanges({
+      task_completed: removeTask,
+      task_deleted: removeTask,
+    });
+  }, [user]);
+
   const loadTasks = async () => {
     try {
       const response = await tasksAPI.getTasks();
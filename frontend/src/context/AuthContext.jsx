@@ -1,5 +1,6 @@
 import { createContext, useContext, useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeChanges } from '../services/api';
 
 const AuthContext = createContext();
 
@@ -25,6 +26,22 @@ export const AuthProvider = ({ children }) => {
     }
   }, []);
 
+  // Keep experience points current without refetching /auth/me after each award
+  const userId = user?.id;
+  useEffect(() => {
+    if (!userId) {
+      return undefined;
+    }
+    return subscribeChanges({
+      xp_changed: ({ delta, experience_points: total }) => {
+        setUser(prev => prev && {
+          ...prev,
+          experience_points: total ?? (prev.experience_points || 0) + delta,
+        });
+      },
+    });
+  }, [userId]);
+
   const verifyToken = async (token) => {
     try {
       const response = await axios.get('/api/auth/me', {
@@ -10,12 +10,16 @@ const api = axios.create({
   },
 });
 
+// Identifies this tab on writes, so it can skip change events it caused
+export const clientId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 // Add auth token to requests
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('authToken');
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  config.headers['X-Client-Id'] = clientId;
   return config;
 });
 
@@ -41,9 +45,15 @@ export const authAPI = {
 // Tasks API
 export const tasksAPI = {
   getTasks: () => api.get('/tasks'),
+  // Keyset page: { limit, after, completed, created_from, created_to }; next cursor in x-next-cursor
+  getTasksPage: (params) => api.get('/tasks', { params }),
+  // Tasks positioned inside [x0, x1] x [y0, y1]; combines with the page params
+  getTasksInView: ([x0, y0, x1, y1], params = {}) => api.get('/tasks', { params: { ...params, bbox: `${x0},${y0},${x1},${y1}` } }),
   createTask: (taskData) => api.post('/tasks', taskData),
   deleteTask: (taskId) => api.delete(`/tasks/${taskId}`),
   completeTask: (taskId) => api.patch(`/tasks/${taskId}/complete`),
+  // operations: [{ op: 'create', label, x, y, color } | { op: 'complete' | 'delete', id }]
+  batch: (operations) => api.post('/tasks/batch', { operations }),
 };
 
 // User API
@@ -54,9 +64,132 @@ export const userAPI = {
 
 // Calendar API
 export const calendarAPI = {
-  getNotes: () => api.get('/calendar-notes'),
+  // range: optional { from, to } as YYYY-MM-DD, both inclusive
+  getNotes: (range) => api.get('/calendar-notes', { params: range }),
   createNote: (noteData) => api.post('/calendar-notes', noteData),
   getNote: (date) => api.get(`/calendar-notes/${date}`),
 };
 
+// Search API
+export const searchAPI = {
+  // Ranked { type, score, task, note } hits; next page cursor in x-next-cursor
+  search: (q, params = {}) => api.get('/search', { params: { ...params, q } }),
+};
+
+export const leaderboardAPI = {
+  getTop: (limit = 10) => api.get('/leaderboard', { params: { limit } }),
+  getMyRank: () => api.get('/users/me/rank'),
+};
+
+// Delta sync: pass the last response's revision as since (0 for a full snapshot)
+export const syncAPI = {
+  getChanges: (since = 0) => api.get('/sync', { params: { since } }),
+};
+
+// Change stream: one EventSource per tab, shared by every subscriber so a tab
+// holds a single connection. Handlers are keyed by event type ('task_created',
+// 'task_completed', 'task_deleted', 'note_upserted', 'xp_changed', 'resync');
+// returns an unsubscribe function, and the stream closes with the last one.
+// The URL carries a short-lived stream token rather than the access token, so
+// once the browser's own reconnect is refused the stream is reopened with a
+// fresh one, and subscribers get a resync for what they may have missed
+const CHANGE_STREAM_RETRY_MS = 5000;
+const changeStream = { source: null, token: null, handlers: new Map(), subscribers: 0, generation: 0, retry: null };
+
+const dispatchChange = (type, data) => {
+  // Copy so a handler that unsubscribes does not disturb the loop
+  [...(changeStream.handlers.get(type) || [])].forEach(handler => handler(data));
+};
+
+const openChangeStream = async (token, reopened = false) => {
+  const generation = ++changeStream.generation;
+  changeStream.token = token;
+  const retry = () => {
+    changeStream.source = null;
+    changeStream.retry = setTimeout(() => {
+      changeStream.retry = null;
+      openChangeStream(token, true);
+    }, CHANGE_STREAM_RETRY_MS);
+  };
+  let streamToken;
+  try {
+    streamToken = (await api.post('/events/token')).data.stream_token;
+  } catch (error) {
+    if (generation === changeStream.generation) {
+      retry();
+    }
+    return;
+  }
+  // Closed, or reopened for another user, while the token was on its way
+  if (generation !== changeStream.generation) {
+    return;
+  }
+  const source = new EventSource(`${API_BASE_URL}/events?stream_token=${encodeURIComponent(streamToken)}`);
+  changeStream.handlers.forEach((handlers, type) => listenForChange(source, type));
+  source.onerror = () => {
+    // The browser retries dropped connections with the same URL; a refusal ends the stream for good
+    if (source.readyState === EventSource.CLOSED && changeStream.source === source) {
+      retry();
+    }
+  };
+  changeStream.source = source;
+  if (reopened) {
+    dispatchChange('resync', {});
+  }
+};
+
+const listenForChange = (source, type) => {
+  source.addEventListener(type, (event) => dispatchChange(type, JSON.parse(event.data)));
+};
+
+const closeChangeStream = () => {
+  // Also abandons an open still waiting for its stream token
+  changeStream.generation += 1;
+  clearTimeout(changeStream.retry);
+  changeStream.retry = null;
+  if (changeStream.source) {
+    changeStream.source.close();
+  }
+  changeStream.source = null;
+  changeStream.token = null;
+};
+
+export const subscribeChanges = (handlers) => {
+  const token = localStorage.getItem('authToken');
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  if (changeStream.token && changeStream.token !== token) {
+    // Signed in as someone else: the old stream belongs to the previous user
+    closeChangeStream();
+  }
+  const entries = Object.entries(handlers);
+  entries.forEach(([type, handler]) => {
+    if (!changeStream.handlers.has(type)) {
+      changeStream.handlers.set(type, new Set());
+      if (changeStream.source) {
+        listenForChange(changeStream.source, type);
+      }
+    }
+    changeStream.handlers.get(type).add(handler);
+  });
+  if (!changeStream.token) {
+    openChangeStream(token);
+  }
+  changeStream.subscribers += 1;
+
+  let subscribed = true;
+  return () => {
+    if (!subscribed) {
+      return;
+    }
+    subscribed = false;
+    entries.forEach(([type, handler]) => changeStream.handlers.get(type).delete(handler));
+    changeStream.subscribers -= 1;
+    if (changeStream.subscribers === 0) {
+      closeChangeStream();
+    }
+  };
+};
+
 export default api;